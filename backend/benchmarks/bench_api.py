@@ -0,0 +1,277 @@
+"""Load test for the whole DoIt API against local Supabase and Google stand-ins.
+
+Boots server.py against FakePostgrest (PostgREST + Auth) and FakeGoogle, each
+adding its own fixed latency per call, seeds a set of users with tasks, wins,
+settings and connected calendars, then keeps `--concurrency` requests in
+flight drawn from a weighted mix of the /api routes a client uses. Reports
+requests/sec and p50/p95/p99 latency per route and overall, plus how many
+upstream calls the API made. The API and both stand-ins run in their own
+processes so only the load generator shares this interpreter.
+
+    python backend/benchmarks/bench_api.py --latency 0.02 --google-latency 0.08 --requests 3000
+
+/api/stream (long-lived) and DELETE /api/gcal/{profile} (would disconnect the
+seeded calendars) are not part of the mix. Use --remote-auth to boot the API
+without the JWT secret so tokens are checked against the fake Auth server.
+Per-user rate limits are off unless --rate-limits is given, since a few
+users generate the whole load; the global Google concurrency cap stays on.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from fake_google import FakeGoogle
+from fake_supabase import FakePostgrest
+from harness import JWT_SECRET, ServerProcess, boot_api, mint_token, percentile
+
+PROFILES = ("personal", "work")
+SECTIONS = ("today", "tomorrow", "someday")
+
+
+class BenchUser:
+    """A seeded user plus the task ids the run may edit or delete"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.headers = {"Authorization": f"Bearer {mint_token(user_id)}"}
+        self.task_ids: list = []
+
+
+def seed(fake: FakePostgrest, users: list, tasks: int, wins: int) -> None:
+    now = datetime.now(timezone.utc)
+    for user in users:
+        uid = user.user_id
+        fake.seed("user_settings", [{"user_id": uid, "theme": "yellow", "dark_mode": "auto"}])
+        fake.seed("happy_settings", [{"user_id": uid, "timezone": "America/New_York", "enabled": True}])
+        fake.seed("tasks", [
+            {
+                "user_id": uid,
+                "title": f"task {i}",
+                "profile": PROFILES[i % 2],
+                "section": SECTIONS[i % 3],
+                "completed": i % 5 == 0,
+            }
+            for i in range(tasks)
+        ])
+        user.task_ids = [t["id"] for t in fake.tables["tasks"] if t["user_id"] == uid]
+        fake.seed("wins", [
+            {"user_id": uid, "task": f"win {i}", "completed_at": (now - timedelta(hours=7 * i)).isoformat()}
+            for i in range(wins)
+        ])
+        daily: dict = {}
+        for win in fake.tables["wins"]:
+            if win["user_id"] == uid:
+                day = win["completed_at"][:10]
+                daily[day] = daily.get(day, 0) + 1
+        fake.seed("win_daily_counts", [{"user_id": uid, "day": d, "count": c} for d, c in sorted(daily.items())])
+        fake.seed("google_calendar_accounts", [
+            {
+                "user_id": uid,
+                "profile": profile,
+                "google_email": "bench@example.com",
+                "access_token": "ya29.seeded",
+                "refresh_token": "1//seeded",
+                # Inside the refresh margin, so the first calendar read refreshes it
+                "token_expires_at": (now + timedelta(minutes=1)).isoformat(),
+            }
+            for profile in PROFILES
+        ])
+
+
+def build_mix(rng: random.Random) -> list:
+    """(route label, weight, request factory) for every route in the mix"""
+
+    def get(path, **params):
+        return lambda user: ("GET", path.format(profile=rng.choice(PROFILES)), {"params": params})
+
+    def create_task(user):
+        return "POST", "/api/tasks", {"json": {
+            "title": "bench task", "profile": rng.choice(PROFILES), "section": rng.choice(SECTIONS),
+        }}
+
+    def update_task(user):
+        task_id = rng.choice(user.task_ids) if user.task_ids else "missing"
+        return "PATCH", f"/api/tasks/{task_id}", {"json": {"completed": rng.random() < 0.5}}
+
+    def complete_task(user):
+        task_id = rng.choice(user.task_ids) if user.task_ids else "missing"
+        return "POST", f"/api/tasks/{task_id}/complete", {}
+
+    def delete_task(user):
+        task_id = user.task_ids.pop(rng.randrange(len(user.task_ids))) if user.task_ids else "missing"
+        return "DELETE", f"/api/tasks/{task_id}", {}
+
+    def batch_tasks(user):
+        ops = [
+            {"op": "create", "task": {"title": "bench batch", "profile": rng.choice(PROFILES), "section": "tomorrow"}}
+            for _ in range(3)
+        ]
+        ops.append({"op": "rollover", "profile": rng.choice(PROFILES), "from_section": "tomorrow", "to_section": "today"})
+        return "POST", "/api/tasks/batch", {"json": {"ops": ops}}
+
+    def update_settings(user):
+        return "PATCH", "/api/settings", {"json": {"theme": rng.choice(["yellow", "blue", "pink"])}}
+
+    def create_win(user):
+        return "POST", "/api/wins", {"json": {"task": "bench win"}}
+
+    def gcal_callback(user):
+        return "GET", "/api/gcal/callback", {"params": {"code": "bench-code", "state": f"{user.user_id}:work"}}
+
+    return [
+        ("GET /api/dashboard", 10, get("/api/dashboard")),
+        ("GET /api/tasks/{profile}", 20, get("/api/tasks/{profile}")),
+        ("POST /api/tasks", 5, create_task),
+        ("PATCH /api/tasks/{task_id}", 5, update_task),
+        ("POST /api/tasks/{task_id}/complete", 3, complete_task),
+        ("DELETE /api/tasks/{task_id}", 2, delete_task),
+        ("POST /api/tasks/batch", 2, batch_tasks),
+        ("GET /api/settings", 5, get("/api/settings")),
+        ("PATCH /api/settings", 1, update_settings),
+        ("GET /api/wins", 5, get("/api/wins", limit=50)),
+        ("GET /api/wins/stats", 2, get("/api/wins/stats", bucket="week")),
+        ("GET /api/wins/export", 1, get("/api/wins/export")),
+        ("POST /api/wins", 3, create_win),
+        ("GET /api/search", 3, get("/api/search", q="task")),
+        ("GET /api/gcal/accounts", 2, get("/api/gcal/accounts")),
+        ("GET /api/gcal/events/{profile}", 10, get("/api/gcal/events/{profile}", period="today")),
+        ("GET /api/gcal/connect/{profile}", 1, get("/api/gcal/connect/{profile}")),
+        ("GET /api/gcal/callback", 1, gcal_callback),
+        ("GET /api/auth/me", 3, get("/api/auth/me")),
+    ]
+
+
+async def drive(url: str, users: list, mix: list, rng: random.Random, concurrency: int, total: int, warmup: bool):
+    samples = {label: [] for label, _, _ in mix}
+    errors = {label: 0 for label, _, _ in mix}
+    labels = [label for label, _, _ in mix]
+    weights = [weight for _, weight, _ in mix]
+    factories = dict((label, factory) for label, _, factory in mix)
+    remaining = total
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        async def send(user: BenchUser, label: str) -> tuple:
+            method, path, kwargs = factories[label](user)
+            start = time.perf_counter()
+            resp = await client.request(method, path, headers=user.headers, **kwargs)
+            elapsed = time.perf_counter() - start
+            if method == "POST" and path == "/api/tasks" and resp.status_code == 200:
+                user.task_ids.append(resp.json()["id"])
+            return elapsed, resp.status_code < 400
+
+        if warmup:
+            # First calls sync calendars and refresh tokens; keep that out of the numbers
+            for user in users:
+                await asyncio.gather(*(send(user, label) for label in labels))
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                label = rng.choices(labels, weights)[0]
+                elapsed, ok = await send(rng.choice(users), label)
+                samples[label].append(elapsed)
+                if not ok:
+                    errors[label] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return elapsed, samples, errors
+
+
+def summarize(label: str, latencies: list, errors: int, elapsed: float) -> dict:
+    return {
+        "route": label,
+        "count": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds added to each PostgREST/Auth call")
+    parser.add_argument("--google-latency", type=float, default=0.08, help="seconds added to each Google call")
+    parser.add_argument("--requests", type=int, default=3000, help="measured requests in total")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests kept in flight")
+    parser.add_argument("--users", type=int, default=20, help="distinct users the requests are spread over")
+    parser.add_argument("--tasks", type=int, default=40, help="seeded tasks per user")
+    parser.add_argument("--wins", type=int, default=500, help="seeded wins per user")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the request mix")
+    parser.add_argument("--remote-auth", action="store_true", help="verify tokens via the fake Auth server")
+    parser.add_argument("--rate-limits", action="store_true", help="keep the per-user rate limits on")
+    parser.add_argument("--no-warmup", action="store_true", help="measure first calls (cold caches) too")
+    parser.add_argument("--json", metavar="PATH", help="also write the results to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fake = FakePostgrest(latency=args.latency, jwt_secret=JWT_SECRET)
+    google = FakeGoogle(latency=args.google_latency)
+    users = [BenchUser(f"bench-user-{i}") for i in range(args.users)]
+    seed(fake, users, args.tasks, args.wins)
+
+    with ServerProcess(fake.app) as supabase, ServerProcess(google.app) as google_server:
+        env = {
+            "GOOGLE_TOKEN_URL": f"{google_server.url}/token",
+            "GOOGLE_USERINFO_URL": f"{google_server.url}/oauth2/v2/userinfo",
+            "GOOGLE_CALENDAR_API_URL": f"{google_server.url}/calendar/v3",
+            "GCAL_CLIENT_ID": "bench-client",
+            "GCAL_CLIENT_SECRET": "bench-secret",
+        }
+        if args.remote_auth:
+            env["SUPABASE_JWT_SECRET"] = ""
+        if not args.rate_limits:
+            env["RATE_LIMIT_PER_SECOND"] = "0"
+            env["GCAL_RATE_LIMIT_PER_SECOND"] = "0"
+        server = boot_api(supabase.url, **env)
+
+        with ServerProcess(server.app) as api:
+            mix = build_mix(rng)
+            elapsed, samples, errors = asyncio.run(
+                drive(api.url, users, mix, rng, args.concurrency, args.requests, not args.no_warmup)
+            )
+            # Counted after the run, so the warm-up's upstream calls are included
+            supabase_stats = httpx.get(f"{supabase.url}/__stats").json()
+            google_stats = httpx.get(f"{google_server.url}/__stats").json()
+            upstream = {
+                "supabase": supabase_stats["requests"],
+                "google": google_stats["requests"],
+                "token_refreshes": google_stats["token_refreshes"],
+            }
+
+    rows = [summarize(label, samples[label], errors[label], elapsed) for label, _, _ in mix]
+    overall = summarize("all", [s for lat in samples.values() for s in lat], sum(errors.values()), elapsed)
+
+    print(
+        f"PostgREST/Auth latency {args.latency * 1000:.0f} ms, Google latency {args.google_latency * 1000:.0f} ms, "
+        f"{args.concurrency} in flight, {args.requests} requests over {args.users} users"
+    )
+    print(f"{'route':<38} {'count':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for row in rows + [overall]:
+        print(
+            f"{row['route']:<38} {row['count']:>6} {row['errors']:>6} {row['rps']:>8.1f} "
+            f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f}"
+        )
+    print(
+        f"upstream calls (incl. warm-up): {upstream['supabase']} Supabase, {upstream['google']} Google, "
+        f"{upstream['token_refreshes']} token refreshes"
+    )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "routes": rows, "overall": overall, "upstream": upstream}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
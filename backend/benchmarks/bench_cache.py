@@ -0,0 +1,111 @@
+"""Cache hit rates and rate-limit allowances as the API scales out to more workers.
+
+Simulates N API workers in one process, each with its own cache client:
+either a private MemoryCache (CACHE_URL unset) or a RedisCache pointed at
+one FakeRedis (CACHE_URL=redis://...). Requests for a skewed population of
+users are spread over the workers at random, the way a load balancer
+would; a miss costs a `--db-latency` settings read and fills the cache.
+Reports the hit rate, database reads and lookup latency per worker count,
+then how many of a burst of calls from one user each setup lets through.
+
+    python backend/benchmarks/bench_cache.py --workers 1,2,4,8 --users 2000 --requests 20000
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from fastapi import HTTPException
+
+from fake_redis import FakeRedis
+from harness import BACKEND_DIR, percentile
+
+sys.path.insert(0, str(BACKEND_DIR))
+from cache import MemoryCache, RedisCache  # noqa: E402
+from ratelimit import RateLimiter  # noqa: E402
+
+SETTINGS = {"theme": "yellow", "dark_mode": "auto", "updated_at": "2026-01-01T00:00:00+00:00"}
+
+
+def make_caches(kind: str, workers: int, url: str) -> list:
+    if kind == "memory":
+        return [MemoryCache(100000) for _ in range(workers)]
+    # A fresh prefix per run so earlier runs' entries don't count as hits
+    prefix = f"bench{time.monotonic_ns()}:"
+    return [RedisCache(url, prefix=prefix) for _ in range(workers)]
+
+
+async def hit_rate(caches: list, users: int, requests: int, db_latency: float, ttl: float, rng) -> tuple:
+    """(hits, database reads, lookup latencies in ms) for `requests` settings reads"""
+    # Zipf-like: a few users make most of the requests
+    weights = [1 / (rank + 1) for rank in range(users)]
+    picks = rng.choices(range(users), weights=weights, k=requests)
+    hits = reads = 0
+    latencies = []
+    for user in picks:
+        cache = rng.choice(caches)
+        start = time.perf_counter()
+        settings = await cache.get(f"settings:user-{user}")
+        latencies.append((time.perf_counter() - start) * 1000)
+        if settings is not None:
+            hits += 1
+            continue
+        reads += 1
+        await asyncio.sleep(db_latency)
+        await cache.set(f"settings:user-{user}", {**SETTINGS, "user_id": f"user-{user}"}, ttl)
+    return hits, reads, latencies
+
+
+async def allowed(caches: list, calls: int, rate: float, burst: float, rng) -> int:
+    """Calls from one user (spread over the workers) that the per-user limit lets through"""
+    limiters = [RateLimiter("bench", rate, burst, cache=cache) for cache in caches]
+    passed = 0
+    for _ in range(calls):
+        try:
+            await rng.choice(limiters).check("user-1")
+            passed += 1
+        except HTTPException:
+            pass
+    return passed
+
+
+async def run(args) -> None:
+    with FakeRedis(latency=args.redis_latency) as redis_server:
+        print(f"{'cache':<8} {'workers':>7} {'hit rate':>9} {'db reads':>9} {'p50 ms':>8} {'p99 ms':>8} {'burst allowed':>14}")
+        for kind in ("memory", "redis"):
+            for workers in args.workers:
+                rng = random.Random(args.seed)
+                caches = make_caches(kind, workers, redis_server.url)
+                hits, reads, latencies = await hit_rate(
+                    caches, args.users, args.requests, args.db_latency, args.ttl, rng
+                )
+                passed = await allowed(caches, args.burst_calls, args.rate, args.burst, rng)
+                for cache in caches:
+                    await cache.close()
+                print(
+                    f"{kind:<8} {workers:>7} {hits / args.requests:>8.1%} {reads:>9}"
+                    f" {percentile(latencies, 50):>8.3f} {percentile(latencies, 99):>8.3f}"
+                    f" {passed:>6}/{args.burst_calls:<7}"
+                )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4,8", help="comma-separated worker counts to compare")
+    parser.add_argument("--users", type=int, default=2000, help="distinct users")
+    parser.add_argument("--requests", type=int, default=20000, help="settings reads per run")
+    parser.add_argument("--ttl", type=float, default=300, help="seconds a cached entry lives")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="seconds added to each cache miss")
+    parser.add_argument("--redis-latency", type=float, default=0.0, help="seconds added to each Redis command")
+    parser.add_argument("--rate", type=float, default=10, help="per-user rate limit, calls/sec")
+    parser.add_argument("--burst", type=float, default=40, help="per-user rate limit burst")
+    parser.add_argument("--burst-calls", type=int, default=200, help="back-to-back calls from one user")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the request mix")
+    args = parser.parse_args()
+    args.workers = [int(w) for w in args.workers.split(",")]
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
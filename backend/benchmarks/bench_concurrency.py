@@ -0,0 +1,72 @@
+"""Concurrency benchmark for the DoIt API's data layer.
+
+Boots server.py against an in-memory PostgREST stand-in that adds a fixed
+latency to every query, then drives GET /api/tasks/{profile} with increasing
+numbers of requests in flight. With a non-blocking data layer throughput grows
+with concurrency until the worker saturates; a blocking `.execute()` pins it at
+roughly 1 / latency no matter how many requests are waiting.
+
+    python backend/benchmarks/bench_concurrency.py --latency 0.05 --requests 400
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from fake_supabase import FakePostgrest
+from harness import BackgroundServer, boot_api, mint_token, percentile
+
+
+async def drive(url: str, token: str, concurrency: int, total: int) -> tuple:
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async with httpx.AsyncClient(base_url=url, headers={"Authorization": f"Bearer {token}"}) as client:
+        async def worker():
+            while not queue.empty():
+                queue.get_nowait()
+                start = time.perf_counter()
+                resp = await client.get("/api/tasks/personal")
+                resp.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return total / elapsed, latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to each PostgREST call")
+    parser.add_argument("--requests", type=int, default=400, help="requests per concurrency level")
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64", help="comma-separated in-flight request counts")
+    args = parser.parse_args()
+
+    fake = FakePostgrest(latency=args.latency)
+    fake.seed("tasks", [
+        {"user_id": "bench-user", "title": f"task {i}", "profile": "personal", "section": "today", "completed": False}
+        for i in range(20)
+    ])
+
+    with BackgroundServer(fake.app) as postgrest:
+        # Every request comes from one user, which the per-user rate limit would throttle
+        server = boot_api(postgrest.url, RATE_LIMIT_PER_SECOND="0")
+        token = mint_token("bench-user")
+        with BackgroundServer(server.app) as api:
+            print(f"PostgREST latency {args.latency * 1000:.0f} ms, {args.requests} requests per level")
+            print(f"{'in-flight':>10} {'req/s':>10} {'p50 ms':>10} {'p95 ms':>10}")
+            for level in [int(n) for n in args.levels.split(",")]:
+                throughput, latencies = asyncio.run(drive(api.url, token, level, args.requests))
+                print(
+                    f"{level:>10} {throughput:>10.1f} "
+                    f"{percentile(latencies, 50) * 1000:>10.1f} {percentile(latencies, 95) * 1000:>10.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Serialization and compression cost of the API's largest payloads.
+
+Builds a long wins history and a large calendar events list shaped like the API's
+responses, then times the two ways FastAPI can turn them into bytes
+(jsonable_encoder + JSONResponse, the framework default, versus handing the
+already JSON-safe rows straight to ORJSONResponse) and what gzip and brotli do
+to the bytes on the wire at the levels CompressionMiddleware uses.
+
+    python backend/benchmarks/bench_serialization.py --wins 5000 --events 300
+"""
+import argparse
+import gzip
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from harness import BACKEND_DIR
+
+sys.path.insert(0, str(BACKEND_DIR))
+from compression import brotli  # noqa: E402  (None when Brotli isn't installed)
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+def make_wins(count: int) -> dict:
+    now = datetime.now(timezone.utc)
+    wins = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": "3f1c2a9e-8a7b-4c1d-9e2f-0a1b2c3d4e5f",
+            "task": f"Finish the quarterly report section {i % 40}",
+            "completed_at": (now - timedelta(hours=5 * i)).isoformat(),
+        }
+        for i in range(count)
+    ]
+    return {"wins": wins, "next_cursor": None}
+
+
+def make_events(count: int) -> list:
+    start = datetime.now(timezone.utc).replace(hour=8, minute=0, second=0, microsecond=0)
+    return [
+        {
+            "id": f"evt{i:05d}",
+            "title": f"Planning sync {i}",
+            "description": "Agenda: review last week's numbers, walk through open questions, "
+                           "agree owners for follow-ups. Dial-in details are in the invite. " * 3,
+            "start": (start + timedelta(minutes=15 * i)).isoformat(),
+            "end": (start + timedelta(minutes=15 * i + 30)).isoformat(),
+            "all_day": False,
+            "type": "event",
+            "location": "Conference room B / https://meet.example.com/abc-defg-hij",
+            "status": "confirmed",
+            "calendar_profile": "work",
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(fn, repeat: int) -> tuple:
+    """Fastest of `repeat` runs in milliseconds, and the last result"""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def report(name: str, payload, repeat: int) -> None:
+    default_ms, default_body = best_of(lambda: JSONResponse(jsonable_encoder(payload)).body, repeat)
+    orjson_ms, body = best_of(lambda: ORJSONResponse(payload).body, repeat)
+    gzip_ms, gzipped = best_of(lambda: gzip.compress(body, compresslevel=GZIP_LEVEL), repeat)
+
+    print(f"\n{name}")
+    print(f"  {'serialize':<38} {'ms':>8} {'bytes':>10}")
+    print(f"  {'jsonable_encoder + JSONResponse':<38} {default_ms:>8.2f} {len(default_body):>10}")
+    print(f"  {'ORJSONResponse (no encoder pass)':<38} {orjson_ms:>8.2f} {len(body):>10}")
+    print(f"  {'speedup':<38} {default_ms / orjson_ms:>7.1f}x")
+    print(f"  {'compress':<38} {'ms':>8} {'bytes':>10} {'ratio':>7}")
+    print(f"  {f'gzip level {GZIP_LEVEL}':<38} {gzip_ms:>8.2f} {len(gzipped):>10} {len(body) / len(gzipped):>6.1f}x")
+    if brotli is not None:
+        br_ms, brotlied = best_of(lambda: brotli.compress(body, quality=BROTLI_QUALITY), repeat)
+        print(f"  {f'brotli quality {BROTLI_QUALITY}':<38} {br_ms:>8.2f} {len(brotlied):>10} {len(body) / len(brotlied):>6.1f}x")
+    else:
+        print("  brotli: not installed")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--wins", type=int, default=5000, help="wins in the history payload")
+    parser.add_argument("--events", type=int, default=300, help="events in the calendar payload")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    report(f"GET /api/wins-style payload, {args.wins} wins", make_wins(args.wins), args.repeat)
+    report(f"GET /api/gcal/events-style payload, {args.events} events", make_events(args.events), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""The two storage backends side by side: PostgREST over HTTP versus a direct asyncpg pool.
+
+Seeds users with tasks, wins and settings in a local Postgres, then drives
+the same weighted mix of repository calls (the ones the /api routes make)
+through each backend with `--concurrency` calls in flight, and reports
+calls/sec and p50/p95/p99 latency per operation.
+
+    python backend/benchmarks/bench_storage.py --dsn postgresql://postgres@localhost:5432/doit_bench --setup
+
+--setup applies local_postgres.sql and the supabase_*_migration.sql files
+(minus the pg_cron/pg_net job setup) to an empty, throwaway database first.
+The PostgREST side runs only with --postgrest-url, pointing at a PostgREST
+server for the same database configured with harness.JWT_SECRET as its JWT
+secret and `authenticated`/`anon` as its roles.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+import jwt
+
+from harness import BACKEND_DIR, JWT_SECRET, mint_token, percentile
+
+sys.path.insert(0, str(BACKEND_DIR))
+from pg_storage import asyncpg, create_pg_pool, PgRepository, PgSession  # noqa: E402
+from storage import create_postgrest_pool, PostgrestClient, PostgrestRepository  # noqa: E402
+
+REPO_DIR = BACKEND_DIR.parent
+MIGRATIONS = (
+    "supabase_migration.sql",
+    "supabase_gcal_migration.sql",
+    "supabase_happy_migration.sql",
+    "supabase_happy_v2_migration.sql",
+    "supabase_task_sync_migration.sql",
+    "supabase_wins_stats_migration.sql",
+    "supabase_task_batch_migration.sql",
+    "supabase_scheduler_migration.sql",
+    "supabase_search_migration.sql",
+)
+# The Happy jobs' pg_cron section needs Supabase extensions; everything before it is schema
+CRON_MARKER = "-- pg_cron setup"
+PROFILES = ("personal", "work")
+SECTIONS = ("today", "tomorrow", "someday")
+
+
+async def apply_schema(conn) -> None:
+    await conn.execute((BACKEND_DIR / "benchmarks" / "local_postgres.sql").read_text())
+    for name in MIGRATIONS:
+        sql = (REPO_DIR / name).read_text()
+        marker = sql.find(CRON_MARKER)
+        if marker != -1:
+            sql = sql[:sql.rfind("-- ====", 0, marker)]
+        await conn.execute(sql)
+
+
+async def seed(conn, users: int, tasks: int, wins: int) -> list:
+    """Create `users` users with their rows and return their ids"""
+    now = datetime.now(timezone.utc)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    await conn.executemany("insert into auth.users (id) values ($1::text::uuid)", [(u,) for u in user_ids])
+    await conn.executemany(
+        "insert into user_settings (user_id) values ($1::text::uuid)", [(u,) for u in user_ids]
+    )
+    await conn.executemany(
+        "insert into happy_settings (user_id, email, timezone) values ($1::text::uuid, $2, 'Europe/Berlin')",
+        [(u, f"{u}@example.com") for u in user_ids],
+    )
+    await conn.executemany(
+        "insert into tasks (user_id, title, profile, section) values ($1::text::uuid, $2, $3, $4)",
+        [
+            (u, f"Seeded task {i}", PROFILES[i % 2], SECTIONS[i % 3])
+            for u in user_ids for i in range(tasks)
+        ],
+    )
+    await conn.executemany(
+        "insert into wins (user_id, task, completed_at) values ($1::text::uuid, $2, $3)",
+        [
+            (u, f"Seeded win {i}", now - timedelta(hours=7 * i))
+            for u in user_ids for i in range(wins)
+        ],
+    )
+    return user_ids
+
+
+class Caller:
+    """One user's repository plus the tasks this run created for it"""
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.open_tasks: list = []
+
+
+async def op_create_task(caller: Caller) -> None:
+    task = await caller.repo.create_task(
+        {"title": "Benchmark task", "profile": "personal", "section": "today", "completed": False}
+    )
+    caller.open_tasks.append(task["id"])
+
+
+async def op_update_task(caller: Caller) -> None:
+    if not caller.open_tasks:
+        return await op_create_task(caller)
+    await caller.repo.update_task(
+        caller.open_tasks[-1],
+        {"section": "tomorrow", "updated_at": datetime.now(timezone.utc).isoformat()},
+    )
+
+
+async def op_complete_task(caller: Caller) -> None:
+    if not caller.open_tasks:
+        return await op_create_task(caller)
+    await caller.repo.complete_task(caller.open_tasks.pop())
+
+
+async def op_apply_task_batch(caller: Caller) -> None:
+    await caller.repo.apply_task_batch([
+        {"op": "create", "task": {"title": f"Batch task {i}", "profile": "work", "section": "someday"}}
+        for i in range(5)
+    ])
+
+
+MIX = (
+    ("list_tasks", 6, lambda c: c.repo.list_tasks("personal")),
+    ("get_tasks_version", 4, lambda c: c.repo.get_tasks_version("personal")),
+    ("list_wins_page", 3, lambda c: c.repo.list_wins_page(50)),
+    ("get_win_summary", 2, lambda c: c.repo.get_win_summary(date.today(), date.today() - timedelta(days=29), date.today())),
+    ("search", 2, lambda c: c.repo.search("benchmark", 20)),
+    ("upsert_settings", 2, lambda c: c.repo.upsert_settings({})),
+    ("get_happy_timezone", 2, lambda c: c.repo.get_happy_timezone()),
+    ("create_task", 2, op_create_task),
+    ("update_task", 2, op_update_task),
+    ("complete_task", 1, op_complete_task),
+    ("apply_task_batch", 1, op_apply_task_batch),
+)
+
+
+async def drive(callers: list, requests: int, concurrency: int, rng: random.Random) -> tuple:
+    names = [name for name, weight, _ in MIX for _ in range(weight)]
+    calls = {name: call for name, _, call in MIX}
+    plan = [(rng.choice(callers), rng.choice(names)) for _ in range(requests)]
+    samples: dict = {name: [] for name, _, _ in MIX}
+    errors = 0
+    position = 0
+
+    async def worker():
+        nonlocal position, errors
+        while position < len(plan):
+            caller, name = plan[position]
+            position += 1
+            start = time.perf_counter()
+            try:
+                await calls[name](caller)
+            except Exception:
+                errors += 1
+                continue
+            samples[name].append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - start, samples, errors
+
+
+def report(label: str, elapsed: float, samples: dict, errors: int) -> None:
+    total = sum(len(s) for s in samples.values())
+    every = [ms for s in samples.values() for ms in s]
+    print(f"\n{label}: {total / elapsed:.0f} calls/s, {errors} errors")
+    print(f"  {'operation':<24} {'calls':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, s in [*samples.items(), ("all", every)]:
+        print(f"  {name:<24} {len(s):>6} {percentile(s, 50):>8.2f} {percentile(s, 95):>8.2f} {percentile(s, 99):>8.2f}")
+
+
+async def run(args) -> None:
+    pool = await create_pg_pool(args.dsn, args.pool_size, args.pool_size)
+    async with pool.acquire() as conn:
+        if args.setup:
+            await apply_schema(conn)
+        user_ids = await seed(conn, args.users, args.tasks, args.wins)
+
+    def claims(user_id: str) -> dict:
+        return {"sub": user_id, "aud": "authenticated", "role": "authenticated"}
+
+    callers = [Caller(PgRepository(PgSession(pool, "authenticated", claims(u)), u)) for u in user_ids]
+    await drive(callers, args.warmup, args.concurrency, random.Random(args.seed))
+    report("asyncpg", *await drive(callers, args.requests, args.concurrency, random.Random(args.seed)))
+    await pool.close()
+
+    if not args.postgrest_url:
+        print("\nPostgREST: skipped (pass --postgrest-url to compare)")
+        return
+    http = create_postgrest_pool(args.postgrest_url, args.pool_size, args.pool_size)
+    anon_key = jwt.encode({"role": "anon"}, JWT_SECRET, algorithm="HS256")
+    callers = [
+        Caller(PostgrestRepository(PostgrestClient(http, mint_token(u), anon_key), u)) for u in user_ids
+    ]
+    await drive(callers, args.warmup, args.concurrency, random.Random(args.seed))
+    report("PostgREST", *await drive(callers, args.requests, args.concurrency, random.Random(args.seed)))
+    await http.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="local Postgres to seed and query")
+    parser.add_argument("--postgrest-url", help="PostgREST server for the same database")
+    parser.add_argument("--setup", action="store_true", help="apply the schema to an empty database first")
+    parser.add_argument("--requests", type=int, default=3000, help="measured calls per backend")
+    parser.add_argument("--warmup", type=int, default=200, help="unmeasured calls per backend")
+    parser.add_argument("--concurrency", type=int, default=16, help="calls kept in flight")
+    parser.add_argument("--pool-size", type=int, default=10, help="connections per backend")
+    parser.add_argument("--users", type=int, default=20, help="seeded users")
+    parser.add_argument("--tasks", type=int, default=40, help="seeded tasks per user")
+    parser.add_argument("--wins", type=int, default=500, help="seeded wins per user")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the call mix")
+    args = parser.parse_args()
+    if asyncpg is None:
+        parser.error("asyncpg is not installed")
+    if not args.dsn:
+        parser.error("--dsn or DATABASE_URL is required")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
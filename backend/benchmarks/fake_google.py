@@ -0,0 +1,118 @@
+"""In-memory stand-in for Google's OAuth and Calendar APIs, for offline benchmarks.
+
+Serves the token endpoint (authorization_code and refresh_token grants), the
+userinfo endpoint and calendars/{id}/events with timeMin/timeMax filtering,
+pageToken paging and syncToken incremental sync. Every calendar gets the same
+generated events: `events_per_day` timed events a day from yesterday through
+the next `days` days. Every request sleeps for `latency` seconds first.
+
+Point the API at it with GOOGLE_TOKEN_URL={url}/token,
+GOOGLE_USERINFO_URL={url}/oauth2/v2/userinfo and
+GOOGLE_CALENDAR_API_URL={url}/calendar/v3.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+
+class FakeGoogle:
+    """Generated calendars plus the ASGI app serving them"""
+
+    def __init__(self, latency: float = 0.0, events_per_day: int = 6, days: int = 14, token_ttl: int = 3600):
+        self.latency = latency
+        self.token_ttl = token_ttl
+        self.requests = 0
+        self.token_refreshes = 0
+        self.events = self._generate(events_per_day, days)
+        self.sync_token = uuid.uuid4().hex
+        self.app = Starlette(routes=[
+            Route("/__stats", self.handle_stats, methods=["GET"]),
+            Route("/token", self.handle_token, methods=["POST"]),
+            Route("/oauth2/v2/userinfo", self.handle_userinfo, methods=["GET"]),
+            Route("/calendar/v3/calendars/{calendar_id:path}/events", self.handle_events, methods=["GET"]),
+        ])
+
+    def _generate(self, events_per_day: int, days: int) -> list:
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        events = []
+        for day in range(-1, days + 1):
+            for slot in range(events_per_day):
+                start = today + timedelta(days=day, hours=8 + slot * 10 / max(events_per_day, 1))
+                events.append({
+                    "kind": "calendar#event",
+                    "id": f"evt{day + 1:03d}{slot:03d}",
+                    "status": "confirmed",
+                    "summary": f"Meeting {slot + 1}",
+                    "description": "Generated by the benchmark Google stand-in",
+                    "location": "Room 1",
+                    "eventType": "default",
+                    "start": {"dateTime": start.isoformat()},
+                    "end": {"dateTime": (start + timedelta(minutes=45)).isoformat()},
+                })
+        return events
+
+    async def _pause(self) -> None:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def handle_stats(self, request: Request) -> Response:
+        """Counters, readable when the fake runs in another process"""
+        return JSONResponse({"requests": self.requests, "token_refreshes": self.token_refreshes})
+
+    async def handle_token(self, request: Request) -> Response:
+        await self._pause()
+        form = await request.form()
+        if form.get("grant_type") not in ("authorization_code", "refresh_token"):
+            return JSONResponse({"error": "unsupported_grant_type"}, status_code=400)
+        body = {
+            "access_token": f"ya29.fake-{uuid.uuid4().hex}",
+            "expires_in": self.token_ttl,
+            "token_type": "Bearer",
+            "scope": "https://www.googleapis.com/auth/calendar.readonly",
+        }
+        if form.get("grant_type") == "authorization_code":
+            body["refresh_token"] = f"1//fake-{uuid.uuid4().hex}"
+        else:
+            self.token_refreshes += 1
+        return JSONResponse(body)
+
+    async def handle_userinfo(self, request: Request) -> Response:
+        await self._pause()
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse({"error": "unauthenticated"}, status_code=401)
+        return JSONResponse({"id": "1234567890", "email": "bench@example.com", "verified_email": True})
+
+    async def handle_events(self, request: Request) -> Response:
+        await self._pause()
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return JSONResponse({"error": {"code": 401, "message": "Login Required"}}, status_code=401)
+
+        params = request.query_params
+        if "syncToken" in params:
+            # Nothing changes between syncs; an unknown token gets the real API's 410
+            if params["syncToken"] != self.sync_token:
+                return JSONResponse({"error": {"code": 410, "message": "Sync token is no longer valid"}}, status_code=410)
+            return JSONResponse({"kind": "calendar#events", "items": [], "nextSyncToken": self.sync_token})
+
+        items = self.events
+        if "timeMin" in params:
+            time_min = datetime.fromisoformat(params["timeMin"].replace("Z", "+00:00"))
+            items = [e for e in items if datetime.fromisoformat(e["end"]["dateTime"]) > time_min]
+        if "timeMax" in params:
+            time_max = datetime.fromisoformat(params["timeMax"].replace("Z", "+00:00"))
+            items = [e for e in items if datetime.fromisoformat(e["start"]["dateTime"]) < time_max]
+
+        page_size = int(params.get("maxResults", "250"))
+        offset = int(params.get("pageToken", "0"))
+        page = {"kind": "calendar#events", "items": items[offset:offset + page_size]}
+        if offset + page_size < len(items):
+            page["nextPageToken"] = str(offset + page_size)
+        else:
+            page["nextSyncToken"] = self.sync_token
+        return JSONResponse(page)
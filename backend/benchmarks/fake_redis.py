@@ -0,0 +1,226 @@
+"""In-memory stand-in for Redis, for offline benchmarks and trying CACHE_URL locally.
+
+Speaks RESP2 over TCP and implements the commands cache.RedisCache sends:
+GET, SET (with PX/EX), DEL, INCR/INCRBY, PEXPIRE, PTTL, MULTI/EXEC,
+PUBLISH and SUBSCRIBE/UNSUBSCRIBE, plus the PING/CLIENT/SELECT
+housekeeping redis-py does on connect. Each command sleeps for `latency`
+seconds before it is answered.
+
+    with FakeRedis(latency=0.0005) as redis_server:
+        server = boot_api(supabase.url, CACHE_URL=redis_server.url)
+"""
+import asyncio
+import threading
+import time
+from typing import Optional
+
+from harness import free_port
+
+
+class _Error(str):
+    """A RESP error reply"""
+
+
+def _encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, _Error):
+        return b"-" + value.encode() + b"\r\n"
+    if isinstance(value, str):
+        return b"+" + value.encode() + b"\r\n"
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    return b"*%d\r\n" % len(value) + b"".join(_encode(item) for item in value)
+
+
+class FakeRedis:
+    """Keys, counters and channels in memory, served on its own thread and event loop"""
+
+    def __init__(self, latency: float = 0.0, port: int = 0):
+        self.latency = latency
+        self.port = port or free_port()
+        self.url = f"redis://127.0.0.1:{self.port}"
+        self.commands = 0
+        self._values: dict = {}
+        self._channels: dict = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- running ----------
+
+    async def serve(self) -> asyncio.AbstractServer:
+        return await asyncio.start_server(self._handle, "127.0.0.1", self.port)
+
+    def __enter__(self) -> "FakeRedis":
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            server = self._loop.run_until_complete(self.serve())
+            ready.set()
+            self._loop.run_forever()
+            server.close()
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+    # ---------- protocol ----------
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> Optional[list]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        queued: Optional[list] = None
+        subscriptions: set = set()
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                self.commands += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                name = args[0].upper()
+                if name == b"MULTI":
+                    queued = []
+                    reply = "OK"
+                elif name == b"EXEC":
+                    reply = [self._execute(cmd) for cmd in queued or []]
+                    queued = None
+                elif queued is not None:
+                    queued.append(args)
+                    reply = "QUEUED"
+                elif name in (b"SUBSCRIBE", b"UNSUBSCRIBE"):
+                    for reply in self._subscription(name, args[1:], subscriptions, writer):
+                        writer.write(_encode(reply))
+                    await writer.drain()
+                    continue
+                else:
+                    reply = self._execute(args)
+                writer.write(_encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscriptions:
+                self._channels.get(channel, set()).discard(writer)
+            writer.close()
+
+    def _subscription(self, name: bytes, channels: list, subscriptions: set, writer) -> list:
+        replies = []
+        if name == b"SUBSCRIBE":
+            for channel in channels:
+                subscriptions.add(channel)
+                self._channels.setdefault(channel, set()).add(writer)
+                replies.append([b"subscribe", channel, len(subscriptions)])
+            return replies
+        for channel in channels or list(subscriptions):
+            subscriptions.discard(channel)
+            self._channels.get(channel, set()).discard(writer)
+            replies.append([b"unsubscribe", channel, len(subscriptions)])
+        return replies or [[b"unsubscribe", None, 0]]
+
+    # ---------- commands ----------
+
+    def _live(self, key: bytes) -> Optional[list]:
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._values[key]
+            return None
+        return entry
+
+    def _execute(self, args: list):
+        name, *rest = args
+        name = name.upper().decode()
+        handler = getattr(self, f"_cmd_{name.lower()}", None)
+        if handler is None:
+            return _Error(f"ERR unknown command '{name}'")
+        try:
+            return handler(*rest)
+        except (TypeError, ValueError):
+            return _Error(f"ERR wrong arguments for '{name}'")
+
+    def _cmd_ping(self, *args):
+        return args[0] if args else "PONG"
+
+    def _cmd_client(self, *args):
+        return "OK"
+
+    def _cmd_select(self, db):
+        return "OK"
+
+    def _cmd_get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    def _cmd_set(self, key, value, *options):
+        expires_at = None
+        options = [o.upper() for o in options]
+        if b"PX" in options:
+            expires_at = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+        elif b"EX" in options:
+            expires_at = time.monotonic() + int(options[options.index(b"EX") + 1])
+        self._values[key] = [value, expires_at]
+        return "OK"
+
+    def _cmd_del(self, *keys):
+        return sum(self._values.pop(key, None) is not None for key in keys)
+
+    def _cmd_incrby(self, key, amount):
+        entry = self._live(key)
+        try:
+            value = int(entry[0] if entry else 0) + int(amount)
+        except ValueError:
+            return _Error("ERR value is not an integer or out of range")
+        if entry:
+            entry[0] = b"%d" % value
+        else:
+            self._values[key] = [b"%d" % value, None]
+        return value
+
+    def _cmd_incr(self, key):
+        return self._cmd_incrby(key, b"1")
+
+    def _cmd_pexpire(self, key, milliseconds, *options):
+        entry = self._live(key)
+        if entry is None:
+            return 0
+        entry[1] = time.monotonic() + int(milliseconds) / 1000
+        return 1
+
+    def _cmd_pttl(self, key):
+        entry = self._live(key)
+        if entry is None:
+            return -2
+        return -1 if entry[1] is None else int((entry[1] - time.monotonic()) * 1000)
+
+    def _cmd_publish(self, channel, message):
+        subscribers = self._channels.get(channel, set())
+        for writer in subscribers:
+            writer.write(_encode([b"message", channel, message]))
+        return len(subscribers)
@@ -0,0 +1,421 @@
+"""In-memory stand-in for Supabase's PostgREST and Auth APIs, for offline benchmarks.
+
+Implements the subset of PostgREST the DoIt API uses: eq/neq/gt/gte/lt/lte/in/is
+filters, or/and logic trees, order, limit, upserts via on_conflict, Prefer: return/count,
+single-object responses, an optional max_rows cap on reads, and Python
+re-implementations of the RPC functions from the supabase_*_migration.sql files. Auth serves GET /auth/v1/user (the remote
+token check) and an empty JWKS. Every request sleeps for `latency` seconds first to
+stand in for the network and database round-trip.
+"""
+import asyncio
+import difflib
+import uuid
+import jwt
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+RESERVED_PARAMS = {"select", "order", "limit", "offset", "on_conflict", "columns"}
+
+TABLE_DEFAULTS = {
+    "tasks": {"completed": False},
+    "user_settings": {"theme": "yellow", "dark_mode": "auto"},
+    "happy_settings": {"timezone": "America/New_York", "enabled": True},
+}
+
+
+def _matches(row: dict, column: str, expression: str) -> bool:
+    op, _, value = expression.partition(".")
+    actual = row.get(column)
+    if isinstance(actual, bool):
+        # Postgres reads booleans case-insensitively; postgrest-py sends Python's "True"
+        actual = str(actual).lower()
+        value = value.lower()
+    if op == "eq":
+        return actual is not None and str(actual) == value
+    if op == "neq":
+        return str(actual) != value
+    if op == "in":
+        return str(actual) in value.strip("()").split(",")
+    if op == "is":
+        return actual is None if value == "null" else str(actual) == value
+    if op in ("gt", "gte", "lt", "lte"):
+        if actual is None:
+            return False
+        actual = str(actual)
+        return {
+            "gt": actual > value,
+            "gte": actual >= value,
+            "lt": actual < value,
+            "lte": actual <= value,
+        }[op]
+    return True
+
+
+def _split_conditions(tree: str) -> list:
+    """Split "a.eq.1,and(b.eq.2,c.eq.3)" on top-level commas, honouring quotes and parens"""
+    parts, depth, quoted, current = [], 0, False, ""
+    for char in tree:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    return parts + [current] if current else parts
+
+
+def _matches_tree(row: dict, operator: str, tree: str) -> bool:
+    results = []
+    for condition in _split_conditions(tree.strip()[1:-1]):
+        if condition.startswith(("or(", "and(")):
+            nested, _, rest = condition.partition("(")
+            results.append(_matches_tree(row, nested, "(" + rest))
+        else:
+            column, _, expression = condition.partition(".")
+            op, _, value = expression.partition(".")
+            results.append(_matches(row, column, f"{op}.{value.strip(chr(34))}"))
+    return any(results) if operator == "or" else all(results)
+
+
+class FakePostgrest:
+    """One in-memory database plus the ASGI app serving it"""
+
+    def __init__(self, latency: float = 0.0, jwt_secret: Optional[str] = None, max_rows: Optional[int] = None):
+        self.latency = latency
+        self.jwt_secret = jwt_secret
+        # Like PostgREST's db-max-rows: reads are silently cut to this many rows
+        self.max_rows = max_rows
+        self.tables: dict = {}
+        # table -> user_id -> rows, rebuilt lazily after rows are added or removed
+        self._by_user: dict = {}
+        self.requests = 0
+        self.functions = {
+            "apply_task_batch": self.apply_task_batch,
+            "complete_task": self.complete_task,
+            "search_items": self.search_items,
+            "win_summary": self.win_summary,
+            "win_totals": self.win_totals,
+        }
+        self.app = Starlette(routes=[
+            Route("/__stats", self.handle_stats, methods=["GET"]),
+            Route("/auth/v1/user", self.handle_user, methods=["GET"]),
+            Route("/auth/v1/.well-known/jwks.json", self.handle_jwks, methods=["GET"]),
+            Route("/rest/v1/rpc/{function}", self.handle_rpc, methods=["POST"]),
+            Route("/rest/v1/{table}", self.handle, methods=["GET", "HEAD", "POST", "PATCH", "DELETE"]),
+        ])
+
+    def seed(self, table: str, rows: list) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        for row in rows:
+            self.tables.setdefault(table, []).append(
+                {"id": str(uuid.uuid4()), "created_at": now, "updated_at": now, **row}
+            )
+        self._by_user.pop(table, None)
+
+    def _candidates(self, table: str, request: Request) -> list:
+        """Rows that could match, narrowed by the user_id=eq filter every API query carries.
+
+        Keeps the fake's own CPU cost flat as seeded tables grow, so it doesn't
+        become the bottleneck being measured.
+        """
+        user_filter = request.query_params.get("user_id", "")
+        if not user_filter.startswith("eq."):
+            return self.tables.setdefault(table, [])
+        return self._user_rows(table, user_filter[3:])
+
+    def _user_rows(self, table: str, user_id: str) -> list:
+        index = self._by_user.get(table)
+        if index is None:
+            index = self._by_user[table] = {}
+            for row in self.tables.setdefault(table, []):
+                index.setdefault(str(row.get("user_id")), []).append(row)
+        return index.get(user_id, [])
+
+    def _filter(self, table: str, request: Request) -> list:
+        rows = self._candidates(table, request)
+        filters = [
+            (column, expression)
+            for column, expression in request.query_params.multi_items()
+            if column not in RESERVED_PARAMS
+        ]
+        return [
+            r for r in rows
+            if all(
+                _matches_tree(r, c, e) if c in ("or", "and") else _matches(r, c, e)
+                for c, e in filters
+            )
+        ]
+
+    def _new_row(self, table: str, body: dict) -> dict:
+        now = datetime.now(timezone.utc).isoformat()
+        row = {"id": str(uuid.uuid4()), "created_at": now, "updated_at": now}
+        row.update(TABLE_DEFAULTS.get(table, {}))
+        if table == "wins":
+            row["completed_at"] = now
+        row.update(body)
+        return row
+
+    def _deleted(self, table: str, row: dict) -> None:
+        """Stand-in for the tasks delete trigger in supabase_task_sync_migration.sql"""
+        if table == "tasks":
+            self.tables.setdefault("task_tombstones", []).append({
+                "id": row["id"],
+                "user_id": row["user_id"],
+                "profile": row["profile"],
+                "deleted_at": datetime.now(timezone.utc).isoformat(),
+            })
+            self._by_user.pop("task_tombstones", None)
+
+    async def handle_stats(self, request: Request) -> Response:
+        """Request count, readable when the fake runs in another process"""
+        return JSONResponse({"requests": self.requests})
+
+    async def handle_user(self, request: Request) -> Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        token = request.headers.get("authorization", "").removeprefix("Bearer ")
+        try:
+            if self.jwt_secret:
+                claims = jwt.decode(token, self.jwt_secret, algorithms=["HS256"], audience="authenticated")
+            else:
+                claims = jwt.decode(token, options={"verify_signature": False})
+        except jwt.InvalidTokenError:
+            return JSONResponse({"code": 403, "error_code": "bad_jwt", "msg": "invalid JWT"}, status_code=403)
+        return JSONResponse({
+            "id": claims["sub"],
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": claims.get("email", f"{claims['sub']}@example.com"),
+            "app_metadata": {},
+            "user_metadata": {},
+            "created_at": "2024-01-01T00:00:00Z",
+        })
+
+    async def handle_jwks(self, request: Request) -> Response:
+        return JSONResponse({"keys": []})
+
+    async def handle_rpc(self, request: Request) -> Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        function = self.functions.get(request.path_params["function"])
+        if function is None:
+            return JSONResponse({"code": "PGRST202", "message": "Could not find the function"}, status_code=404)
+        # Stand-in for auth.uid(): the fake trusts the bearer token without checking it
+        token = request.headers.get("authorization", "").removeprefix("Bearer ")
+        user_id = jwt.decode(token, options={"verify_signature": False}).get("sub")
+        return JSONResponse(function(user_id, **(await request.json())))
+
+    def complete_task(self, user_id: str, task_id: str, completed_at: Optional[str] = None) -> Optional[dict]:
+        task = next(
+            (t for t in self.tables.get("tasks", []) if t["id"] == task_id and t.get("user_id") == user_id),
+            None,
+        )
+        if task is None:
+            return None
+        if task.get("completed"):
+            return {"task": task, "win": None}
+        task.update(completed=True, updated_at=datetime.now(timezone.utc).isoformat())
+        win = self._new_row("wins", {"user_id": user_id, "task": task["title"]})
+        if completed_at:
+            win["completed_at"] = completed_at
+        self.tables.setdefault("wins", []).append(win)
+        self._by_user.pop("wins", None)
+        return {"task": task, "win": win}
+
+    def apply_task_batch(self, user_id: str, ops: list) -> list:
+        tasks = self.tables.setdefault("tasks", [])
+        self._by_user.pop("tasks", None)
+        now = datetime.now(timezone.utc).isoformat()
+        owned = {t["id"]: t for t in tasks if t.get("user_id") == user_id}
+        results = []
+        for op in ops:
+            kind = op.get("op")
+            if kind == "create":
+                task = self._new_row("tasks", {"section": "today", **op["task"], "user_id": user_id})
+                tasks.append(task)
+                results.append({"op": kind, "ok": True, "task": task})
+            elif kind in ("update", "delete", "complete") and op.get("id") not in owned:
+                results.append({"op": kind, "ok": False, "id": op.get("id"), "error": "Task not found"})
+            elif kind == "update":
+                task = owned[op["id"]]
+                task.update({**op["changes"], "updated_at": now})
+                results.append({"op": kind, "ok": True, "task": task})
+            elif kind == "delete":
+                task = owned.pop(op["id"])
+                tasks.remove(task)
+                self._deleted("tasks", task)
+                results.append({"op": kind, "ok": True, "id": op["id"], "profile": task["profile"]})
+            elif kind == "complete":
+                completion = self.complete_task(user_id, op["id"], op.get("completed_at"))
+                results.append({"op": kind, "ok": True, **completion})
+            elif kind == "rollover":
+                moved = 0
+                for task in owned.values():
+                    if task["section"] == op["from_section"] and op.get("profile") in (None, task["profile"]):
+                        task.update(section=op["to_section"], updated_at=now)
+                        moved += 1
+                results.append({"op": kind, "ok": True, "moved": moved})
+            else:
+                results.append({"op": kind, "ok": False, "error": "Unknown op"})
+        return results
+
+    def win_summary(self, user_id: str, today: str, first_day: str, last_day: str) -> dict:
+        days = sorted(
+            (date.fromisoformat(r["day"]), r["count"]) for r in self._user_rows("win_daily_counts", user_id) if r["count"]
+        )
+        today_day = date.fromisoformat(today)
+        longest = current = run = 0
+        previous = None
+        for day, _ in days:
+            run = run + 1 if previous is not None and day - previous == timedelta(days=1) else 1
+            longest = max(longest, run)
+            # The run reaching today (or yesterday, if the user hasn't won yet today)
+            if day <= today_day and day >= today_day - timedelta(days=1):
+                current = run
+            previous = day
+        return {
+            "total": sum(count for _, count in days),
+            "longest_streak": longest,
+            "current_streak": current,
+            "days": [
+                {"day": day.isoformat(), "count": count}
+                for day, count in days if first_day <= day.isoformat() <= last_day
+            ],
+        }
+
+    def win_totals(self, user_id: str, user_ids: list) -> list:
+        totals: dict = {}
+        for row in self.tables.get("win_daily_counts", []):
+            if row["user_id"] in user_ids:
+                totals[row["user_id"]] = totals.get(row["user_id"], 0) + row["count"]
+        return [{"user_id": uid, "total": total} for uid, total in totals.items()]
+
+    def search_items(
+        self, user_id: str, query: str, max_results: int = 20,
+        after_rank: Optional[float] = None, after_id: Optional[str] = None,
+    ) -> list:
+        """Word overlap plus the closest single-word similarity, in place of ts_rank and pg_trgm"""
+        query = query.lower()
+        words = query.split()
+        matcher = difflib.SequenceMatcher(b=query)
+
+        def similarity(candidate: str) -> float:
+            matcher.set_seq1(candidate)
+            return matcher.ratio() if matcher.quick_ratio() >= 0.6 else 0.0
+
+        def rank(text: str) -> float:
+            candidates = text.lower().split()
+            overlap = sum(word in candidates for word in words) / len(words)
+            closest = max(map(similarity, candidates), default=0.0)
+            return round(overlap * 0.1 + closest, 6) if overlap or closest >= 0.6 else 0.0
+
+        matches = []
+        for task in self._user_rows("tasks", user_id):
+            if score := rank(task["title"]):
+                matches.append({
+                    "kind": "task", "id": task["id"], "title": task["title"], "profile": task["profile"],
+                    "section": task.get("section"), "completed": task.get("completed", False),
+                    "occurred_at": task["created_at"], "rank": score,
+                })
+        for win in self._user_rows("wins", user_id):
+            if score := rank(win["task"]):
+                matches.append({
+                    "kind": "win", "id": win["id"], "title": win["task"], "profile": None, "section": None,
+                    "completed": True, "occurred_at": win.get("completed_at"), "rank": score,
+                })
+        matches.sort(key=lambda m: (m["rank"], m["id"]), reverse=True)
+        if after_rank is not None:
+            matches = [m for m in matches if (m["rank"], m["id"]) < (after_rank, after_id)]
+        return matches[:max_results]
+
+    async def handle(self, request: Request) -> Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        table = request.path_params["table"]
+        rows = self.tables.setdefault(table, [])
+        params = request.query_params
+        prefer = request.headers.get("prefer", "")
+
+        if request.method in ("GET", "HEAD"):
+            result = self._filter(table, request)
+            for part in reversed(params.get("order", "").split(",") if "order" in params else []):
+                column, _, direction = part.partition(".")
+                result.sort(key=lambda r: str(r.get(column) or ""), reverse=direction.startswith("desc"))
+            total = len(result)
+            if "limit" in params:
+                result = result[:int(params["limit"])]
+            if self.max_rows is not None:
+                result = result[:self.max_rows]
+            if params.get("select", "*") != "*":
+                columns = [c.strip() for c in params["select"].split(",")]
+                result = [{c: r.get(c) for c in columns} for r in result]
+            status = 200
+        elif request.method == "POST":
+            body = await request.json()
+            conflict = params["on_conflict"].split(",") if "on_conflict" in params else None
+            result = []
+            for item in body if isinstance(body, list) else [body]:
+                existing = None
+                if conflict:
+                    existing = next(
+                        (r for r in rows if all(str(r.get(k)) == str(item.get(k)) for k in conflict)),
+                        None,
+                    )
+                if existing is None:
+                    existing = self._new_row(table, item)
+                    rows.append(existing)
+                elif "ignore-duplicates" in prefer:
+                    continue
+                else:
+                    existing.update(item)
+                result.append(existing)
+            self._by_user.pop(table, None)
+            total = len(result)
+            status = 201
+        elif request.method == "PATCH":
+            body = await request.json()
+            result = self._filter(table, request)
+            for row in result:
+                row.update(body)
+            total = len(result)
+            status = 200
+        else:
+            result = self._filter(table, request)
+            for row in result:
+                rows.remove(row)
+                self._deleted(table, row)
+            self._by_user.pop(table, None)
+            total = len(result)
+            status = 200
+
+        headers = {}
+        if "count=exact" in prefer:
+            headers["content-range"] = f"0-{max(len(result) - 1, 0)}/{total}"
+        if "return=minimal" in prefer or request.method == "HEAD":
+            return Response(status_code=204 if status == 200 else status, headers=headers)
+        if request.headers.get("accept", "").startswith("application/vnd.pgrst.object"):
+            if len(result) != 1:
+                return JSONResponse({
+                    "code": "PGRST116",
+                    "message": "JSON object requested, multiple (or no) rows returned",
+                    "details": f"The result contains {len(result)} rows",
+                    "hint": None,
+                }, status_code=406)
+            return JSONResponse(result[0], headers=headers)
+        return JSONResponse(result, status_code=status, headers=headers)
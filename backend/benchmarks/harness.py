@@ -0,0 +1,110 @@
+"""Shared plumbing for the offline benchmarks: background servers, test tokens, env setup."""
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+import jwt
+import uvicorn
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+JWT_SECRET = "benchmark-jwt-secret-benchmark-jwt-secret"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class BackgroundServer:
+    """Run an ASGI app under uvicorn on its own thread and event loop"""
+
+    def __init__(self, app, port: int = 0):
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.server = uvicorn.Server(
+            uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on")
+        )
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self) -> "BackgroundServer":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+class ServerProcess:
+    """Run an ASGI app under uvicorn in a forked child process.
+
+    Keeps the stand-ins' and the API's CPU time off the load generator's GIL, so
+    the numbers measure the API rather than contention inside one interpreter.
+    The child gets a copy of the app as it was at fork time (seeded data included).
+    """
+
+    def __init__(self, app, port: int = 0):
+        self.app = app
+        self.port = port or free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.process = multiprocessing.get_context("fork").Process(target=self._serve, daemon=True)
+
+    def _serve(self) -> None:
+        uvicorn.run(self.app, host="127.0.0.1", port=self.port, log_level="warning", lifespan="on")
+
+    def __enter__(self) -> "ServerProcess":
+        self.process.start()
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.1).close()
+                return self
+            except OSError:
+                if not self.process.is_alive():
+                    break
+                time.sleep(0.05)
+        raise RuntimeError(f"server on port {self.port} did not start")
+
+    def __exit__(self, *exc) -> None:
+        self.process.terminate()
+        self.process.join(timeout=5)
+
+
+def mint_token(user_id: str, ttl: int = 3600) -> str:
+    """An access token the API will accept when booted by boot_api()"""
+    return jwt.encode(
+        {"sub": user_id, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + ttl},
+        JWT_SECRET,
+        algorithm="HS256",
+    )
+
+
+def boot_api(supabase_url: str, **env: str):
+    """Import server.py configured to talk to local stand-ins instead of the real services"""
+    os.environ.update({
+        "SUPABASE_URL": supabase_url,
+        "SUPABASE_ANON_KEY": jwt.encode({"role": "anon"}, JWT_SECRET, algorithm="HS256"),
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        **env,
+    })
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+    # Per-request httpx INFO lines would dominate the measurements
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    return server
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,44 @@
+-- ============================================================
+-- Stand-ins for the parts of Supabase the migrations rely on,
+-- so they can be applied to a plain local Postgres for bench_storage.py.
+-- Never run this against a Supabase project.
+-- ============================================================
+
+create schema if not exists auth;
+-- Supabase installs extensions such as pg_trgm here
+create schema if not exists extensions;
+
+create table if not exists auth.users (
+  id uuid primary key default gen_random_uuid(),
+  email text
+);
+
+-- Same lookup as Supabase's auth.uid(): the JWT claims PostgREST (or pg_storage.py) set per transaction
+create or replace function auth.uid() returns uuid as $$
+  select coalesce(
+    nullif(current_setting('request.jwt.claim.sub', true), ''),
+    nullif(current_setting('request.jwt.claims', true), '')::jsonb ->> 'sub'
+  )::uuid;
+$$ language sql stable;
+
+do $$
+begin
+  if not exists (select from pg_roles where rolname = 'anon') then
+    create role anon nologin noinherit;
+  end if;
+  if not exists (select from pg_roles where rolname = 'authenticated') then
+    create role authenticated nologin noinherit;
+  end if;
+  if not exists (select from pg_roles where rolname = 'service_role') then
+    create role service_role nologin noinherit bypassrls;
+  end if;
+end
+$$;
+
+-- The connecting user switches into these roles with set_config('role', ...)
+grant anon, authenticated, service_role to current_user;
+
+grant usage on schema public, auth, extensions to anon, authenticated, service_role;
+alter default privileges in schema public grant all on tables to anon, authenticated, service_role;
+alter default privileges in schema public grant all on sequences to anon, authenticated, service_role;
+alter default privileges in schema public grant execute on functions to anon, authenticated, service_role;
@@ -0,0 +1,211 @@
+"""Caching that holds up when the DoIt API runs as several workers.
+
+Settings, timezones, Supabase Auth answers and rate-limit counters go
+through a Cache. MemoryCache keeps them in this process: the default, and
+all a single worker needs. RedisCache keeps them in Redis (or anything
+speaking its protocol) when CACHE_URL=redis://..., so every uvicorn worker
+and replica reads the same entries and counts against the same limits, and
+a user's cache stays warm whichever worker their request lands on.
+
+Values must be JSON-safe (they round-trip through orjson) and are treated
+as immutable once stored. publish/subscribe carry invalidations. With
+MemoryCache a message reaches this process only. With RedisCache it reaches
+every subscribed worker, the sender included, so handlers must be
+idempotent; messages sent while a worker is reconnecting are lost. Redis
+errors are logged and treated as misses, so an outage slows requests down
+instead of failing them (and rate limits fail open meanwhile).
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import suppress
+from typing import Awaitable, Callable, Optional, Protocol
+
+import orjson
+
+from metrics import CACHE_LOOKUPS, track_upstream
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # optional: only needed for CACHE_URL=redis://...
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], None]
+
+
+class Cache(Protocol):
+    """Keyed values with a TTL, counters and invalidation messages"""
+
+    # True when other workers see the same entries (rate limits switch to shared counters)
+    shared: bool
+
+    async def get(self, key: str): ...
+    async def set(self, key: str, value, ttl: float) -> None: ...
+    async def delete(self, key: str) -> None: ...
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int: ...
+    async def publish(self, channel: str, message: dict) -> None: ...
+    def subscribe(self, channel: str, handler: Handler) -> None: ...
+    async def start(self) -> None: ...
+    async def close(self) -> None: ...
+
+
+def _namespace(key: str) -> str:
+    """Metrics label for a key: the part before the first colon ("settings", "auth", ...)"""
+    return key.split(":", 1)[0]
+
+
+def _dispatch(handlers, message: dict) -> None:
+    for handler in handlers:
+        try:
+            handler(message)
+        except Exception:
+            logger.exception("Cache message handler failed")
+
+
+class MemoryCache:
+    """Bounded LRU with a TTL per entry, private to this process"""
+
+    shared = False
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._handlers: dict = {}
+
+    def _lookup(self, key: str) -> Optional[tuple]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key: str, value, ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str):
+        entry = self._lookup(key)
+        CACHE_LOOKUPS.labels(_namespace(key), "miss" if entry is None else "hit").inc()
+        return None if entry is None else entry[0]
+
+    async def set(self, key: str, value, ttl: float) -> None:
+        self._store(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add to a counter (starting from 0), kept for `ttl` seconds after the last increment"""
+        entry = self._lookup(key)
+        value = (entry[0] if entry else 0) + amount
+        self._store(key, value, ttl if ttl is not None else float("inf"))
+        return value
+
+    async def publish(self, channel: str, message: dict) -> None:
+        _dispatch(self._handlers.get(channel, ()), message)
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisCache:
+    """Entries, counters and messages kept in Redis, shared by every worker pointed at it"""
+
+    shared = True
+
+    def __init__(self, url: str, prefix: str = "doit:", timeout: float = 0.5):
+        if aioredis is None:
+            raise RuntimeError("CACHE_URL=redis://... needs the redis package")
+        self.prefix = prefix
+        self.client = aioredis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        # Subscribers block on reads indefinitely, so they get a client without the read timeout
+        self._subscriber = aioredis.from_url(url, socket_connect_timeout=timeout)
+        self._handlers: dict = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    async def _run(self, operation: str, command: Awaitable, default=None):
+        try:
+            with track_upstream("redis", operation):
+                return await command
+        except (aioredis.RedisError, OSError) as e:
+            logger.warning("Redis %s failed: %s", operation, e)
+            return default
+
+    async def get(self, key: str):
+        raw = await self._run("GET", self.client.get(self.prefix + key))
+        CACHE_LOOKUPS.labels(_namespace(key), "miss" if raw is None else "hit").inc()
+        return None if raw is None else orjson.loads(raw)
+
+    async def set(self, key: str, value, ttl: float) -> None:
+        await self._run(
+            "SET", self.client.set(self.prefix + key, orjson.dumps(value), px=max(1, int(ttl * 1000)))
+        )
+
+    async def delete(self, key: str) -> None:
+        await self._run("DEL", self.client.delete(self.prefix + key))
+
+    async def incr(self, key: str, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add to a counter atomically, kept for `ttl` seconds after the last increment; 0 if Redis is down"""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.incrby(self.prefix + key, amount)
+        if ttl is not None:
+            pipe.pexpire(self.prefix + key, max(1, int(ttl * 1000)))
+        results = await self._run("INCRBY", pipe.execute(), default=[0])
+        return results[0]
+
+    async def publish(self, channel: str, message: dict) -> None:
+        await self._run("PUBLISH", self.client.publish(self.prefix + channel, orjson.dumps(message)))
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        """Register a handler; call before start()"""
+        self._handlers.setdefault(channel, []).append(handler)
+
+    async def start(self) -> None:
+        if self._handlers and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._subscriber.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(*(self.prefix + channel for channel in self._handlers))
+                async for message in pubsub.listen():
+                    channel = message["channel"].decode()[len(self.prefix):]
+                    _dispatch(self._handlers.get(channel, ()), orjson.loads(message["data"]))
+            except (aioredis.RedisError, OSError) as e:
+                logger.warning("Redis subscription lost, reconnecting: %s", e)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._listener
+            self._listener = None
+        await self.client.aclose()
+        await self._subscriber.aclose()
+
+
+def create_cache(url: str, max_entries: int = 10000, timeout: float = 0.5) -> Cache:
+    """RedisCache for a redis://, rediss:// or unix:// URL, MemoryCache when the URL is empty"""
+    if not url:
+        return MemoryCache(max_entries)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url, timeout=timeout)
+    raise ValueError(f"Unsupported CACHE_URL scheme: {url.split(':', 1)[0]}")
@@ -0,0 +1,288 @@
+"""Per-account Google Calendar event cache kept current with incremental sync.
+
+The first request for a (user, profile, calendar) does a full sync of events
+from a little before today to `lookahead_days` ahead and keeps Google's
+nextSyncToken. Later requests send that token so Google only returns what
+changed; a 410 Gone means the token expired and triggers a fresh full sync,
+as does a request reaching past the synced window. Windows are then served
+from the cached set instead of re-downloading them.
+
+Windows the cache can't answer (outside the synced window, or a calendar
+whose full sync hit the page cap) are fetched directly, split into week-sized
+slices that page through Google concurrently. A capped calendar isn't
+synced again until `capped_retry` seconds have passed. Every request can carry a
+`fields` partial-response mask so Google only sends what the caller maps.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, date, timedelta, timezone, tzinfo
+from typing import Optional
+
+import httpx
+
+# Google's maximum page size for events.list
+PAGE_SIZE = 250
+# Stop paging a range fetch here rather than walk an unbounded recurring series
+MAX_SYNC_PAGES = 20
+# A full sync has to finish before the first page load can be answered, so it gets fewer
+MAX_FULL_SYNC_PAGES = 4
+# Direct range fetches are split into slices this long and fetched concurrently
+RANGE_SLICE = timedelta(days=7)
+
+logger = logging.getLogger(__name__)
+
+
+class CalendarSyncError(Exception):
+    """Google rejected or failed a calendar request"""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Google Calendar returned {status_code}")
+        self.status_code = status_code
+
+
+def event_bounds(item: dict, zone: tzinfo) -> tuple:
+    """Start and end of an event as aware datetimes; all-day dates start at local midnight"""
+    bounds = []
+    for field in ("start", "end"):
+        value = item.get(field, {})
+        if value.get("dateTime"):
+            parsed = datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+        elif value.get("date"):
+            day = date.fromisoformat(value["date"])
+            parsed = datetime(day.year, day.month, day.day, tzinfo=zone)
+        else:
+            parsed = None
+        bounds.append(parsed)
+    start, end = bounds
+    if start is None:
+        start = end or datetime.min.replace(tzinfo=timezone.utc)
+    return start, end or start
+
+
+class CalendarSync:
+    """Cached events and sync state for one calendar"""
+
+    def __init__(self):
+        self.events: dict = {}
+        self.sync_token: Optional[str] = None
+        self.synced_at = 0.0
+        # End of the window the last full sync asked Google for
+        self.covered_until: Optional[datetime] = None
+        # Until then the calendar is too busy to cache and is only fetched by range
+        self.capped_until = 0.0
+        self.lock = asyncio.Lock()
+
+    @property
+    def complete(self) -> bool:
+        """Google only hands out a sync token once every page has been read"""
+        return self.sync_token is not None
+
+    def covers(self, time_max: datetime) -> bool:
+        return self.complete and self.covered_until is not None and time_max <= self.covered_until
+
+
+class CalendarEventStore:
+    """Bounded LRU of CalendarSync entries keyed by (user_id, profile, calendar_id)"""
+
+    def __init__(
+        self,
+        max_calendars: int = 1000,
+        min_sync_interval: float = 30.0,
+        lookback_days: int = 1,
+        lookahead_days: int = 62,
+        capped_retry: float = 3600.0,
+        fields: Optional[str] = None,
+    ):
+        self.max_calendars = max_calendars
+        self.min_sync_interval = min_sync_interval
+        self.lookback = timedelta(days=lookback_days)
+        self.lookahead = timedelta(days=lookahead_days)
+        self.capped_retry = capped_retry
+        # Partial-response mask for events.list; None downloads whole resources
+        self.fields = fields
+        self._calendars: "OrderedDict[tuple, CalendarSync]" = OrderedDict()
+
+    def _entry(self, key: tuple) -> CalendarSync:
+        entry = self._calendars.get(key)
+        if entry is None:
+            entry = self._calendars[key] = CalendarSync()
+            while len(self._calendars) > self.max_calendars:
+                self._calendars.popitem(last=False)
+        self._calendars.move_to_end(key)
+        return entry
+
+    def horizon(self) -> datetime:
+        """Earliest time the cached events are guaranteed to cover"""
+        today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        return today - self.lookback
+
+    def horizon_end(self) -> datetime:
+        """End of the window a full sync started now would cover"""
+        return self.horizon() + self.lookback + self.lookahead
+
+    def forget(self, user_id: str, profile: str) -> None:
+        """Drop cached calendars for an account that was disconnected or reconnected"""
+        for key in [k for k in self._calendars if k[:2] == (user_id, profile)]:
+            del self._calendars[key]
+
+    async def events_between(
+        self,
+        key: tuple,
+        http: httpx.AsyncClient,
+        events_url: str,
+        access_token: str,
+        time_min: datetime,
+        time_max: datetime,
+        zone: tzinfo,
+        tz_name: str,
+    ) -> list:
+        """Raw Google event items overlapping [time_min, time_max), ordered by start time"""
+        headers = {"Authorization": f"Bearer {access_token}"}
+        if time_min < self.horizon() or time_max > self.horizon_end():
+            # Outside anything a sync covers; fall back to a one-off range query
+            return await self._fetch_range(http, events_url, headers, time_min, time_max, tz_name)
+
+        entry = self._entry(key)
+        if time.monotonic() >= entry.capped_until:
+            async with entry.lock:
+                if time.monotonic() >= entry.capped_until and (
+                    time.monotonic() - entry.synced_at >= self.min_sync_interval or not entry.covers(time_max)
+                ):
+                    await self._sync(entry, http, events_url, headers, tz_name, time_max)
+                if entry.covers(time_max):
+                    return self._window(entry.events.values(), time_min, time_max, zone)
+
+        # The full sync was cut off at MAX_FULL_SYNC_PAGES, so the cache may be missing events
+        return await self._fetch_range(http, events_url, headers, time_min, time_max, tz_name)
+
+    def _window(self, items, time_min: datetime, time_max: datetime, zone: tzinfo) -> list:
+        """Items overlapping [time_min, time_max), ordered by start time"""
+        matched = []
+        for item in items:
+            start, end = event_bounds(item, zone)
+            if start < time_max and end > time_min:
+                matched.append((start, item))
+        matched.sort(key=lambda pair: pair[0])
+        return [item for _, item in matched]
+
+    def _params(self, **params) -> dict:
+        if self.fields:
+            params["fields"] = self.fields
+        return params
+
+    async def _sync(self, entry: CalendarSync, http, events_url, headers, tz_name, time_max) -> None:
+        # The synced window slides forward only with a full sync
+        if entry.sync_token and entry.covers(time_max):
+            try:
+                await self._incremental_sync(entry, http, events_url, headers, tz_name)
+                entry.synced_at = time.monotonic()
+                return
+            except CalendarSyncError as e:
+                if e.status_code != 410:
+                    raise
+                # Sync token expired: Google wants a full resync
+        await self._full_sync(entry, http, events_url, headers, tz_name)
+        entry.synced_at = time.monotonic()
+
+    async def _full_sync(self, entry: CalendarSync, http, events_url, headers, tz_name) -> None:
+        covered_until = self.horizon_end()
+        params = self._params(
+            timeMin=self.horizon().isoformat(),
+            timeMax=covered_until.isoformat(),
+            singleEvents="true",
+            maxResults=str(PAGE_SIZE),
+            timeZone=tz_name,
+        )
+        events = {}
+        sync_token = None
+        async for page in self._pages(http, events_url, headers, params, MAX_FULL_SYNC_PAGES):
+            for item in page.get("items", []):
+                if item.get("status") != "cancelled":
+                    events[item["id"]] = item
+            sync_token = page.get("nextSyncToken")
+
+        if sync_token is None:
+            # Too many events to cache; serve this calendar by range until the retry is due
+            entry.events = {}
+            entry.sync_token = None
+            entry.capped_until = time.monotonic() + self.capped_retry
+            return
+        entry.events = events
+        entry.sync_token = sync_token
+        entry.covered_until = covered_until
+
+    async def _incremental_sync(self, entry: CalendarSync, http, events_url, headers, tz_name) -> None:
+        params = self._params(
+            syncToken=entry.sync_token,
+            singleEvents="true",
+            maxResults=str(PAGE_SIZE),
+            timeZone=tz_name,
+        )
+        changes = []
+        sync_token = entry.sync_token
+        async for page in self._pages(http, events_url, headers, params):
+            changes.extend(page.get("items", []))
+            sync_token = page.get("nextSyncToken") or sync_token
+
+        for item in changes:
+            if item.get("status") == "cancelled":
+                entry.events.pop(item["id"], None)
+            else:
+                entry.events[item["id"]] = item
+        entry.sync_token = sync_token
+        self._prune(entry)
+
+    def _prune(self, entry: CalendarSync) -> None:
+        """Forget events outside the window the sync is meant to cover"""
+        horizon = self.horizon()
+        for event_id, item in list(entry.events.items()):
+            start, end = event_bounds(item, timezone.utc)
+            if end < horizon or start >= entry.covered_until:
+                del entry.events[event_id]
+
+    async def _fetch_range(self, http, events_url, headers, time_min, time_max, tz_name) -> list:
+        """Every event in the window, its week-sized slices paged through concurrently"""
+        slices = []
+        start = time_min
+        while start < time_max:
+            slices.append((start, min(start + RANGE_SLICE, time_max)))
+            start += RANGE_SLICE
+
+        async def fetch_slice(slice_min, slice_max):
+            params = self._params(
+                timeMin=slice_min.isoformat(),
+                timeMax=slice_max.isoformat(),
+                singleEvents="true",
+                maxResults=str(PAGE_SIZE),
+                timeZone=tz_name,
+            )
+            return [
+                item
+                async for page in self._pages(http, events_url, headers, params)
+                for item in page.get("items", [])
+                if item.get("status") != "cancelled"
+            ]
+
+        # Events spanning a slice boundary come back from both slices; keep one copy
+        events = {}
+        for items in await asyncio.gather(*(fetch_slice(*bounds) for bounds in slices)):
+            for item in items:
+                events[item["id"]] = item
+        zone = time_min.tzinfo or timezone.utc
+        return self._window(events.values(), time_min, time_max, zone)
+
+    async def _pages(self, http, events_url, headers, params, max_pages: int = MAX_SYNC_PAGES):
+        page_token = None
+        for _ in range(max_pages):
+            page_params = {**params, "pageToken": page_token} if page_token else params
+            resp = await http.get(events_url, params=page_params, headers=headers)
+            if resp.status_code != 200:
+                raise CalendarSyncError(resp.status_code)
+            page = resp.json()
+            yield page
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                return
+        logger.warning(f"Stopped paging {events_url} after {max_pages} pages")
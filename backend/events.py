@@ -0,0 +1,124 @@
+"""In-process pub/sub that pushes task and win changes to a user's open streams.
+
+Route handlers publish a change after their write succeeds; every stream the
+same user has open (one per device or tab) gets it on its own bounded queue.
+Each user also keeps a short history so a reconnecting client can resume from
+the last event id it saw. Event ids carry a per-process prefix, so an id from
+before a restart, or one that has fallen out of the history, is answered with a
+"reset" event telling the client to refetch instead of silently missing changes.
+
+State lives in this process only: with several API workers, a client only sees
+changes made through the worker its stream is connected to.
+"""
+import asyncio
+import uuid
+from collections import OrderedDict, deque
+from typing import Optional
+
+import orjson
+
+
+class ChangeEvent:
+    """One published change, formatted once and shared by every subscriber"""
+
+    __slots__ = ("id", "type", "data", "seq")
+
+    def __init__(self, event_id: str, event_type: str, data, seq: int = 0):
+        self.id = event_id
+        self.type = event_type
+        self.data = data
+        self.seq = seq
+
+    def encode(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {orjson.dumps(self.data).decode()}\n\n"
+
+
+class Subscription:
+    """One open stream's queue; overflowing it replaces the backlog with a reset"""
+
+    def __init__(self, max_queue: int):
+        self.queue: "asyncio.Queue[ChangeEvent]" = asyncio.Queue(max_queue)
+
+    def push(self, event: ChangeEvent) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind is better off refetching than replaying
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(ChangeEvent(event.id, "reset", {"reason": "overflow"}))
+
+
+class UserChannel:
+    """Recent history and open subscriptions for one user"""
+
+    def __init__(self, history_size: int, floor: int):
+        self.history: "deque[ChangeEvent]" = deque(maxlen=history_size)
+        self.subscribers: set = set()
+        # Every event for this user after `floor` is still in the history
+        self.floor = floor
+
+
+class ChangeBroker:
+    """Per-user fan-out of change events with a bounded replay history"""
+
+    def __init__(self, history_size: int = 100, max_queue: int = 100, max_users: int = 10000):
+        self.history_size = history_size
+        self.max_queue = max_queue
+        self.max_users = max_users
+        self.prefix = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._channels: "OrderedDict[str, UserChannel]" = OrderedDict()
+
+    def _channel(self, user_id: str) -> UserChannel:
+        channel = self._channels.get(user_id)
+        if channel is None:
+            channel = self._channels[user_id] = UserChannel(self.history_size, self._seq)
+            # Evict the least recently active users nobody is listening to
+            for stale in [k for k, c in self._channels.items() if not c.subscribers and k != user_id]:
+                if len(self._channels) <= self.max_users:
+                    break
+                del self._channels[stale]
+        self._channels.move_to_end(user_id)
+        return channel
+
+    def current_id(self) -> str:
+        """Event id marking "now", for a client that starts from a fresh fetch"""
+        return f"{self.prefix}-{self._seq}"
+
+    def publish(self, user_id: str, event_type: str, data) -> None:
+        self._seq += 1
+        event = ChangeEvent(f"{self.prefix}-{self._seq}", event_type, data, self._seq)
+        channel = self._channel(user_id)
+        if len(channel.history) == channel.history.maxlen:
+            channel.floor = channel.history[0].seq
+        channel.history.append(event)
+        for subscription in channel.subscribers:
+            subscription.push(event)
+
+    def subscribe(self, user_id: str, last_event_id: Optional[str] = None) -> Subscription:
+        """Open a subscription, queueing whatever was missed since `last_event_id`"""
+        channel = self._channel(user_id)
+        subscription = Subscription(self.max_queue)
+        channel.subscribers.add(subscription)
+        if last_event_id:
+            for event in self._replay(channel, last_event_id):
+                subscription.push(event)
+        return subscription
+
+    def unsubscribe(self, user_id: str, subscription: Subscription) -> None:
+        channel = self._channels.get(user_id)
+        if channel is not None:
+            channel.subscribers.discard(subscription)
+
+    def _replay(self, channel: UserChannel, last_event_id: str) -> list:
+        prefix, _, seq = last_event_id.partition("-")
+        try:
+            seq = int(seq)
+        except ValueError:
+            seq = -1
+        if prefix != self.prefix or seq < 0 or seq > self._seq:
+            return [ChangeEvent(self.current_id(), "reset", {"reason": "unknown_cursor"})]
+        if seq < channel.floor:
+            return [ChangeEvent(self.current_id(), "reset", {"reason": "history_expired"})]
+        return [event for event in channel.history if event.seq > seq]
@@ -0,0 +1,143 @@
+"""Prometheus metrics for the DoIt API.
+
+MetricsMiddleware records every HTTP request by route template (never the raw
+path, so ids don't explode the label set). InstrumentedTransport and
+track_upstream time the calls the API makes to other services, labeled by
+target and operation, so a slow route can be attributed to auth, the database
+or Google. Metrics are per process; scrape each worker separately.
+"""
+import time
+from contextlib import contextmanager
+
+import httpx
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.routing import Match
+
+REQUEST_LATENCY = Histogram(
+    "doit_http_request_duration_seconds",
+    "Time spent handling API requests",
+    ["method", "route"],
+)
+REQUESTS = Counter(
+    "doit_http_requests_total",
+    "API requests by response status",
+    ["method", "route", "status"],
+)
+IN_FLIGHT = Gauge(
+    "doit_http_requests_in_flight",
+    "API requests currently being handled (including open streams)",
+    ["method", "route"],
+)
+UPSTREAM_LATENCY = Histogram(
+    "doit_upstream_request_duration_seconds",
+    "Time from sending an upstream request to receiving its response headers",
+    ["target", "operation"],
+)
+UPSTREAM_REQUESTS = Counter(
+    "doit_upstream_requests_total",
+    "Upstream requests by outcome (HTTP status, or error when no response arrived)",
+    ["target", "operation", "outcome"],
+)
+CIRCUIT_OPEN = Gauge(
+    "doit_circuit_open",
+    "1 while an upstream's circuit breaker is open",
+    ["upstream"],
+)
+CIRCUIT_REJECTIONS = Counter(
+    "doit_circuit_rejections_total",
+    "Upstream requests refused without being sent because the circuit was open",
+    ["upstream"],
+)
+RATE_LIMITED = Counter(
+    "doit_rate_limited_total",
+    "Requests turned away with 429, by the limit that refused them",
+    ["limit"],
+)
+CACHE_LOOKUPS = Counter(
+    "doit_cache_lookups_total",
+    "Reads from the shared cache by key namespace and whether they hit",
+    ["namespace", "result"],
+)
+
+
+@contextmanager
+def track_upstream(target: str, operation: str):
+    """Time a block that calls another service outside the instrumented httpx clients"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        UPSTREAM_LATENCY.labels(target, operation).observe(time.perf_counter() - start)
+        UPSTREAM_REQUESTS.labels(target, operation, outcome).inc()
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wrap an httpx transport so each request is timed under `target`.
+
+    The operation label is the method plus the last path segment (the PostgREST
+    table or RPC name, or the Google endpoint), which keeps ids out of labels.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, target: str):
+        self.transport = transport
+        self.target = target
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        operation = f"{request.method} {request.url.path.rstrip('/').rsplit('/', 1)[-1]}"
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            response = await self.transport.handle_async_request(request)
+            outcome = str(response.status_code)
+            return response
+        finally:
+            UPSTREAM_LATENCY.labels(self.target, operation).observe(time.perf_counter() - start)
+            UPSTREAM_REQUESTS.labels(self.target, operation, outcome).inc()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class MetricsMiddleware:
+    """ASGI middleware counting and timing requests per route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def route_for(self, scope) -> str:
+        """The template of the route that will handle the request, as the router would pick it"""
+        partial = None
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return route.path
+            if match == Match.PARTIAL and partial is None:
+                partial = route.path
+        return partial or "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self.route_for(scope)
+        status = "500"
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        in_flight = IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            REQUESTS.labels(method, route, status).inc()
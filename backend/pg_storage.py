@@ -0,0 +1,399 @@
+"""Direct Postgres access for the DoIt API over an asyncpg connection pool.
+
+A drop-in alternative to the PostgREST repositories in storage.py, selected
+with STORAGE_BACKEND=asyncpg and DATABASE_URL. Every call runs in its own
+transaction that first sets the role and request.jwt.claims the way
+PostgREST does, so auth.uid() and the Row Level Security policies behave
+the same. Postgres renders each result as JSON, which keeps rows
+byte-for-byte in the shape PostgREST returns (ids and timestamps as
+strings). Each call is timed under the "postgres" target in metrics.py.
+
+Behind a transaction-mode pooler (Supavisor/PgBouncer on port 6543) set
+DATABASE_STATEMENT_CACHE_SIZE=0; prepared statements don't survive there.
+"""
+from datetime import date
+from typing import Optional
+
+import orjson
+
+from metrics import track_upstream
+from storage import fetch_keyset_pages
+
+try:
+    import asyncpg
+except ImportError:  # optional: only needed for STORAGE_BACKEND=asyncpg
+    asyncpg = None
+
+SET_REQUEST_CONTEXT = "select set_config('role', $1, true), set_config('request.jwt.claims', $2, true)"
+
+# Columns callers may write, per table; anything else is a programming error
+WRITABLE_COLUMNS = {
+    "user_settings": {"user_id", "theme", "dark_mode", "updated_at", "last_app_open"},
+    "tasks": {"user_id", "title", "profile", "section", "completed", "updated_at"},
+    "wins": {"user_id", "task", "completed_at"},
+    "google_calendar_accounts": {
+        "user_id", "profile", "google_email", "access_token", "refresh_token",
+        "token_expires_at", "calendar_id", "updated_at",
+    },
+}
+
+
+def _dumps(value) -> str:
+    return orjson.dumps(value).decode()
+
+
+async def create_pg_pool(
+    dsn: str, min_size: int = 2, max_size: int = 20, statement_cache_size: int = 100
+) -> "asyncpg.Pool":
+    """Create the connection pool every repository borrows from"""
+    if asyncpg is None:
+        raise RuntimeError("STORAGE_BACKEND=asyncpg needs the asyncpg package")
+
+    async def init(conn):
+        for type_name in ("json", "jsonb"):
+            await conn.set_type_codec(
+                type_name, schema="pg_catalog", encoder=_dumps, decoder=orjson.loads, format="text"
+            )
+
+    return await asyncpg.create_pool(
+        dsn,
+        min_size=min_size,
+        max_size=max_size,
+        statement_cache_size=statement_cache_size,
+        server_settings={"timezone": "UTC"},
+        init=init,
+    )
+
+
+def _columns(table: str, data: dict) -> list:
+    unknown = set(data) - WRITABLE_COLUMNS[table]
+    if unknown:
+        raise ValueError(f"Unknown {table} columns: {sorted(unknown)}")
+    return list(data)
+
+
+def _insert(table: str, columns: list) -> str:
+    """INSERT of one JSON record ($1), letting Postgres coerce the values as PostgREST does"""
+    names = ", ".join(f'"{c}"' for c in columns)
+    values = ", ".join(f'r."{c}"' for c in columns)
+    return f"insert into {table} ({names}) select {values} from jsonb_populate_record(null::{table}, $1) r"
+
+
+def _assign(table: str, columns: list) -> str:
+    """SET clause taking the new values from the JSON record in $1"""
+    names = ", ".join(f'"{c}"' for c in columns)
+    values = ", ".join(f'r."{c}"' for c in columns)
+    return f"({names}) = (select {values} from jsonb_populate_record(null::{table}, $1) r)"
+
+
+class PgSession:
+    """The shared pool, with one caller's role and JWT claims applied to each transaction"""
+
+    def __init__(self, pool: "asyncpg.Pool", role: str, claims: dict):
+        self.pool = pool
+        self.role = role
+        self.claims = _dumps(claims)
+
+    async def value(self, operation: str, sql: str, *args):
+        with track_upstream("postgres", operation):
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    await conn.execute(SET_REQUEST_CONTEXT, self.role, self.claims)
+                    return await conn.fetchval(sql, *args)
+
+    async def rows(self, operation: str, sql: str, *args) -> list:
+        """Rows of a SELECT (or a data-modifying statement with RETURNING) as JSON dicts"""
+        return await self.value(
+            operation,
+            f"with _rows as ({sql}) select coalesce(json_agg(_rows), '[]'::json) from _rows",
+            *args,
+        )
+
+    async def row(self, operation: str, sql: str, *args) -> Optional[dict]:
+        rows = await self.rows(operation, sql, *args)
+        return rows[0] if rows else None
+
+
+class PgRepository:
+    """Tables the API reads and writes on behalf of one authenticated user"""
+
+    def __init__(self, session: PgSession, user_id: str):
+        self.session = session
+        self.user_id = user_id
+
+    # ---------- settings ----------
+
+    async def upsert_settings(self, data: dict) -> Optional[dict]:
+        """Insert or update the user's settings row in one statement and return all of it"""
+        columns = _columns("user_settings", {**data, "user_id": self.user_id})
+        updates = [c for c in columns if c != "user_id"] or ["user_id"]
+        assignments = ", ".join(f'"{c}" = excluded."{c}"' for c in updates)
+        return await self.session.row(
+            "upsert_settings",
+            f"{_insert('user_settings', columns)} on conflict (user_id) do update set {assignments} returning *",
+            {**data, "user_id": self.user_id},
+        )
+
+    async def get_happy_timezone(self) -> Optional[str]:
+        row = await self.session.row(
+            "get_happy_timezone",
+            "select timezone from happy_settings where user_id = $1::uuid",
+            self.user_id,
+        )
+        return row["timezone"] if row else None
+
+    # ---------- tasks ----------
+
+    async def list_tasks(self, profile: str) -> list:
+        return await self.session.rows(
+            "list_tasks",
+            "select * from tasks where user_id = $1::uuid and profile = $2 order by created_at",
+            self.user_id, profile,
+        )
+
+    async def get_tasks_version(self, profile: str) -> tuple:
+        """(row count, newest updated_at) for a profile's tasks, without fetching the rows"""
+        row = await self.session.row(
+            "get_tasks_version",
+            "select count(*) as count, max(updated_at) as newest from tasks"
+            " where user_id = $1::uuid and profile = $2",
+            self.user_id, profile,
+        )
+        return row["count"], row["newest"]
+
+    async def list_tasks_changed_since(self, profile: str, since: str) -> list:
+        return await self.session.rows(
+            "list_tasks_changed_since",
+            "select * from tasks where user_id = $1::uuid and profile = $2"
+            " and updated_at > $3::text::timestamptz order by updated_at",
+            self.user_id, profile, since,
+        )
+
+    async def list_task_tombstones(self, profile: str, since: str) -> list:
+        """Tasks deleted after `since`, recorded by the trigger in supabase_task_sync_migration.sql"""
+        return await self.session.rows(
+            "list_task_tombstones",
+            "select id, deleted_at from task_tombstones where user_id = $1::uuid and profile = $2"
+            " and deleted_at > $3::text::timestamptz order by deleted_at",
+            self.user_id, profile, since,
+        )
+
+    async def create_task(self, data: dict) -> Optional[dict]:
+        record = {**data, "user_id": self.user_id}
+        return await self.session.row(
+            "create_task", f"{_insert('tasks', _columns('tasks', record))} returning *", record
+        )
+
+    async def update_task(self, task_id: str, data: dict) -> Optional[dict]:
+        return await self.session.row(
+            "update_task",
+            f"update tasks set {_assign('tasks', _columns('tasks', data))}"
+            " where id = $2::text::uuid and user_id = $3::uuid returning *",
+            data, task_id, self.user_id,
+        )
+
+    async def delete_task(self, task_id: str) -> Optional[dict]:
+        return await self.session.row(
+            "delete_task",
+            "delete from tasks where id = $1::text::uuid and user_id = $2::uuid returning *",
+            task_id, self.user_id,
+        )
+
+    async def complete_task(self, task_id: str, completed_at: Optional[str] = None) -> Optional[dict]:
+        """Mark a task completed and record its win in one transaction: {"task": ..., "win": ...}"""
+        return await self.session.value(
+            "complete_task",
+            "select complete_task($1::text::uuid, $2::text::timestamptz)",
+            task_id, completed_at,
+        )
+
+    async def apply_task_batch(self, ops: list) -> list:
+        """Apply create/update/delete/complete/rollover ops in one call (see supabase_task_batch_migration.sql)"""
+        return await self.session.value("apply_task_batch", "select apply_task_batch($1::jsonb)", ops)
+
+    # ---------- wins ----------
+
+    async def list_wins(self, limit: Optional[int] = None) -> list:
+        return await self.session.rows(
+            "list_wins",
+            "select * from wins where user_id = $1::uuid order by completed_at desc limit $2",
+            self.user_id, limit,
+        )
+
+    async def list_wins_page(self, limit: int, after: Optional[tuple] = None) -> list:
+        """Wins newest first, starting after the (completed_at, id) keyset position `after`"""
+        if after is None:
+            return await self.session.rows(
+                "list_wins_page",
+                "select * from wins where user_id = $1::uuid order by completed_at desc, id desc limit $2",
+                self.user_id, limit,
+            )
+        completed_at, win_id = after
+        return await self.session.rows(
+            "list_wins_page",
+            "select * from wins where user_id = $1::uuid"
+            " and (completed_at, id) < ($2::text::timestamptz, $3::text::uuid)"
+            " order by completed_at desc, id desc limit $4",
+            self.user_id, completed_at, win_id, limit,
+        )
+
+    async def get_win_summary(self, today: date, first_day: date, last_day: date) -> dict:
+        """All-time total and streaks plus per-day counts from first_day to last_day, from the
+        daily rollup (see supabase_wins_stats_migration.sql)"""
+        return await self.session.value(
+            "get_win_summary", "select win_summary($1, $2, $3)", today, first_day, last_day
+        )
+
+    async def create_win(self, data: dict) -> Optional[dict]:
+        record = {**data, "user_id": self.user_id}
+        return await self.session.row(
+            "create_win", f"{_insert('wins', _columns('wins', record))} returning *", record
+        )
+
+    # ---------- search ----------
+
+    async def search(self, query: str, limit: int, after: Optional[tuple] = None) -> list:
+        """Tasks and wins matching `query`, best first, after the (rank, id) keyset position `after`
+        (see supabase_search_migration.sql)"""
+        after_rank, after_id = after if after is not None else (None, None)
+        return await self.session.rows(
+            "search",
+            "select * from search_items($1, $2, $3::float8::real, $4::text::uuid)",
+            query, limit, after_rank, after_id,
+        )
+
+    # ---------- google calendar accounts ----------
+
+    async def get_calendar_account(self, profile: str) -> Optional[dict]:
+        return await self.session.row(
+            "get_calendar_account",
+            "select * from google_calendar_accounts where user_id = $1::uuid and profile = $2",
+            self.user_id, profile,
+        )
+
+    async def list_calendar_accounts(self) -> list:
+        return await self.session.rows(
+            "list_calendar_accounts",
+            "select id, profile, google_email, created_at from google_calendar_accounts where user_id = $1::uuid",
+            self.user_id,
+        )
+
+    async def delete_calendar_account(self, profile: str) -> None:
+        await self.session.rows(
+            "delete_calendar_account",
+            "delete from google_calendar_accounts where user_id = $1::uuid and profile = $2 returning id",
+            self.user_id, profile,
+        )
+
+
+class PgAdminRepository:
+    """Service-role access where there is no user JWT to act as: OAuth writes and scheduler reads"""
+
+    def __init__(self, pool: "asyncpg.Pool", page_size: int = 1000):
+        self.session = PgSession(pool, "service_role", {"role": "service_role"})
+        # Paged like the PostgREST reads, so no one result is built as a single huge JSON array
+        self.page_size = page_size
+
+    def for_user(self, user_id: str) -> PgRepository:
+        """One user's tables, read with the service role"""
+        return PgRepository(self.session, user_id)
+
+    async def upsert_calendar_account(self, data: dict) -> None:
+        columns = _columns("google_calendar_accounts", data)
+        assignments = ", ".join(f'"{c}" = excluded."{c}"' for c in columns if c not in ("user_id", "profile"))
+        await self.session.rows(
+            "upsert_calendar_account",
+            f"{_insert('google_calendar_accounts', columns)}"
+            f" on conflict (user_id, profile) do update set {assignments} returning id",
+            data,
+        )
+
+    async def update_calendar_account(self, account_id: str, data: dict) -> None:
+        await self.session.rows(
+            "update_calendar_account",
+            f"update google_calendar_accounts set {_assign('google_calendar_accounts', _columns('google_calendar_accounts', data))}"
+            " where id = $2::text::uuid returning id",
+            data, account_id,
+        )
+
+    # ---------- scheduler (set-based reads across many users) ----------
+
+    async def list_happy_users(self) -> list:
+        async def page(limit: int, after: Optional[str]) -> list:
+            if after is None:
+                return await self.session.rows(
+                    "list_happy_users",
+                    "select user_id, name, email, timezone, location from happy_settings"
+                    " where enabled order by user_id limit $1",
+                    limit,
+                )
+            return await self.session.rows(
+                "list_happy_users",
+                "select user_id, name, email, timezone, location from happy_settings"
+                " where enabled and user_id > $1::text::uuid order by user_id limit $2",
+                after, limit,
+            )
+
+        return await fetch_keyset_pages(page, self.page_size, lambda row: row["user_id"])
+
+    async def list_tasks_for_users(self, user_ids: list) -> list:
+        async def page(limit: int, after: Optional[tuple]) -> list:
+            if after is None:
+                return await self.session.rows(
+                    "list_tasks_for_users",
+                    "select id, user_id, title, profile, section, completed, created_at from tasks"
+                    " where user_id = any($1::text[]::uuid[]) order by created_at, id limit $2",
+                    user_ids, limit,
+                )
+            created_at, task_id = after
+            return await self.session.rows(
+                "list_tasks_for_users",
+                "select id, user_id, title, profile, section, completed, created_at from tasks"
+                " where user_id = any($1::text[]::uuid[])"
+                " and (created_at, id) > ($2::text::timestamptz, $3::text::uuid)"
+                " order by created_at, id limit $4",
+                user_ids, created_at, task_id, limit,
+            )
+
+        return await fetch_keyset_pages(page, self.page_size, lambda row: (row["created_at"], row["id"]))
+
+    async def list_wins_for_users(self, user_ids: list, since: str) -> list:
+        async def page(limit: int, after: Optional[tuple]) -> list:
+            if after is None:
+                return await self.session.rows(
+                    "list_wins_for_users",
+                    "select id, user_id, task, completed_at from wins where user_id = any($1::text[]::uuid[])"
+                    " and completed_at >= $2::text::timestamptz order by completed_at desc, id desc limit $3",
+                    user_ids, since, limit,
+                )
+            completed_at, win_id = after
+            return await self.session.rows(
+                "list_wins_for_users",
+                "select id, user_id, task, completed_at from wins where user_id = any($1::text[]::uuid[])"
+                " and completed_at >= $2::text::timestamptz"
+                " and (completed_at, id) < ($3::text::timestamptz, $4::text::uuid)"
+                " order by completed_at desc, id desc limit $5",
+                user_ids, since, completed_at, win_id, limit,
+            )
+
+        return await fetch_keyset_pages(page, self.page_size, lambda row: (row["completed_at"], row["id"]))
+
+    async def get_win_totals(self, user_ids: list) -> list:
+        """All-time win count per user from the daily rollup (see supabase_scheduler_migration.sql)"""
+        return await self.session.rows(
+            "get_win_totals", "select * from win_totals($1::text[]::uuid[])", user_ids
+        )
+
+    async def list_last_app_opens(self, user_ids: list) -> list:
+        return await self.session.rows(
+            "list_last_app_opens",
+            "select user_id, last_app_open from user_settings where user_id = any($1::text[]::uuid[])",
+            user_ids,
+        )
+
+    async def list_calendar_accounts_for_users(self, user_ids: list) -> list:
+        return await self.session.rows(
+            "list_calendar_accounts_for_users",
+            "select * from google_calendar_accounts where user_id = any($1::text[]::uuid[])",
+            user_ids,
+        )
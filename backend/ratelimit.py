@@ -0,0 +1,158 @@
+"""Admission control for the DoIt API.
+
+RateLimiter keeps one token bucket per key (a user id), so a client gets a
+steady rate plus a burst allowance and is told how long to wait once it runs
+dry. ConcurrencyLimitedTransport caps how many requests to an upstream are in
+flight across the whole process. A request that can't get a slot within the
+queue timeout fails fast instead of piling up behind the others. Both raise
+HTTPException(429) with a Retry-After header.
+
+Given a shared cache (RedisCache), RateLimiter counts in fixed windows of
+burst/rate seconds that every worker increments, so a user gets the same
+allowance however many workers serve them. The concurrency cap is always
+per process.
+"""
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+from fastapi import HTTPException
+
+from cache import Cache
+from metrics import RATE_LIMITED
+
+
+def too_many_requests(retry_after: float, detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class TokenBucket:
+    """`burst` tokens, refilled at `rate` per second"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Spend `cost` tokens and return 0, or return the seconds until they'd be available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Bounded LRU of token buckets, one per key, or shared window counters when
+    `cache` is shared between workers; a rate of 0 disables the limit"""
+
+    def __init__(
+        self, name: str, rate: float, burst: float, max_keys: int = 10000, cache: Optional[Cache] = None
+    ):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.max_keys = max_keys
+        self.cache = cache
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    async def check(self, key: str, cost: float = 1.0) -> None:
+        """Spend from `key`'s allowance, or raise 429 saying when to retry"""
+        if self.rate <= 0:
+            return
+        if self.cache is not None and self.cache.shared:
+            retry_after = await self._take_shared(key, cost)
+        else:
+            retry_after = self._take_local(key, cost)
+        if retry_after:
+            RATE_LIMITED.labels(self.name).inc()
+            raise too_many_requests(retry_after, "Rate limit exceeded")
+
+    def _take_local(self, key: str, cost: float) -> float:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(key)
+        return bucket.take(cost)
+
+    async def _take_shared(self, key: str, cost: float) -> float:
+        """`burst` per window of burst/rate seconds: the bucket's long-run rate, counted in the cache"""
+        window = self.burst / self.rate
+        now = time.time()
+        slot = int(now // window)
+        used = await self.cache.incr(f"ratelimit:{self.name}:{key}:{slot}", math.ceil(cost), window)
+        if used <= self.burst:
+            return 0.0
+        return (slot + 1) * window - now
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives its concurrency slot back once it's closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class ConcurrencyLimitedTransport(httpx.AsyncBaseTransport):
+    """Wrap an httpx transport so at most `max_concurrency` requests are in flight.
+
+    A slot is held from sending the request until its body has been read or
+    closed. A request that waits longer than `queue_timeout` seconds for a slot
+    gets a 429 instead.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, name: str, max_concurrency: int, queue_timeout: float):
+        self.transport = transport
+        self.name = name
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            RATE_LIMITED.labels(self.name).inc()
+            raise too_many_requests(self.queue_timeout, "Upstream is busy, try again shortly")
+
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._slots.release()
+
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
@@ -0,0 +1,147 @@
+"""Keeping the DoIt API responsive when an upstream degrades.
+
+CircuitBreakerTransport wraps an httpx transport. After `failure_threshold`
+consecutive failures (transport errors, timeouts, 5xx or 429 responses) it
+opens. While open, requests fail at once with CircuitOpenError, an
+httpx.TransportError, so existing error handling still applies. After
+`reset_timeout` one probe request is let through. Its outcome closes the
+breaker or opens it again.
+
+SnapshotCache keeps the last good result per key. Each read starts a
+refresh. If there is a snapshot, the caller waits at most `fresh_wait` for
+the refresh and otherwise gets the snapshot, flagged as stale, while the
+refresh carries on in the background. Without a snapshot the caller waits
+up to `deadline`.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+import httpx
+
+from metrics import CIRCUIT_OPEN, CIRCUIT_REJECTIONS
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Raised instead of sending a request while the breaker is open"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if not self.probing and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        CIRCUIT_OPEN.labels(self.name).set(0)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.probing or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self.probing = False
+            CIRCUIT_OPEN.labels(self.name).set(1)
+
+    def release_probe(self) -> None:
+        """The probe ended without an answer either way (e.g. it was cancelled)"""
+        self.probing = False
+
+
+class CircuitBreakerTransport(httpx.AsyncBaseTransport):
+    """Wrap an httpx transport with a CircuitBreaker"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker):
+        self.transport = transport
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            CIRCUIT_REJECTIONS.labels(self.breaker.name).inc()
+            raise CircuitOpenError(f"{self.breaker.name} circuit is open", request=request)
+
+        recorded = False
+        try:
+            response = await self.transport.handle_async_request(request)
+            if response.status_code >= 500 or response.status_code == 429:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            recorded = True
+            return response
+        except httpx.TransportError:
+            self.breaker.record_failure()
+            recorded = True
+            raise
+        finally:
+            if not recorded:
+                self.breaker.release_probe()
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+
+class SnapshotCache:
+    """Bounded LRU of last-known-good values, served stale while a refresh runs"""
+
+    def __init__(self, max_entries: int = 10000, fresh_wait: float = 1.0, deadline: float = 5.0):
+        self.max_entries = max_entries
+        self.fresh_wait = fresh_wait
+        self.deadline = deadline
+        self._snapshots: "OrderedDict[tuple, object]" = OrderedDict()
+        self._refreshing: dict = {}
+
+    async def get(self, key: tuple, fetch: Callable[[], Awaitable]) -> tuple:
+        """(value, stale). Raises the refresh's error, or TimeoutError, if there's no snapshot."""
+        task = self._refreshing.get(key)
+        if task is None:
+            task = self._refreshing[key] = asyncio.ensure_future(self._refresh(key, fetch))
+            task.add_done_callback(lambda t: self._finished(key, t))
+
+        has_snapshot = key in self._snapshots
+        try:
+            value = await asyncio.wait_for(
+                asyncio.shield(task), self.fresh_wait if has_snapshot else self.deadline
+            )
+            return value, False
+        except (asyncio.TimeoutError, Exception):
+            if key not in self._snapshots:
+                raise
+            self._snapshots.move_to_end(key)
+            return self._snapshots[key], True
+
+    async def _refresh(self, key: tuple, fetch: Callable[[], Awaitable]):
+        value = await fetch()
+        self._snapshots[key] = value
+        self._snapshots.move_to_end(key)
+        while len(self._snapshots) > self.max_entries:
+            self._snapshots.popitem(last=False)
+        return value
+
+    def _finished(self, key: tuple, task: asyncio.Task) -> None:
+        if self._refreshing.get(key) is task:
+            del self._refreshing[key]
+        # Errors reach whoever awaited the refresh; don't also log them as unretrieved
+        if not task.cancelled():
+            task.exception()
+
+    def forget(self, prefix: tuple) -> None:
+        """Drop snapshots whose key starts with `prefix`"""
+        for key in [k for k in self._snapshots if k[:len(prefix)] == prefix]:
+            del self._snapshots[key]
@@ -1,16 +1,51 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Query
+from fastapi.responses import ORJSONResponse, RedirectResponse, StreamingResponse, Response
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
+import time
+import asyncio
 import logging
+import threading
 import httpx
+import jwt
+import io
+import csv
+import json
+import orjson
+import base64
+import hashlib
+import hmac
+import secrets
+import uuid
+import zoneinfo
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import Optional, Literal, List
-from datetime import datetime, timezone, timedelta
+from typing import Optional, Literal, List, Union, Annotated
+from datetime import datetime, date, timezone, timedelta
+from contextlib import asynccontextmanager, suppress
 from urllib.parse import urlencode, quote
 from supabase import create_client, Client
+from fastapi.concurrency import run_in_threadpool
+from calendar_sync import CalendarEventStore, CalendarSyncError
+from events import ChangeBroker
+from metrics import MetricsMiddleware, InstrumentedTransport, track_upstream
+from compression import CompressionMiddleware
+from ratelimit import ConcurrencyLimitedTransport, RateLimiter
+from cache import create_cache
+from resilience import CircuitBreaker, CircuitBreakerTransport, SnapshotCache
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from storage import (
+    create_postgrest_pool,
+    AdminRepository,
+    PostgrestClient,
+    PostgrestRepository,
+    PostgrestAdminRepository,
+    UserRepository,
+)
+from pg_storage import create_pg_pool, PgAdminRepository, PgRepository, PgSession
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -18,8 +53,31 @@ load_dotenv(ROOT_DIR / '.env')
 # Supabase connection
 SUPABASE_URL = os.environ.get('SUPABASE_URL', 'https://hyjkrbnsftuouaitbdkr.supabase.co')
 SUPABASE_ANON_KEY = os.environ.get('SUPABASE_ANON_KEY', '')
+SUPABASE_SERVICE_ROLE_KEY = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
+# PostgREST connection pool shared by every request
+POSTGREST_URL = f"{SUPABASE_URL}/rest/v1"
+POSTGREST_MAX_CONNECTIONS = int(os.environ.get('POSTGREST_MAX_CONNECTIONS', '100'))
+POSTGREST_MAX_KEEPALIVE = int(os.environ.get('POSTGREST_MAX_KEEPALIVE', '20'))
+# Rows per page for reads that can outgrow one response; keep at or below the project's max_rows
+POSTGREST_MAX_ROWS = int(os.environ.get('POSTGREST_MAX_ROWS', '1000'))
+
+# STORAGE_BACKEND=asyncpg talks to Postgres directly over DATABASE_URL instead of PostgREST
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'postgrest')
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+DATABASE_POOL_MIN = int(os.environ.get('DATABASE_POOL_MIN', '2'))
+DATABASE_POOL_MAX = int(os.environ.get('DATABASE_POOL_MAX', '20'))
+# 0 behind a transaction-mode pooler (Supavisor/PgBouncer), which can't keep prepared statements
+DATABASE_STATEMENT_CACHE_SIZE = int(os.environ.get('DATABASE_STATEMENT_CACHE_SIZE', '100'))
+
+# Local JWT verification (HS256 via the project's JWT secret, asymmetric keys via JWKS)
+SUPABASE_JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET', '')
+SUPABASE_JWT_AUDIENCE = os.environ.get('SUPABASE_JWT_AUDIENCE', 'authenticated')
+SUPABASE_JWKS_URL = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json"
+JWKS_REFRESH_SECONDS = int(os.environ.get('JWKS_REFRESH_SECONDS', '600'))
+VERIFIED_TOKEN_CACHE_SIZE = int(os.environ.get('VERIFIED_TOKEN_CACHE_SIZE', '4096'))
+
 # Google Calendar OAuth config
 GCAL_CLIENT_ID = os.environ.get('GCAL_CLIENT_ID', '')
 GCAL_CLIENT_SECRET = os.environ.get('GCAL_CLIENT_SECRET', '')
@@ -27,7 +85,191 @@ GCAL_REDIRECT_URI = os.environ.get('GCAL_REDIRECT_URI', 'http://localhost:8000/a
 GCAL_SCOPES = 'https://www.googleapis.com/auth/calendar.readonly'
 FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:5173')
 
-app = FastAPI(title="DoIt API")
+# Google endpoints (overridable so benchmarks can point at local stand-ins)
+GOOGLE_AUTH_URL = os.environ.get('GOOGLE_AUTH_URL', 'https://accounts.google.com/o/oauth2/v2/auth')
+GOOGLE_TOKEN_URL = os.environ.get('GOOGLE_TOKEN_URL', 'https://oauth2.googleapis.com/token')
+GOOGLE_USERINFO_URL = os.environ.get('GOOGLE_USERINFO_URL', 'https://www.googleapis.com/oauth2/v2/userinfo')
+GOOGLE_CALENDAR_API_URL = os.environ.get('GOOGLE_CALENDAR_API_URL', 'https://www.googleapis.com/calendar/v3')
+
+# Shared HTTP client for Google OAuth and Calendar calls
+GOOGLE_HTTP_TIMEOUT = float(os.environ.get('GOOGLE_HTTP_TIMEOUT', '10'))
+GOOGLE_MAX_CONNECTIONS = int(os.environ.get('GOOGLE_MAX_CONNECTIONS', '50'))
+GOOGLE_MAX_KEEPALIVE = int(os.environ.get('GOOGLE_MAX_KEEPALIVE', '20'))
+
+# Incremental calendar sync: how often to ask Google for deltas, how many calendars to keep
+GCAL_SYNC_INTERVAL_SECONDS = float(os.environ.get('GCAL_SYNC_INTERVAL_SECONDS', '30'))
+GCAL_CACHED_CALENDARS = int(os.environ.get('GCAL_CACHED_CALENDARS', '1000'))
+# Days ahead a full sync covers, and how long a calendar too busy to sync is served by range instead
+GCAL_SYNC_LOOKAHEAD_DAYS = int(os.environ.get('GCAL_SYNC_LOOKAHEAD_DAYS', '62'))
+GCAL_CAPPED_RETRY_SECONDS = float(os.environ.get('GCAL_CAPPED_RETRY_SECONDS', '3600'))
+# Longest custom range /api/gcal/events serves, in days
+GCAL_MAX_RANGE_DAYS = int(os.environ.get('GCAL_MAX_RANGE_DAYS', '92'))
+
+# Google OAuth token refresh: refresh inline inside the margin, in the background inside the lead
+GCAL_TOKEN_REFRESH_MARGIN_SECONDS = int(os.environ.get('GCAL_TOKEN_REFRESH_MARGIN_SECONDS', '300'))
+GCAL_TOKEN_REFRESH_LEAD_SECONDS = int(os.environ.get('GCAL_TOKEN_REFRESH_LEAD_SECONDS', '600'))
+GCAL_TOKEN_SWEEP_SECONDS = int(os.environ.get('GCAL_TOKEN_SWEEP_SECONDS', '60'))
+GCAL_TOKEN_IDLE_SECONDS = int(os.environ.get('GCAL_TOKEN_IDLE_SECONDS', '86400'))
+
+# Shared cache for settings, timezones, Supabase Auth answers and rate-limit counters:
+# empty keeps them in each worker's memory, redis://... shares them between workers
+CACHE_URL = os.environ.get('CACHE_URL', '')
+CACHE_TIMEOUT_SECONDS = float(os.environ.get('CACHE_TIMEOUT_SECONDS', '0.5'))
+
+# Settings cache: how long a user's settings are served from the cache, how many users to keep
+SETTINGS_CACHE_TTL_SECONDS = float(os.environ.get('SETTINGS_CACHE_TTL_SECONDS', '300'))
+SETTINGS_CACHE_SIZE = int(os.environ.get('SETTINGS_CACHE_SIZE', '10000'))
+# happy_settings is written straight from the client, never through this API, so a
+# cached timezone can't be invalidated on write; it is re-read after this long instead
+TIMEZONE_CACHE_TTL_SECONDS = float(os.environ.get('TIMEZONE_CACHE_TTL_SECONDS', '300'))
+
+# Task sync re-reads this far behind a client's cursor: updated_at is stamped when a write
+# starts (or by an API worker's clock), so a write can commit after a newer cursor was issued,
+# and the cursor itself comes from this worker's clock rather than the database's
+TASK_SYNC_OVERLAP_SECONDS = float(os.environ.get('TASK_SYNC_OVERLAP_SECONDS', '10'))
+
+# Responses smaller than this go out uncompressed
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+
+# Optional bearer token required to scrape /metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Change stream: keep-alive interval, replay history per user, per-connection queue bound
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', '15'))
+STREAM_HISTORY_SIZE = int(os.environ.get('STREAM_HISTORY_SIZE', '100'))
+STREAM_QUEUE_SIZE = int(os.environ.get('STREAM_QUEUE_SIZE', '100'))
+# Seconds a single-use ticket for opening the stream stays valid
+STREAM_TICKET_TTL_SECONDS = float(os.environ.get('STREAM_TICKET_TTL_SECONDS', '60'))
+
+# Rate limits (requests/sec plus burst; a rate of 0 turns the limit off): every API call a
+# user makes, and the calendar reads that may reach Google on their behalf
+RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', '10'))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '40'))
+GCAL_RATE_LIMIT_PER_SECOND = float(os.environ.get('GCAL_RATE_LIMIT_PER_SECOND', '2'))
+GCAL_RATE_LIMIT_BURST = float(os.environ.get('GCAL_RATE_LIMIT_BURST', '30'))
+# Google requests in flight at once across all users, and how long one may wait for a slot
+GOOGLE_MAX_CONCURRENCY = int(os.environ.get('GOOGLE_MAX_CONCURRENCY', '20'))
+GOOGLE_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('GOOGLE_QUEUE_TIMEOUT_SECONDS', '2'))
+
+# Google circuit breaker: consecutive failures that open it, seconds before a probe is let through
+GOOGLE_BREAKER_FAILURES = int(os.environ.get('GOOGLE_BREAKER_FAILURES', '5'))
+GOOGLE_BREAKER_RESET_SECONDS = float(os.environ.get('GOOGLE_BREAKER_RESET_SECONDS', '30'))
+# Calendar reads wait this long for fresh events before serving the last good snapshot
+# (marked stale), or up to the deadline when there is no snapshot yet
+GCAL_FRESH_WAIT_SECONDS = float(os.environ.get('GCAL_FRESH_WAIT_SECONDS', '1'))
+GCAL_FETCH_DEADLINE_SECONDS = float(os.environ.get('GCAL_FETCH_DEADLINE_SECONDS', '5'))
+GCAL_SNAPSHOTS = int(os.environ.get('GCAL_SNAPSHOTS', '10000'))
+
+# Scheduler context: users per set of bulk reads, Google calendar reads in flight at once
+SCHEDULER_BATCH_SIZE = int(os.environ.get('SCHEDULER_BATCH_SIZE', '100'))
+SCHEDULER_CALENDAR_CONCURRENCY = int(os.environ.get('SCHEDULER_CALENDAR_CONCURRENCY', '10'))
+
+# ==================== CONNECTION POOLS ====================
+
+# Settings and timezones share the in-memory cache, hence room for two entries per user
+cache = create_cache(CACHE_URL, 2 * SETTINGS_CACHE_SIZE, CACHE_TIMEOUT_SECONDS)
+
+postgrest_pool: Optional[httpx.AsyncClient] = None
+
+def get_postgrest_pool() -> httpx.AsyncClient:
+    """Return the process-wide PostgREST connection pool, creating it on first use"""
+    global postgrest_pool
+    if postgrest_pool is None:
+        postgrest_pool = create_postgrest_pool(
+            POSTGREST_URL, POSTGREST_MAX_CONNECTIONS, POSTGREST_MAX_KEEPALIVE
+        )
+    return postgrest_pool
+
+async def close_postgrest_pool() -> None:
+    global postgrest_pool
+    if postgrest_pool is not None:
+        await postgrest_pool.aclose()
+        postgrest_pool = None
+
+pg_pool = None
+
+def get_pg_pool():
+    """Return the asyncpg pool opened at startup when STORAGE_BACKEND=asyncpg"""
+    if pg_pool is None:
+        raise RuntimeError("The asyncpg pool is not open; set STORAGE_BACKEND=asyncpg and DATABASE_URL")
+    return pg_pool
+
+async def open_pg_pool() -> None:
+    global pg_pool
+    if STORAGE_BACKEND == "asyncpg" and pg_pool is None:
+        pg_pool = await create_pg_pool(
+            DATABASE_URL, DATABASE_POOL_MIN, DATABASE_POOL_MAX, DATABASE_STATEMENT_CACHE_SIZE
+        )
+
+async def close_pg_pool() -> None:
+    global pg_pool
+    if pg_pool is not None:
+        await pg_pool.close()
+        pg_pool = None
+
+google_http: Optional[httpx.AsyncClient] = None
+
+google_breaker = CircuitBreaker("google", GOOGLE_BREAKER_FAILURES, GOOGLE_BREAKER_RESET_SECONDS)
+
+def get_google_http() -> httpx.AsyncClient:
+    """Return the process-wide client for Google's OAuth and Calendar APIs"""
+    global google_http
+    if google_http is None:
+        transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=GOOGLE_MAX_CONNECTIONS,
+                max_keepalive_connections=GOOGLE_MAX_KEEPALIVE,
+                keepalive_expiry=120,
+            ),
+        )
+        google_http = httpx.AsyncClient(
+            # An open breaker refuses before a request queues for a concurrency slot
+            transport=CircuitBreakerTransport(
+                ConcurrencyLimitedTransport(
+                    InstrumentedTransport(transport, "google"),
+                    "google_concurrency",
+                    GOOGLE_MAX_CONCURRENCY,
+                    GOOGLE_QUEUE_TIMEOUT_SECONDS,
+                ),
+                google_breaker,
+            ),
+            timeout=httpx.Timeout(GOOGLE_HTTP_TIMEOUT, connect=5.0),
+            # Google only gzips responses when the User-Agent also mentions gzip
+            headers={"Accept-Encoding": "gzip", "User-Agent": "doit-api (gzip)"},
+        )
+    return google_http
+
+async def close_google_http() -> None:
+    global google_http
+    if google_http is not None:
+        await google_http.aclose()
+        google_http = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    token_refresher = None
+    try:
+        get_postgrest_pool()
+        await open_pg_pool()
+        get_google_http()
+        await cache.start()
+        token_refresher = asyncio.create_task(gcal_tokens.run())
+        yield
+    finally:
+        # Also runs when startup fails part way, so nothing opened so far is leaked
+        if token_refresher is not None:
+            token_refresher.cancel()
+            with suppress(asyncio.CancelledError):
+                await token_refresher
+        await cache.close()
+        await close_google_http()
+        await close_pg_pool()
+        await close_postgrest_pool()
+
+# Routes returning large PostgREST payloads hand back ORJSONResponse themselves:
+# the rows are already JSON-safe, so FastAPI's jsonable_encoder walk is skipped
+app = FastAPI(title="DoIt API", lifespan=lifespan, default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # ==================== MODELS ====================
@@ -42,6 +284,40 @@ class TaskUpdate(BaseModel):
     section: Optional[Literal["today", "tomorrow", "someday"]] = None
     completed: Optional[bool] = None
 
+class TaskBatchCreate(BaseModel):
+    op: Literal["create"]
+    task: TaskCreate
+
+class TaskBatchUpdate(BaseModel):
+    op: Literal["update"]
+    id: uuid.UUID
+    changes: TaskUpdate
+
+class TaskBatchDelete(BaseModel):
+    op: Literal["delete"]
+    id: uuid.UUID
+
+class TaskComplete(BaseModel):
+    completed_at: Optional[datetime] = None
+
+class TaskBatchComplete(TaskComplete):
+    op: Literal["complete"]
+    id: uuid.UUID
+
+class TaskBatchRollover(BaseModel):
+    op: Literal["rollover"]
+    profile: Optional[Literal["personal", "work"]] = None
+    from_section: Literal["today", "tomorrow", "someday"] = "tomorrow"
+    to_section: Literal["today", "tomorrow", "someday"] = "today"
+
+TaskBatchOp = Annotated[
+    Union[TaskBatchCreate, TaskBatchUpdate, TaskBatchDelete, TaskBatchComplete, TaskBatchRollover],
+    Field(discriminator="op"),
+]
+
+class TaskBatch(BaseModel):
+    ops: List[TaskBatchOp] = Field(min_length=1, max_length=200)
+
 class WinCreate(BaseModel):
     task: str
     completed_at: Optional[str] = None
@@ -52,89 +328,244 @@ class SettingsUpdate(BaseModel):
 
 # ==================== AUTH HELPERS ====================
 
-def get_user_id_from_token(request: Request) -> str:
-    """Extract and verify user from Supabase JWT in Authorization header"""
+class LocalVerificationUnavailable(Exception):
+    """Raised when a token can't be checked in-process and Supabase Auth has to decide"""
+
+class TimedJWKClient(jwt.PyJWKClient):
+    """PyJWKClient that records its JWKS downloads as upstream calls"""
+
+    def fetch_data(self):
+        with track_upstream("supabase_auth", "GET jwks"):
+            return super().fetch_data()
+
+class SupabaseTokenVerifier:
+    """Verify Supabase access tokens without a round-trip to Supabase Auth.
+
+    HS256 tokens are checked against the project's JWT secret; asymmetric tokens
+    against the project's JWKS, which is cached and re-fetched every
+    JWKS_REFRESH_SECONDS (or sooner when a token names an unknown key id).
+    Verified claims are kept in a bounded LRU until the token expires.
+    """
+
+    def __init__(self, jwt_secret: str, jwks_url: str, audience: str, cache_size: int):
+        self.jwt_secret = jwt_secret
+        self.audience = audience
+        self.cache_size = cache_size
+        self._jwks = TimedJWKClient(
+            jwks_url,
+            cache_jwk_set=True,
+            lifespan=JWKS_REFRESH_SECONDS,
+            headers={"apikey": SUPABASE_ANON_KEY},
+            timeout=5,
+        )
+        self._verified: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def cached(self, token: str) -> Optional[dict]:
+        """Return claims for a token verified earlier, if it hasn't expired since"""
+        with self._lock:
+            claims = self._verified.get(token)
+            if claims is None:
+                return None
+            if claims["exp"] <= time.time():
+                del self._verified[token]
+                return None
+            self._verified.move_to_end(token)
+            return claims
+
+    def remember(self, token: str, claims: dict) -> None:
+        with self._lock:
+            self._verified[token] = claims
+            self._verified.move_to_end(token)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+
+    def verify(self, token: str) -> dict:
+        """Return the token's claims, raising jwt.InvalidTokenError if it is bad
+        and LocalVerificationUnavailable if we have no key to check it with"""
+        claims = self.cached(token)
+        if claims is not None:
+            return claims
+
+        alg = jwt.get_unverified_header(token).get("alg")
+        if alg == "HS256":
+            if not self.jwt_secret:
+                raise LocalVerificationUnavailable("SUPABASE_JWT_SECRET is not configured")
+            key = self.jwt_secret
+        elif alg in ("RS256", "ES256"):
+            try:
+                key = self._jwks.get_signing_key_from_jwt(token).key
+            except (jwt.PyJWKClientError, jwt.PyJWKError) as e:
+                raise LocalVerificationUnavailable(f"No signing key available: {e}")
+        else:
+            raise LocalVerificationUnavailable(f"Unsupported token algorithm: {alg}")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[alg],
+            audience=self.audience,
+            options={"require": ["exp", "sub"]},
+        )
+        self.remember(token, claims)
+        return claims
+
+token_verifier = SupabaseTokenVerifier(
+    SUPABASE_JWT_SECRET, SUPABASE_JWKS_URL, SUPABASE_JWT_AUDIENCE, VERIFIED_TOKEN_CACHE_SIZE
+)
+
+def get_bearer_token(request: Request, detail: str = "Missing or invalid authorization header") -> str:
     auth_header = request.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
+        raise HTTPException(status_code=401, detail=detail)
+    return auth_header.split(" ")[1]
 
-    token = auth_header.split(" ")[1]
+def verify_token_remotely(token: str) -> dict:
+    """Ask Supabase Auth about a token we couldn't verify locally, shaped like JWT claims"""
+    with track_upstream("supabase_auth", "GET user"):
+        user_response = supabase.auth.get_user(token)
+    if not user_response or not user_response.user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    user = user_response.user
+    claims = {
+        "sub": user.id,
+        "email": user.email,
+        "user_metadata": user.user_metadata or {},
+    }
+    # Supabase Auth vouched for the token, so it's safe to trust its exp for caching
+    exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    if exp:
+        claims["exp"] = exp
+        token_verifier.remember(token, claims)
+    return claims
+
+async def verify_token(token: str) -> dict:
+    # A local check may fetch the JWKS and Supabase Auth is a network call, so keep both off the event loop
+    try:
+        return await run_in_threadpool(token_verifier.verify, token)
+    except LocalVerificationUnavailable:
+        pass
+
+    # Supabase Auth's answers are shared between workers (keyed by a hash, never the token itself)
+    key = f"auth:{hashlib.sha256(token.encode()).hexdigest()}"
+    claims = await cache.get(key)
+    if claims is not None:
+        token_verifier.remember(token, claims)
+        return claims
+
+    claims = await run_in_threadpool(verify_token_remotely, token)
+    if claims.get("exp", 0) > time.time():
+        await cache.set(key, claims, claims["exp"] - time.time())
+    return claims
+
+async def get_token_claims(request: Request, detail: str = "Missing or invalid authorization header") -> dict:
+    """Verify the Supabase JWT in the Authorization header and return its claims"""
+    return await get_claims_for_token(get_bearer_token(request, detail))
+
+async def get_claims_for_token(token: str) -> dict:
+    claims = token_verifier.cached(token)
+    if claims is not None:
+        return claims
 
     try:
-        # Use Supabase to verify the token and get user
-        user_response = supabase.auth.get_user(token)
-        if not user_response or not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return user_response.user.id
+        return await verify_token(token)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
 
-def get_supabase_client_for_user(request: Request) -> Client:
-    """Create a Supabase client authenticated as the user (for RLS)"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Missing authorization header")
-
-    token = auth_header.split(" ")[1]
-
-    # Create a new client with the user's token for RLS
-    user_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-    user_client.postgrest.auth(token)
-    return user_client
+async def get_user_id_from_token(request: Request) -> str:
+    """Extract and verify user from Supabase JWT in Authorization header"""
+    return (await get_token_claims(request))["sub"]
+
+def get_supabase_client_for_user(request: Request) -> PostgrestClient:
+    """PostgREST client authenticated as the user (for RLS)"""
+    token = get_bearer_token(request, detail="Missing authorization header")
+    return PostgrestClient(get_postgrest_pool(), token, SUPABASE_ANON_KEY)
+
+# Per-user limits (shared between workers with CACHE_URL); exceeding one is a 429 with Retry-After
+user_rate_limiter = RateLimiter("user", RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST, cache=cache)
+gcal_rate_limiter = RateLimiter("gcal", GCAL_RATE_LIMIT_PER_SECOND, GCAL_RATE_LIMIT_BURST, cache=cache)
+
+async def get_user_repository(request: Request) -> UserRepository:
+    """Authenticate and rate limit the request, then return a repository scoped to that user"""
+    claims = await get_token_claims(request)
+    user_id = claims["sub"]
+    await user_rate_limiter.check(user_id)
+    if STORAGE_BACKEND == "asyncpg":
+        return PgRepository(PgSession(get_pg_pool(), claims.get("role", "authenticated"), claims), user_id)
+    return PostgrestRepository(get_supabase_client_for_user(request), user_id)
+
+def get_admin_repository() -> AdminRepository:
+    """Repository using the service role when configured (bypasses RLS)"""
+    if STORAGE_BACKEND == "asyncpg":
+        return PgAdminRepository(get_pg_pool(), POSTGREST_MAX_ROWS)
+    if SUPABASE_SERVICE_ROLE_KEY:
+        client = PostgrestClient(get_postgrest_pool(), SUPABASE_SERVICE_ROLE_KEY, SUPABASE_SERVICE_ROLE_KEY)
+    else:
+        client = PostgrestClient(get_postgrest_pool(), SUPABASE_ANON_KEY, SUPABASE_ANON_KEY)
+    return PostgrestAdminRepository(client, POSTGREST_MAX_ROWS)
 
 # ==================== AUTH ENDPOINTS ====================
 
 @api_router.get("/auth/me")
 async def get_me(request: Request):
     """Get current authenticated user info from Supabase JWT"""
-    auth_header = request.headers.get("Authorization")
-    if not auth_header or not auth_header.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Not authenticated")
+    claims = await get_token_claims(request, detail="Not authenticated")
+    user_metadata = claims.get("user_metadata") or {}
+
+    return {
+        "user_id": claims["sub"],
+        "email": claims.get("email"),
+        "name": user_metadata.get("full_name", user_metadata.get("name", "")),
+        "picture": user_metadata.get("avatar_url", user_metadata.get("picture", "")),
+    }
 
-    token = auth_header.split(" ")[1]
+# ==================== SETTINGS ENDPOINTS ====================
 
+@lru_cache(maxsize=512)
+def zone_info(name: Optional[str]):
+    """tzinfo for an IANA zone name, UTC when it's missing or unknown"""
     try:
-        user_response = supabase.auth.get_user(token)
-        if not user_response or not user_response.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        user = user_response.user
-        return {
-            "user_id": user.id,
-            "email": user.email,
-            "name": user.user_metadata.get("full_name", user.user_metadata.get("name", "")),
-            "picture": user.user_metadata.get("avatar_url", user.user_metadata.get("picture", "")),
-        }
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=f"Authentication failed: {str(e)}")
-
-# ==================== SETTINGS ENDPOINTS ====================
+        return zoneinfo.ZoneInfo(name or "UTC")
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+async def load_timezone(repo: UserRepository) -> str:
+    """The user's timezone from happy_settings ("UTC" if unset or invalid), cached per user"""
+    tz_name = await cache.get(f"timezone:{repo.user_id}")
+    if tz_name is None:
+        tz_name = await repo.get_happy_timezone() or "UTC"
+        if zone_info(tz_name) is timezone.utc:
+            tz_name = "UTC"
+        await cache.set(f"timezone:{repo.user_id}", tz_name, TIMEZONE_CACHE_TTL_SECONDS)
+    return tz_name
 
 @api_router.get("/settings")
 async def get_settings(request: Request):
     """Get user settings"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
+    repo = await get_user_repository(request)
+    return await load_settings(repo)
 
-    result = client.table("user_settings").select("*").eq("user_id", user_id).execute()
+async def load_settings(repo: UserRepository) -> dict:
+    """Read the user's settings, creating the defaults on first use"""
+    settings = await cache.get(f"settings:{repo.user_id}")
+    if settings is not None:
+        return settings
 
-    if result.data and len(result.data) > 0:
-        return result.data[0]
+    # Upserting just user_id returns the existing row, or inserts one with the column defaults
+    settings = await repo.upsert_settings({})
+    if not settings:
+        raise HTTPException(status_code=500, detail="Failed to load settings")
 
-    # Create default settings if none exist
-    default_settings = {
-        "user_id": user_id,
-        "theme": "yellow",
-        "dark_mode": "auto",
-    }
-    client.table("user_settings").insert(default_settings).execute()
-    return default_settings
+    await cache.set(f"settings:{repo.user_id}", settings, SETTINGS_CACHE_TTL_SECONDS)
+    return settings
 
 @api_router.patch("/settings")
 async def update_settings(input: SettingsUpdate, request: Request):
     """Update user settings"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
+    repo = await get_user_repository(request)
 
     update_data = {k: v for k, v in input.model_dump().items() if v is not None}
     if not update_data:
@@ -142,52 +573,222 @@ async def update_settings(input: SettingsUpdate, request: Request):
 
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
 
-    result = client.table("user_settings").update(update_data).eq("user_id", user_id).execute()
+    settings = await repo.upsert_settings(update_data)
+
+    if not settings:
+        raise HTTPException(status_code=500, detail="Failed to update settings")
+
+    await cache.set(f"settings:{repo.user_id}", settings, SETTINGS_CACHE_TTL_SECONDS)
+    return settings
+
+# ==================== CURSORS ====================
+
+def encode_cursor(values: list) -> str:
+    """Opaque, URL-safe cursor holding a few JSON values"""
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *validators) -> tuple:
+    """The cursor's values, each passed through its validator; 400 if anything doesn't fit.
+
+    Validators also keep cursor values from breaking out of PostgREST filter expressions.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(values, list) or len(values) != len(validators):
+            raise ValueError("wrong number of cursor values")
+        return tuple(validate(value) for validate, value in zip(validators, values))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def cursor_timestamp(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        raise ValueError("cursor timestamp has no timezone")
+    return parsed
 
-    if not result.data:
-        # Upsert if no settings exist yet
-        update_data["user_id"] = user_id
-        result = client.table("user_settings").insert(update_data).execute()
+def cursor_uuid(value: str) -> str:
+    return str(uuid.UUID(value))
 
-    return result.data[0] if result.data else update_data
+def cursor_number(value) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("cursor value is not a number")
+    return float(value)
+
+async def fetch_keyset_page(fetch, limit: int, cursor_values) -> tuple:
+    """Up to `limit` rows from `fetch(n)` and the cursor for the page after them (None on the last page)"""
+    # Fetch one extra row to learn whether another page exists
+    rows = await fetch(limit + 1)
+    next_cursor = encode_cursor(cursor_values(rows[limit - 1])) if len(rows) > limit else None
+    return rows[:limit], next_cursor
 
 # ==================== TASK ENDPOINTS ====================
 
-@api_router.get("/tasks/{profile}")
-async def get_tasks(profile: Literal["personal", "work"], request: Request):
-    """Get tasks for a profile"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
+# Tombstones are pruned after this long (see supabase_task_sync_migration.sql);
+# an older ?since= cursor gets a full reset instead of a delta
+TASK_TOMBSTONE_RETENTION = timedelta(days=30)
+
+def tasks_etag(profile: str, count: int, newest: Optional[str]) -> str:
+    """Weak validator for a profile's task list: changes whenever a row is added, edited or removed"""
+    digest = hashlib.sha1(f"{profile}:{count}:{newest}".encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag.removeprefix("W/") in candidates
+
+def newest_timestamp(*timestamps: Optional[str]) -> Optional[str]:
+    parsed = [
+        (datetime.fromisoformat(ts.replace("Z", "+00:00")), ts) for ts in timestamps if ts
+    ]
+    return max(parsed)[1] if parsed else None
 
-    result = client.table("tasks").select("*").eq("user_id", user_id).eq("profile", profile).order("created_at").execute()
-    return result.data
+@api_router.get("/tasks/{profile}")
+async def get_tasks(
+    profile: Literal["personal", "work"],
+    request: Request,
+    since: Optional[str] = None,
+):
+    """Get tasks for a profile.
+
+    Without `since`, returns the full list with an ETag (answering If-None-Match
+    with 304 when nothing changed) and an X-Sync-Cursor header. With `since`,
+    returns only tasks changed and ids deleted after that cursor. Changes are
+    re-read from TASK_SYNC_OVERLAP_SECONDS before the cursor, so a delta can
+    repeat tasks and ids the client already has; apply it by id.
+    """
+    repo = await get_user_repository(request)
+
+    if since is not None:
+        return ORJSONResponse(await get_task_changes(repo, profile, since))
+
+    if request.headers.get("if-none-match"):
+        # Cheap probe first so an unchanged list never leaves the database
+        count, newest = await repo.get_tasks_version(profile)
+        etag = tasks_etag(profile, count, newest)
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+    # The cursor is the time of the read, so an idle list still moves it forward
+    read_at = datetime.now(timezone.utc)
+    tasks = await repo.list_tasks(profile)
+    newest = newest_timestamp(*(t.get("updated_at") for t in tasks))
+    return ORJSONResponse(tasks, headers={
+        "ETag": tasks_etag(profile, len(tasks), newest),
+        "Cache-Control": "private, no-cache",
+        "X-Sync-Cursor": encode_cursor([read_at.isoformat()]),
+    })
+
+async def get_task_changes(repo: UserRepository, profile: str, since: str) -> dict:
+    """Tasks changed and deleted after the cursor, or the full list if tombstones may be gone"""
+    (since_at,) = decode_cursor(since, cursor_timestamp)
+    # Taken before the reads: a write landing during them is re-read next time rather than missed
+    read_at = datetime.now(timezone.utc)
+    cursor = encode_cursor([read_at.isoformat()])
+
+    if since_at < read_at - TASK_TOMBSTONE_RETENTION:
+        tasks = await repo.list_tasks(profile)
+        return {"reset": True, "tasks": tasks, "deleted": [], "cursor": cursor}
+
+    # Writes that started before the cursor but committed after it are only caught by the overlap
+    overlap_ts = (since_at - timedelta(seconds=TASK_SYNC_OVERLAP_SECONDS)).isoformat()
+    tasks, tombstones = await asyncio.gather(
+        repo.list_tasks_changed_since(profile, overlap_ts),
+        repo.list_task_tombstones(profile, overlap_ts),
+    )
+    return {
+        "reset": False,
+        "tasks": tasks,
+        "deleted": [t["id"] for t in tombstones],
+        "cursor": cursor,
+    }
 
 @api_router.post("/tasks")
 async def create_task(input: TaskCreate, request: Request):
     """Create a new task"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
+    repo = await get_user_repository(request)
 
     task_data = {
-        "user_id": user_id,
         "title": input.title,
         "profile": input.profile,
         "section": input.section,
         "completed": False,
     }
 
-    result = client.table("tasks").insert(task_data).execute()
+    task = await repo.create_task(task_data)
 
-    if not result.data:
+    if not task:
         raise HTTPException(status_code=500, detail="Failed to create task")
 
-    return result.data[0]
+    changes.publish(repo.user_id, "task.created", task)
+    return task
+
+def publish_task_batch(user_id: str, ops: list, results: list) -> None:
+    """Publish one change event per op the batch applied"""
+    for op, result in zip(ops, results):
+        if not result.get("ok"):
+            continue
+        if op["op"] in ("create", "update"):
+            changes.publish(user_id, f"task.{op['op']}d", result["task"])
+        elif op["op"] == "delete":
+            changes.publish(user_id, "task.deleted", {"id": result["id"], "profile": result.get("profile")})
+        elif op["op"] == "complete":
+            publish_completion(user_id, result)
+        elif op["op"] == "rollover" and result.get("moved"):
+            changes.publish(user_id, "task.rolled_over", {
+                "profile": op.get("profile"),
+                "from_section": op["from_section"],
+                "to_section": op["to_section"],
+                "moved": result["moved"],
+            })
+
+@api_router.post("/tasks/batch")
+async def batch_tasks(input: TaskBatch, request: Request):
+    """Apply many task creates, updates, deletes, completions and section rollovers in one round-trip"""
+    repo = await get_user_repository(request)
+
+    for index, op in enumerate(input.ops):
+        if isinstance(op, TaskBatchUpdate) and not op.changes.model_dump(exclude_none=True):
+            raise HTTPException(status_code=400, detail=f"ops[{index}]: No fields to update")
+        if isinstance(op, TaskBatchRollover) and op.from_section == op.to_section:
+            raise HTTPException(status_code=400, detail=f"ops[{index}]: from_section and to_section are the same")
+
+    ops = [op.model_dump(mode="json", exclude_none=True) for op in input.ops]
+    results = await repo.apply_task_batch(ops)
+    publish_task_batch(repo.user_id, ops, results)
+    return ORJSONResponse({"results": results})
+
+def publish_completion(user_id: str, completion: dict) -> None:
+    changes.publish(user_id, "task.updated", completion["task"])
+    if completion.get("win"):
+        changes.publish(user_id, "win.created", completion["win"])
+
+@api_router.post("/tasks/{task_id}/complete")
+async def complete_task(task_id: uuid.UUID, request: Request, input: Optional[TaskComplete] = None):
+    """Mark a task completed and record the win in one transaction.
+
+    Completing an already completed task returns it with "win": null rather
+    than logging a second win.
+    """
+    repo = await get_user_repository(request)
+
+    completed_at = input.completed_at.isoformat() if input and input.completed_at else None
+    completion = await repo.complete_task(str(task_id), completed_at)
+
+    if not completion:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    publish_completion(repo.user_id, completion)
+    return completion
 
 @api_router.patch("/tasks/{task_id}")
 async def update_task(task_id: str, input: TaskUpdate, request: Request):
     """Update a task"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
+    repo = await get_user_repository(request)
 
     update_data = {k: v for k, v in input.model_dump().items() if v is not None}
     if not update_data:
@@ -195,62 +796,216 @@ async def update_task(task_id: str, input: TaskUpdate, request: Request):
 
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
 
-    result = client.table("tasks").update(update_data).eq("id", task_id).eq("user_id", user_id).execute()
+    task = await repo.update_task(task_id, update_data)
 
-    if not result.data:
+    if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    return result.data[0]
+    changes.publish(repo.user_id, "task.updated", task)
+    return task
 
 @api_router.delete("/tasks/{task_id}")
 async def delete_task(task_id: str, request: Request):
     """Delete a task"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
+    repo = await get_user_repository(request)
 
-    result = client.table("tasks").delete().eq("id", task_id).eq("user_id", user_id).execute()
-
-    if not result.data:
+    task = await repo.delete_task(task_id)
+    if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
+    changes.publish(repo.user_id, "task.deleted", {"id": task["id"], "profile": task["profile"]})
     return {"message": "Task deleted successfully"}
 
 # ==================== WINS ENDPOINTS ====================
 
+WINS_EXPORT_PAGE_SIZE = 500
+
+def win_cursor_values(win: dict) -> list:
+    return [win["completed_at"], win["id"]]
+
 @api_router.get("/wins")
-async def get_wins(request: Request):
-    """Get all wins for the user"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
+async def get_wins(
+    request: Request,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """Get the user's wins newest first, one keyset page at a time"""
+    repo = await get_user_repository(request)
+
+    after = None
+    if cursor:
+        completed_at, win_id = decode_cursor(cursor, cursor_timestamp, cursor_uuid)
+        after = (completed_at.isoformat(), win_id)
+    wins, next_cursor = await fetch_keyset_page(
+        lambda n: repo.list_wins_page(n, after), limit, win_cursor_values
+    )
+
+    return ORJSONResponse({"wins": wins, "next_cursor": next_cursor})
+
+async def export_wins_pages(repo: UserRepository):
+    """Every win newest first, one database page at a time so memory stays flat"""
+    after = None
+    while True:
+        page = await repo.list_wins_page(WINS_EXPORT_PAGE_SIZE, after)
+        if page:
+            yield page
+        if len(page) < WINS_EXPORT_PAGE_SIZE:
+            return
+        after = (page[-1]["completed_at"], page[-1]["id"])
+
+@api_router.get("/wins/export")
+async def export_wins(request: Request, format: Literal["ndjson", "csv"] = "ndjson"):
+    """Stream the full win history as NDJSON or CSV"""
+    repo = await get_user_repository(request)
+
+    if format == "ndjson":
+        async def body():
+            # One chunk per page keeps per-message overhead (and compressor calls) low
+            async for page in export_wins_pages(repo):
+                yield b"".join(orjson.dumps(win, option=orjson.OPT_APPEND_NEWLINE) for win in page)
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    async def body():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["id", "task", "completed_at"])
+        async for page in export_wins_pages(repo):
+            writer.writerows([win["id"], win["task"], win["completed_at"]] for win in page)
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+
+    return StreamingResponse(
+        body(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="wins.csv"'},
+    )
+
+WIN_STATS_MAX_RANGE_DAYS = 3660
+
+def bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+def next_bucket(start: date, bucket: str) -> date:
+    if bucket == "week":
+        return start + timedelta(days=7)
+    if bucket == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+def compute_win_stats(summary: dict, today: date, start: date, end: date, bucket: str) -> dict:
+    """Counts and a histogram from the rollup summary; cost is O(days in range), not O(wins)"""
+    daily = {date.fromisoformat(row["day"]): row["count"] for row in summary["days"]}
+
+    def total_since(first_day: date) -> int:
+        return sum(count for day, count in daily.items() if first_day <= day <= today)
+
+    per_bucket = {}
+    for day, count in daily.items():
+        if start <= day <= end:
+            key = bucket_start(day, bucket)
+            per_bucket[key] = per_bucket.get(key, 0) + count
+
+    histogram = []
+    cursor = bucket_start(start, bucket)
+    while cursor <= end:
+        histogram.append({"start": cursor.isoformat(), "count": per_bucket.get(cursor, 0)})
+        cursor = next_bucket(cursor, bucket)
+
+    return {
+        "today": today.isoformat(),
+        "counts": {
+            "today": daily.get(today, 0),
+            "week": total_since(bucket_start(today, "week")),
+            "month": total_since(bucket_start(today, "month")),
+            "total": summary["total"],
+        },
+        "streak": {"current": summary["current_streak"], "longest": summary["longest_streak"]},
+        "range": {"start": start.isoformat(), "end": end.isoformat(), "bucket": bucket},
+        "histogram": histogram,
+    }
+
+@api_router.get("/wins/stats")
+async def get_win_stats(
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    bucket: Literal["day", "week", "month"] = "day",
+):
+    """Win counts, streaks and a range histogram from the daily rollup table"""
+    repo = await get_user_repository(request)
+
+    user_zone = zone_info(await load_timezone(repo))
+    today = datetime.now(user_zone).date()
 
-    result = client.table("wins").select("*").eq("user_id", user_id).order("completed_at", desc=True).execute()
-    return result.data
+    end = end or today
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if (end - start).days > WIN_STATS_MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail="Range too large")
+
+    # Only the days the histogram and this week's and month's counts need leave the database
+    first_day = min(start, bucket_start(today, "week"), bucket_start(today, "month"))
+    summary = await repo.get_win_summary(today, first_day, max(end, today))
+    return ORJSONResponse({"timezone": str(user_zone), **compute_win_stats(summary, today, start, end, bucket)})
 
 @api_router.post("/wins")
 async def create_win(input: WinCreate, request: Request):
     """Record a win (completed task)"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
+    repo = await get_user_repository(request)
 
     win_data = {
-        "user_id": user_id,
         "task": input.task,
         "completed_at": input.completed_at or datetime.now(timezone.utc).isoformat(),
     }
 
-    result = client.table("wins").insert(win_data).execute()
+    win = await repo.create_win(win_data)
 
-    if not result.data:
+    if not win:
         raise HTTPException(status_code=500, detail="Failed to record win")
 
-    return result.data[0]
+    changes.publish(repo.user_id, "win.created", win)
+    return win
+
+# ==================== SEARCH ENDPOINTS ====================
+
+def search_cursor_values(result: dict) -> list:
+    return [result["rank"], result["id"]]
+
+@api_router.get("/search")
+async def search(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+):
+    """Search the user's tasks and wins by words and near-misses, best match first"""
+    repo = await get_user_repository(request)
+
+    query = q.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Search query is empty")
+
+    after = decode_cursor(cursor, cursor_number, cursor_uuid) if cursor else None
+    results, next_cursor = await fetch_keyset_page(
+        lambda n: repo.search(query, n, after), limit, search_cursor_values
+    )
+
+    return ORJSONResponse({"results": results, "next_cursor": next_cursor})
 
 # ==================== GOOGLE CALENDAR ENDPOINTS ====================
 
 @api_router.get("/gcal/connect/{profile}")
 async def gcal_connect(profile: Literal["personal", "work"], request: Request):
     """Start Google Calendar OAuth flow for a profile"""
-    user_id = get_user_id_from_token(request)
+    user_id = await get_user_id_from_token(request)
 
     # Store user_id and profile in state param for the callback
     state = f"{user_id}:{profile}"
@@ -263,7 +1018,7 @@ async def gcal_connect(profile: Literal["personal", "work"], request: Request):
         "prompt": "consent",
         "state": state,
     }
-    auth_url = f"https://accounts.google.com/o/oauth2/v2/auth?{urlencode(params)}"
+    auth_url = f"{GOOGLE_AUTH_URL}?{urlencode(params)}"
     return {"auth_url": auth_url}
 
 @api_router.get("/gcal/callback")
@@ -280,10 +1035,11 @@ async def gcal_callback(code: str = None, state: str = None, error: str = None):
     except ValueError:
         return RedirectResponse(f"{FRONTEND_URL}?gcal_error=invalid_state")
 
-    # Exchange code for tokens
-    async with httpx.AsyncClient() as client:
-        token_resp = await client.post(
-            "https://oauth2.googleapis.com/token",
+    # Exchange code for tokens. An open breaker or a full Google queue fails here
+    # too, and the browser should land back in the app rather than on a JSON error.
+    try:
+        token_resp = await get_google_http().post(
+            GOOGLE_TOKEN_URL,
             data={
                 "code": code,
                 "client_id": GCAL_CLIENT_ID,
@@ -292,6 +1048,9 @@ async def gcal_callback(code: str = None, state: str = None, error: str = None):
                 "grant_type": "authorization_code",
             },
         )
+    except (httpx.HTTPError, HTTPException) as e:
+        logger.warning(f"Google token exchange failed: {e!r}")
+        return RedirectResponse(f"{FRONTEND_URL}?gcal_error=google_unavailable")
 
     if token_resp.status_code != 200:
         return RedirectResponse(f"{FRONTEND_URL}?gcal_error=token_exchange_failed")
@@ -302,26 +1061,23 @@ async def gcal_callback(code: str = None, state: str = None, error: str = None):
     expires_in = tokens.get("expires_in", 3600)
     token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
 
-    # Get the Google email for this account
-    async with httpx.AsyncClient() as client:
-        userinfo_resp = await client.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
+    # Get the Google email for this account; the account is saved without it if Google can't say
+    google_email = ""
+    try:
+        userinfo_resp = await get_google_http().get(
+            GOOGLE_USERINFO_URL,
             headers={"Authorization": f"Bearer {access_token}"},
         )
-
-    google_email = ""
-    if userinfo_resp.status_code == 200:
-        google_email = userinfo_resp.json().get("email", "")
+        if userinfo_resp.status_code == 200:
+            google_email = userinfo_resp.json().get("email", "")
+    except (httpx.HTTPError, HTTPException) as e:
+        logger.warning(f"Google userinfo lookup failed: {e!r}")
 
     # Use service role to upsert (we don't have the user's JWT here in callback)
-    service_key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
-    if service_key:
-        admin_client = create_client(SUPABASE_URL, service_key)
-    else:
-        admin_client = supabase
+    admin_repo = get_admin_repository()
 
     # Upsert calendar account
-    admin_client.table("google_calendar_accounts").upsert(
+    await admin_repo.upsert_calendar_account(
         {
             "user_id": user_id,
             "profile": profile,
@@ -330,48 +1086,38 @@ async def gcal_callback(code: str = None, state: str = None, error: str = None):
             "refresh_token": refresh_token,
             "token_expires_at": token_expires_at.isoformat(),
             "updated_at": datetime.now(timezone.utc).isoformat(),
-        },
-        on_conflict="user_id,profile",
-    ).execute()
+        }
+    )
 
+    await forget_calendar_everywhere(user_id, profile)
     return RedirectResponse(f"{FRONTEND_URL}?gcal_connected={profile}")
 
 @api_router.delete("/gcal/{profile}")
 async def gcal_disconnect(profile: Literal["personal", "work"], request: Request):
     """Disconnect Google Calendar for a profile"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
-
-    client.table("google_calendar_accounts").delete().eq(
-        "user_id", user_id
-    ).eq("profile", profile).execute()
+    repo = await get_user_repository(request)
+    await repo.delete_calendar_account(profile)
+    await forget_calendar_everywhere(repo.user_id, profile)
 
     return {"message": f"Google Calendar disconnected for {profile}"}
 
 @api_router.get("/gcal/accounts")
 async def gcal_accounts(request: Request):
     """Get connected Google Calendar accounts"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
-
-    result = client.table("google_calendar_accounts").select(
-        "id, profile, google_email, created_at"
-    ).eq("user_id", user_id).execute()
-
-    return result.data or []
-
-async def refresh_gcal_token(account: dict) -> str:
-    """Refresh an expired Google Calendar access token"""
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            "https://oauth2.googleapis.com/token",
-            data={
-                "client_id": GCAL_CLIENT_ID,
-                "client_secret": GCAL_CLIENT_SECRET,
-                "refresh_token": account["refresh_token"],
-                "grant_type": "refresh_token",
-            },
-        )
+    repo = await get_user_repository(request)
+    return await repo.list_calendar_accounts()
+
+async def refresh_gcal_token(account: dict) -> tuple:
+    """Refresh an expired Google Calendar access token, returning it with its expiry"""
+    resp = await get_google_http().post(
+        GOOGLE_TOKEN_URL,
+        data={
+            "client_id": GCAL_CLIENT_ID,
+            "client_secret": GCAL_CLIENT_SECRET,
+            "refresh_token": account["refresh_token"],
+            "grant_type": "refresh_token",
+        },
+    )
 
     if resp.status_code != 200:
         raise HTTPException(status_code=502, detail="Failed to refresh Google token")
@@ -382,121 +1128,574 @@ async def refresh_gcal_token(account: dict) -> str:
     new_expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
 
     # Update token in database using service role
-    service_key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY', '')
-    if service_key:
-        admin_client = create_client(SUPABASE_URL, service_key)
-    else:
-        admin_client = supabase
-
-    admin_client.table("google_calendar_accounts").update({
+    admin_repo = get_admin_repository()
+    await admin_repo.update_calendar_account(account["id"], {
         "access_token": new_access_token,
         "token_expires_at": new_expires_at.isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat(),
-    }).eq("id", account["id"]).execute()
+    })
+
+    return new_access_token, new_expires_at
+
+class GoogleTokenCoordinator:
+    """In-memory Google access tokens with single-flight refresh per account.
+
+    Concurrent requests for an account whose token needs refreshing share one
+    in-flight refresh_gcal_token call. run() refreshes tokens of recently used
+    accounts shortly before they expire, so user requests normally find a fresh
+    token already cached.
+    """
+
+    def __init__(self):
+        self._tokens: dict = {}
+        self._accounts: dict = {}
+        self._last_used: dict = {}
+        self._inflight: dict = {}
+
+    def _remember(self, account: dict) -> tuple:
+        account_id = account["id"]
+        self._accounts[account_id] = {
+            "id": account_id,
+            "user_id": account.get("user_id"),
+            "profile": account.get("profile"),
+            "refresh_token": account["refresh_token"],
+        }
+        self._last_used[account_id] = time.monotonic()
 
-    return new_access_token
+        stored = (
+            account["access_token"],
+            datetime.fromisoformat(account["token_expires_at"].replace("Z", "+00:00")),
+        )
+        cached = self._tokens.get(account_id)
+        # The row may carry a newer token than ours if something else refreshed it
+        if cached is None or stored[1] > cached[1]:
+            self._tokens[account_id] = cached = stored
+        return cached
+
+    def store(self, account_id: str, access_token: str, expires_at: datetime) -> None:
+        self._tokens[account_id] = (access_token, expires_at)
+
+    def forget(self, account_id: str) -> None:
+        for registry in (self._tokens, self._accounts, self._last_used):
+            registry.pop(account_id, None)
+
+    def forget_profile(self, user_id: str, profile: str) -> None:
+        """Stop tracking an account that was disconnected or reconnected"""
+        for account_id, account in list(self._accounts.items()):
+            if (account["user_id"], account["profile"]) == (user_id, profile):
+                self.forget(account_id)
+
+    async def access_token(self, account: dict) -> str:
+        access_token, expires_at = self._remember(account)
+        margin = timedelta(seconds=GCAL_TOKEN_REFRESH_MARGIN_SECONDS)
+        if datetime.now(timezone.utc) < expires_at - margin:
+            return access_token
+        return await self.refresh(account["id"])
+
+    async def refresh(self, account_id: str) -> str:
+        task = self._inflight.get(account_id)
+        if task is None:
+            account = self._accounts.get(account_id)
+            if account is None:
+                raise HTTPException(status_code=404, detail="Google Calendar account is no longer connected")
+            task = asyncio.ensure_future(self._refresh(account))
+            self._inflight[account_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(account_id, None))
+        # Shield so one caller going away doesn't cancel the refresh for the others
+        return await asyncio.shield(task)
+
+    async def _refresh(self, account: dict) -> str:
+        access_token, expires_at = await refresh_gcal_token(account)
+        # Don't bring back an account that was disconnected while the refresh ran
+        if account["id"] in self._accounts:
+            self.store(account["id"], access_token, expires_at)
+        return access_token
+
+    async def run(self) -> None:
+        """Background loop refreshing tokens of active accounts before they expire"""
+        while True:
+            await asyncio.sleep(GCAL_TOKEN_SWEEP_SECONDS)
+            lead = datetime.now(timezone.utc) + timedelta(seconds=GCAL_TOKEN_REFRESH_LEAD_SECONDS)
+            idle_cutoff = time.monotonic() - GCAL_TOKEN_IDLE_SECONDS
+            for account_id in list(self._accounts):
+                # Nothing here may end the loop: there is no one to restart it
+                try:
+                    await self._sweep(account_id, lead, idle_cutoff)
+                except Exception as e:
+                    logger.warning(f"Background Google token refresh failed for {account_id}: {e}")
+
+    async def _sweep(self, account_id: str, lead: datetime, idle_cutoff: float) -> None:
+        last_used = self._last_used.get(account_id)
+        token = self._tokens.get(account_id)
+        if last_used is None or token is None:
+            # Forgotten while an earlier refresh in this sweep was awaited
+            return
+        if last_used < idle_cutoff:
+            self.forget(account_id)
+        elif token[1] <= lead:
+            await self.refresh(account_id)
+
+gcal_tokens = GoogleTokenCoordinator()
 
 async def get_valid_access_token(account: dict) -> str:
     """Get a valid access token, refreshing if expired"""
-    expires_at = datetime.fromisoformat(account["token_expires_at"].replace("Z", "+00:00"))
-    if datetime.now(timezone.utc) >= expires_at - timedelta(minutes=5):
-        return await refresh_gcal_token(account)
-    return account["access_token"]
+    return await gcal_tokens.access_token(account)
 
-@api_router.get("/gcal/events/{profile}")
-async def gcal_events(
-    profile: Literal["personal", "work"],
-    request: Request,
-    period: Literal["today", "tomorrow"] = "today",
-):
-    """Get Google Calendar events for today or tomorrow"""
-    user_id = get_user_id_from_token(request)
-    client = get_supabase_client_for_user(request)
-
-    # Get the calendar account for this profile
-    result = client.table("google_calendar_accounts").select("*").eq(
-        "user_id", user_id
-    ).eq("profile", profile).single().execute()
+# Partial response for events.list: only what format_calendar_event and the sync read
+GCAL_EVENT_FIELDS = (
+    "nextPageToken,nextSyncToken,"
+    "items(id,status,summary,description,location,start,end,eventType,transparency)"
+)
 
-    if not result.data:
-        return []
+calendar_store = CalendarEventStore(
+    max_calendars=GCAL_CACHED_CALENDARS,
+    min_sync_interval=GCAL_SYNC_INTERVAL_SECONDS,
+    lookahead_days=GCAL_SYNC_LOOKAHEAD_DAYS,
+    capped_retry=GCAL_CAPPED_RETRY_SECONDS,
+    fields=GCAL_EVENT_FIELDS,
+)
 
-    account = result.data
-    access_token = await get_valid_access_token(account)
+# Last good events per (user, profile, calendar, first day, last day, timezone)
+calendar_snapshots = SnapshotCache(GCAL_SNAPSHOTS, GCAL_FRESH_WAIT_SECONDS, GCAL_FETCH_DEADLINE_SECONDS)
+
+def forget_calendar(message: dict) -> None:
+    """Drop this worker's synced events, snapshots and tokens for a reconnected or removed profile"""
+    user_id, profile = message["user_id"], message["profile"]
+    calendar_store.forget(user_id, profile)
+    calendar_snapshots.forget((user_id, profile))
+    gcal_tokens.forget_profile(user_id, profile)
+
+# Calendar state stays per worker, so connects and disconnects are announced to all of them
+cache.subscribe("calendar.forget", forget_calendar)
+
+async def forget_calendar_everywhere(user_id: str, profile: str) -> None:
+    message = {"user_id": user_id, "profile": profile}
+    # Forget here right away; the message reaches every worker, this one included, a moment later
+    forget_calendar(message)
+    await cache.publish("calendar.forget", message)
+
+def format_calendar_event(item: dict, profile: str) -> dict:
+    """Map a Google Calendar event resource to the shape the frontend expects"""
+    # Determine event type
+    event_type = "event"
+    if item.get("eventType") == "focusTime":
+        event_type = "focus_time"
+    elif item.get("eventType") == "outOfOffice":
+        event_type = "out_of_office"
+    elif item.get("transparency") == "transparent":
+        event_type = "reminder"
+
+    # Parse start/end times
+    start = item.get("start", {})
+    end = item.get("end", {})
+
+    return {
+        "id": item.get("id"),
+        "title": item.get("summary", "(No title)"),
+        "description": item.get("description", ""),
+        "start": start.get("dateTime") or start.get("date", ""),
+        "end": end.get("dateTime") or end.get("date", ""),
+        "all_day": "date" in start and "dateTime" not in start,
+        "type": event_type,
+        "location": item.get("location", ""),
+        "status": item.get("status", "confirmed"),
+        "calendar_profile": profile,
+    }
 
-    # Determine time range based on period
-    # Use user's timezone from happy_settings if available
-    tz_result = client.table("happy_settings").select("timezone").eq(
-        "user_id", user_id
-    ).single().execute()
-    user_tz = tz_result.data.get("timezone", "UTC") if tz_result.data else "UTC"
+def calendar_days(period: str, today: date, start: Optional[date], end: Optional[date]) -> tuple:
+    """First and last day (inclusive) of a named period, or of an explicit start/end range"""
+    if start or end:
+        start = start or today
+        end = end or start
+        if start > end:
+            raise HTTPException(status_code=400, detail="start must not be after end")
+        if (end - start).days >= GCAL_MAX_RANGE_DAYS:
+            raise HTTPException(status_code=400, detail="Range too large")
+        return start, end
+    if period == "tomorrow":
+        tomorrow = today + timedelta(days=1)
+        return tomorrow, tomorrow
+    if period == "week":
+        monday = today - timedelta(days=today.weekday())
+        return monday, monday + timedelta(days=6)
+    if period == "month":
+        first = today.replace(day=1)
+        next_month = (first + timedelta(days=32)).replace(day=1)
+        return first, next_month - timedelta(days=1)
+    return today, today
+
+async def load_calendar_events(
+    repo: UserRepository,
+    account: dict,
+    profile: str,
+    user_tz: str,
+    period: str = "today",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> tuple:
+    """Events for a period or date range in the user's timezone, and whether they are stale.
+
+    Fresh events come from the synced cache. If Google is slow or failing,
+    the last good result for the same window is returned instead (stale=True)
+    while the refresh finishes in the background.
+    """
+    await gcal_rate_limiter.check(repo.user_id)
 
     # Calculate time boundaries in user's timezone so "today" means the user's today
-    try:
-        import zoneinfo
-        user_zone = zoneinfo.ZoneInfo(user_tz)
-    except Exception:
-        user_zone = timezone.utc
-    now_local = datetime.now(user_zone)
-    today_start = now_local.replace(hour=0, minute=0, second=0, microsecond=0)
-    if period == "today":
-        time_min = today_start
-        time_max = today_start + timedelta(days=1)
-    else:  # tomorrow
-        time_min = today_start + timedelta(days=1)
-        time_max = today_start + timedelta(days=2)
-
-    # Fetch events from Google Calendar API
+    user_zone = zone_info(user_tz)
+    first, last = calendar_days(period, datetime.now(user_zone).date(), start, end)
+    time_min = datetime.combine(first, datetime.min.time(), user_zone)
+    time_max = datetime.combine(last + timedelta(days=1), datetime.min.time(), user_zone)
     calendar_id = account.get('calendar_id') or 'primary'
-    params = {
-        "timeMin": time_min.isoformat(),
-        "timeMax": time_max.isoformat(),
-        "singleEvents": "true",
-        "orderBy": "startTime",
-        "maxResults": "50",
-        "timeZone": user_tz,
-    }
 
-    async with httpx.AsyncClient() as http_client:
-        resp = await http_client.get(
-            f"https://www.googleapis.com/calendar/v3/calendars/{quote(calendar_id, safe='')}/events",
-            params=params,
-            headers={"Authorization": f"Bearer {access_token}"},
+    async def fetch() -> list:
+        access_token = await get_valid_access_token(account)
+        # Serve the window from the synced event cache, asking Google only for changes
+        items = await calendar_store.events_between(
+            (repo.user_id, profile, calendar_id),
+            get_google_http(),
+            f"{GOOGLE_CALENDAR_API_URL}/calendars/{quote(calendar_id, safe='')}/events",
+            access_token,
+            time_min,
+            time_max,
+            user_zone,
+            user_tz,
         )
+        return [format_calendar_event(item, profile) for item in items]
 
-    if resp.status_code != 200:
+    key = (repo.user_id, profile, calendar_id, first, last, user_tz)
+    try:
+        return await calendar_snapshots.get(key, fetch)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Timed out fetching calendar events")
+    except (CalendarSyncError, httpx.HTTPError):
         raise HTTPException(status_code=502, detail="Failed to fetch calendar events")
 
-    data = resp.json()
-    events = []
-    for item in data.get("items", []):
-        # Determine event type
-        event_type = "event"
-        if item.get("eventType") == "focusTime":
-            event_type = "focus_time"
-        elif item.get("eventType") == "outOfOffice":
-            event_type = "out_of_office"
-        elif item.get("transparency") == "transparent":
-            event_type = "reminder"
-
-        # Parse start/end times
-        start = item.get("start", {})
-        end = item.get("end", {})
-
-        events.append({
-            "id": item.get("id"),
-            "title": item.get("summary", "(No title)"),
-            "description": item.get("description", ""),
-            "start": start.get("dateTime") or start.get("date", ""),
-            "end": end.get("dateTime") or end.get("date", ""),
-            "all_day": "date" in start and "dateTime" not in start,
-            "type": event_type,
-            "location": item.get("location", ""),
-            "status": item.get("status", "confirmed"),
-            "calendar_profile": profile,
+@api_router.get("/gcal/events/{profile}")
+async def gcal_events(
+    profile: Literal["personal", "work"],
+    request: Request,
+    period: Literal["today", "tomorrow", "week", "month"] = "today",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+):
+    """Get Google Calendar events for a period, or for start..end (inclusive) when given"""
+    repo = await get_user_repository(request)
+
+    # The account and the (usually cached) timezone don't depend on each other
+    account, user_tz = await asyncio.gather(repo.get_calendar_account(profile), load_timezone(repo))
+
+    if not account:
+        return []
+
+    events, stale = await load_calendar_events(repo, account, profile, user_tz, period, start, end)
+    headers = {"X-Calendar-Stale": "true"} if stale else None
+    return ORJSONResponse(events, headers=headers)
+
+# ==================== DASHBOARD ====================
+
+async def gather_sections(sections: dict) -> tuple:
+    """Await named coroutines concurrently; failures are reported per section, not raised"""
+    results = await asyncio.gather(*sections.values(), return_exceptions=True)
+    data, errors = {}, {}
+    for name, result in zip(sections, results):
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            logger.warning(f"Dashboard section {name} failed: {result!r}")
+            errors[name] = result.detail if isinstance(result, HTTPException) else "Failed to load"
+            data[name] = None
+        else:
+            data[name] = result
+    return data, errors
+
+async def load_profile_events(repo: UserRepository, profile: str, user_tz: "asyncio.Future") -> dict:
+    """Today's and tomorrow's events for one profile's calendar, if connected"""
+    account = await repo.get_calendar_account(profile)
+    if not account:
+        return {"today": [], "tomorrow": [], "stale": False}
+
+    tz_name = await user_tz
+    (today, today_stale), (tomorrow, tomorrow_stale) = await asyncio.gather(
+        load_calendar_events(repo, account, profile, tz_name, "today"),
+        load_calendar_events(repo, account, profile, tz_name, "tomorrow"),
+    )
+    return {"today": today, "tomorrow": tomorrow, "stale": today_stale or tomorrow_stale}
+
+@api_router.get("/dashboard")
+async def get_dashboard(request: Request, wins_limit: int = Query(20, ge=0, le=200)):
+    """Everything the app needs on open, fetched concurrently behind one auth check"""
+    repo = await get_user_repository(request)
+
+    # Both profiles' calendars need the timezone; look it up once
+    user_tz = asyncio.ensure_future(load_timezone(repo))
+    # Failures surface through the events sections; don't also log them as unretrieved
+    user_tz.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+    try:
+        data, errors = await gather_sections({
+            "settings": load_settings(repo),
+            "tasks.personal": repo.list_tasks("personal"),
+            "tasks.work": repo.list_tasks("work"),
+            "events.personal": load_profile_events(repo, "personal", user_tz),
+            "events.work": load_profile_events(repo, "work", user_tz),
+            "wins": repo.list_wins(limit=wins_limit),
         })
+    finally:
+        user_tz.cancel()
+
+    return ORJSONResponse({
+        "settings": data["settings"],
+        "tasks": {"personal": data["tasks.personal"], "work": data["tasks.work"]},
+        "events": {"personal": data["events.personal"], "work": data["events.work"]},
+        "wins": data["wins"],
+        "errors": errors,
+    })
+
+# ==================== SCHEDULER ====================
+
+# Local (weekday, hour) each Happy job is sent at; weekday None means every day.
+# Matches the gates in supabase/functions/happy/index.ts.
+HAPPY_JOB_WINDOWS = {
+    "morning": (None, 8),
+    "midday": (None, 14),
+    "evening": (None, 20),
+    "friday": (4, 18),
+    "sunday": (6, 19),
+    "midnight_rollover": (None, 0),
+}
+
+def require_service_role(request: Request) -> None:
+    """Only callers holding the service role key (the pg_cron jobs) may read other users' data"""
+    if not SUPABASE_SERVICE_ROLE_KEY:
+        raise HTTPException(status_code=503, detail="Service role key is not configured")
+    token = get_bearer_token(request, detail="Missing authorization header")
+    if not hmac.compare_digest(token.encode(), SUPABASE_SERVICE_ROLE_KEY.encode()):
+        raise HTTPException(status_code=403, detail="Service role required")
+
+def job_run_time(hour: Optional[int], now: datetime) -> datetime:
+    """The latest top of `hour` (UTC) at or before `now`; the current hour when `hour` is None.
+
+    A delayed or retried call for the 23:00 job arriving after midnight still means yesterday's 23:00.
+    """
+    at = now.replace(minute=0, second=0, microsecond=0)
+    if hour is None:
+        return at
+    at = at.replace(hour=hour)
+    return at - timedelta(days=1) if at > now else at
+
+def in_job_window(job_type: str, at: datetime, tz_name: str) -> bool:
+    """Whether `at` falls in the job's send hour in the user's timezone"""
+    window = HAPPY_JOB_WINDOWS.get(job_type)
+    if window is None:
+        return True  # hourly_check looks at everyone
+    weekday, hour = window
+    local = at.astimezone(zone_info(tz_name))
+    return local.hour == hour and (weekday is None or local.weekday() == weekday)
+
+def group_by_user(rows: list) -> dict:
+    grouped: dict = {}
+    for row in rows:
+        grouped.setdefault(row["user_id"], []).append(row)
+    return grouped
+
+async def load_scheduler_calendars(
+    admin_repo: AdminRepository, user_id: str, accounts: list, tz_name: str, limit: asyncio.Semaphore
+) -> dict:
+    """Today's and tomorrow's events for each of a user's connected calendars"""
+    repo = admin_repo.for_user(user_id)
+
+    async def profile_events(account: dict) -> tuple:
+        async with limit:
+            (today, _), (tomorrow, _) = await asyncio.gather(
+                load_calendar_events(repo, account, account["profile"], tz_name, "today"),
+                load_calendar_events(repo, account, account["profile"], tz_name, "tomorrow"),
+            )
+        return account["profile"], {"today": today, "tomorrow": tomorrow}
+
+    results = await asyncio.gather(*(profile_events(a) for a in accounts), return_exceptions=True)
+    calendars = {}
+    for account, result in zip(accounts, results):
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            logger.warning(f"Scheduler calendar read failed for {user_id}/{account['profile']}: {result!r}")
+            continue
+        profile, events = result
+        calendars[profile] = events
+    return calendars
+
+async def scheduler_contexts(admin_repo: AdminRepository, users: list, at: datetime):
+    """One context per user, reading each batch of users with a fixed number of queries"""
+    limit = asyncio.Semaphore(SCHEDULER_CALENDAR_CONCURRENCY)
+    week_ago = (at - timedelta(days=7)).isoformat()
+
+    for i in range(0, len(users), SCHEDULER_BATCH_SIZE):
+        batch = users[i:i + SCHEDULER_BATCH_SIZE]
+        user_ids = [u["user_id"] for u in batch]
+        tasks, wins, totals, app_opens, accounts = await asyncio.gather(
+            admin_repo.list_tasks_for_users(user_ids),
+            admin_repo.list_wins_for_users(user_ids, week_ago),
+            admin_repo.get_win_totals(user_ids),
+            admin_repo.list_last_app_opens(user_ids),
+            admin_repo.list_calendar_accounts_for_users(user_ids),
+        )
+        tasks, wins, accounts = group_by_user(tasks), group_by_user(wins), group_by_user(accounts)
+        totals = {row["user_id"]: row["total"] for row in totals}
+        app_opens = {row["user_id"]: row["last_app_open"] for row in app_opens}
+
+        calendars = await asyncio.gather(*(
+            load_scheduler_calendars(admin_repo, u["user_id"], accounts.get(u["user_id"], []), u["tz_name"], limit)
+            for u in batch
+        ))
+
+        contexts = []
+        for user, user_calendars in zip(batch, calendars):
+            user_id = user["user_id"]
+            by_profile: dict = {"personal": [], "work": []}
+            for task in tasks.get(user_id, []):
+                by_profile.setdefault(task["profile"], []).append(task)
+            recent_wins = wins.get(user_id, [])
+            contexts.append({
+                "user_id": user_id,
+                "name": user.get("name"),
+                "email": user.get("email"),
+                "timezone": user["tz_name"],
+                "location": user.get("location") or "",
+                "local_time": at.astimezone(zone_info(user["tz_name"])).isoformat(),
+                "last_app_open": app_opens.get(user_id),
+                "tasks": by_profile,
+                "wins": {
+                    "this_week": len(recent_wins),
+                    "total": totals.get(user_id, 0),
+                    "recent": recent_wins,
+                },
+                "calendar": user_calendars,
+            })
+        yield contexts
+
+@api_router.get("/scheduler/context")
+async def get_scheduler_context(
+    request: Request,
+    job_type: Literal["morning", "midday", "evening", "friday", "sunday", "midnight_rollover", "hourly_check"],
+    hour: Optional[int] = Query(None, ge=0, le=23),
+):
+    """Stream (NDJSON) the full context of every Happy user whose local time is in the job's window.
+
+    `hour` is the UTC hour the job fired for, taken as its latest occurrence
+    (default: the current hour). Service role only.
+    """
+    require_service_role(request)
+    at = job_run_time(hour, datetime.now(timezone.utc))
+
+    admin_repo = get_admin_repository()
+    users = []
+    for user in await admin_repo.list_happy_users():
+        tz_name = user.get("timezone") or "UTC"
+        if zone_info(tz_name) is timezone.utc:
+            tz_name = "UTC"
+        if in_job_window(job_type, at, tz_name):
+            users.append({**user, "tz_name": tz_name})
+
+    async def body():
+        async for contexts in scheduler_contexts(admin_repo, users, at):
+            yield b"".join(orjson.dumps(ctx, option=orjson.OPT_APPEND_NEWLINE) for ctx in contexts)
+
+    return StreamingResponse(
+        body(), media_type="application/x-ndjson", headers={"X-Scheduler-Users": str(len(users))}
+    )
+
+# ==================== CHANGE STREAM ====================
+
+changes = ChangeBroker(history_size=STREAM_HISTORY_SIZE, max_queue=STREAM_QUEUE_SIZE)
+
+async def change_events(user_id: str, last_event_id: Optional[str], expires_at: float):
+    """Server-Sent Events for one connection until the client leaves or its token expires"""
+    subscription = changes.subscribe(user_id, last_event_id)
+    try:
+        yield "retry: 3000\n\n"
+        if last_event_id:
+            yield "event: ready\ndata: {}\n\n"
+        else:
+            # Fresh clients resume from here; resuming clients keep their own position
+            yield f"id: {changes.current_id()}\nevent: ready\ndata: {{}}\n\n"
+
+        while True:
+            remaining = expires_at - time.time()
+            if remaining <= 0:
+                # Let the client reconnect with a fresh token
+                yield "event: expired\ndata: {}\n\n"
+                return
+            try:
+                event = await asyncio.wait_for(
+                    subscription.queue.get(), timeout=min(STREAM_HEARTBEAT_SECONDS, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            yield event.encode()
+    finally:
+        changes.unsubscribe(user_id, subscription)
+
+def stream_ticket_key(ticket: str) -> str:
+    # Only a digest is stored, so the cache never holds a usable ticket
+    return f"stream-ticket:{hashlib.sha256(ticket.encode()).hexdigest()}"
+
+@api_router.post("/stream/ticket")
+async def create_stream_ticket(request: Request):
+    """A short-lived, single-use ticket for opening /api/stream.
+
+    EventSource can't send an Authorization header, and query strings end up in
+    access logs, so the stream takes this ticket in the URL instead of the JWT.
+    Tickets live in the shared cache, so any worker can redeem them.
+    """
+    claims = await get_token_claims(request)
+    await user_rate_limiter.check(claims["sub"])
+
+    ticket = secrets.token_urlsafe(32)
+    await cache.set(
+        stream_ticket_key(ticket), {"sub": claims["sub"], "exp": claims.get("exp")}, STREAM_TICKET_TTL_SECONDS
+    )
+    return {"ticket": ticket, "expires_in": STREAM_TICKET_TTL_SECONDS}
+
+async def redeem_stream_ticket(ticket: str) -> dict:
+    """The claims a ticket was issued for; a ticket works once"""
+    key = stream_ticket_key(ticket)
+    # incr is atomic in every cache backend, so only one redemption sees 1
+    if await cache.incr(f"{key}:used", 1, STREAM_TICKET_TTL_SECONDS) != 1:
+        raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+    claims = await cache.get(key)
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired stream ticket")
+    await cache.delete(key)
+    return claims
+
+@api_router.get("/stream")
+async def stream_changes(
+    request: Request,
+    ticket: Optional[str] = None,
+    last_event_id: Optional[str] = Query(None, alias="lastEventId"),
+):
+    """Push task and win changes made from any device as Server-Sent Events.
+
+    Authenticate with the Authorization header or, from EventSource, with
+    ?ticket= from POST /api/stream/ticket. Reconnects resume from the
+    Last-Event-ID header (or ?lastEventId=); a "reset" event means the client
+    should refetch.
+    """
+    if request.headers.get("Authorization") or not ticket:
+        claims = await get_token_claims(request)
+    else:
+        claims = await redeem_stream_ticket(ticket)
+    # A client stuck in a reconnect loop is throttled like any other caller
+    await user_rate_limiter.check(claims["sub"])
 
-    return events
+    expires_at = float(claims.get("exp") or time.time() + 3600)
+    return StreamingResponse(
+        change_events(claims["sub"], request.headers.get("last-event-id") or last_event_id, expires_at),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # ==================== HEALTH CHECK ====================
 
@@ -508,12 +1707,22 @@ async def root():
 
 app.include_router(api_router)
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Prometheus scrape endpoint"""
+    if METRICS_TOKEN and request.headers.get("Authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Sync-Cursor", "X-Calendar-Stale"],
 )
 
 logging.basicConfig(
@@ -0,0 +1,369 @@
+"""Async data access for the DoIt API.
+
+Every table read and write the routes make goes through a repository, so
+handlers await the database round-trip instead of blocking the event loop.
+UserRepository and AdminRepository are the interface the routes code against.
+This module implements them over PostgREST; pg_storage.py implements them
+over a direct asyncpg pool (STORAGE_BACKEND=asyncpg).
+
+The PostgREST repositories share one pooled httpx.AsyncClient; the caller's
+JWT is attached per request so Row Level Security still applies. Each
+request is timed under the "postgrest" target in metrics.py.
+"""
+from datetime import date
+from typing import Optional, Protocol
+
+import httpx
+from postgrest import AsyncRequestBuilder, AsyncRPCFilterRequestBuilder
+from postgrest.types import CountMethod
+
+from metrics import InstrumentedTransport
+
+
+def create_postgrest_pool(
+    base_url: str, max_connections: int = 100, max_keepalive: int = 20
+) -> httpx.AsyncClient:
+    """Create the keep-alive connection pool every PostgREST request borrows from"""
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=60,
+        ),
+    )
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers={
+            "Accept": "application/json",
+            "Content-Type": "application/json",
+            "Accept-Profile": "public",
+            "Content-Profile": "public",
+        },
+        transport=InstrumentedTransport(transport, "postgrest"),
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        follow_redirects=True,
+    )
+
+
+async def fetch_keyset_pages(fetch_page, page_size: int, position) -> list:
+    """Every row of a keyset-ordered read, `fetch_page(limit, after)` at a time.
+
+    PostgREST silently truncates a response at max_rows (1000 on Supabase), so a
+    read that may exceed it is fetched in pages no larger than that.
+    """
+    rows, after = [], None
+    while True:
+        page = await fetch_page(page_size, after)
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+        after = position(page[-1])
+
+
+class UserRepository(Protocol):
+    """Tables the API reads and writes on behalf of one authenticated user.
+
+    Rows come back as JSON-shaped dicts (ids and timestamps as strings),
+    exactly as PostgREST returns them, whichever backend is in use.
+    """
+
+    user_id: str
+
+    async def upsert_settings(self, data: dict) -> Optional[dict]: ...
+    async def get_happy_timezone(self) -> Optional[str]: ...
+
+    async def list_tasks(self, profile: str) -> list: ...
+    async def get_tasks_version(self, profile: str) -> tuple: ...
+    async def list_tasks_changed_since(self, profile: str, since: str) -> list: ...
+    async def list_task_tombstones(self, profile: str, since: str) -> list: ...
+    async def create_task(self, data: dict) -> Optional[dict]: ...
+    async def update_task(self, task_id: str, data: dict) -> Optional[dict]: ...
+    async def delete_task(self, task_id: str) -> Optional[dict]: ...
+    async def complete_task(self, task_id: str, completed_at: Optional[str] = None) -> Optional[dict]: ...
+    async def apply_task_batch(self, ops: list) -> list: ...
+
+    async def list_wins(self, limit: Optional[int] = None) -> list: ...
+    async def list_wins_page(self, limit: int, after: Optional[tuple] = None) -> list: ...
+    async def get_win_summary(self, today: date, first_day: date, last_day: date) -> dict: ...
+    async def create_win(self, data: dict) -> Optional[dict]: ...
+
+    async def search(self, query: str, limit: int, after: Optional[tuple] = None) -> list: ...
+
+    async def get_calendar_account(self, profile: str) -> Optional[dict]: ...
+    async def list_calendar_accounts(self) -> list: ...
+    async def delete_calendar_account(self, profile: str) -> None: ...
+
+
+class AdminRepository(Protocol):
+    """Service-role access where there is no user JWT to act as"""
+
+    def for_user(self, user_id: str) -> UserRepository: ...
+
+    async def upsert_calendar_account(self, data: dict) -> None: ...
+    async def update_calendar_account(self, account_id: str, data: dict) -> None: ...
+
+    async def list_happy_users(self) -> list: ...
+    async def list_tasks_for_users(self, user_ids: list) -> list: ...
+    async def list_wins_for_users(self, user_ids: list, since: str) -> list: ...
+    async def get_win_totals(self, user_ids: list) -> list: ...
+    async def list_last_app_opens(self, user_ids: list) -> list: ...
+    async def list_calendar_accounts_for_users(self, user_ids: list) -> list: ...
+
+
+class PooledPostgrestSession:
+    """The shared PostgREST pool with one caller's credentials attached to each request"""
+
+    def __init__(self, pool: httpx.AsyncClient, token: str, apikey: str):
+        self.pool = pool
+        self.token = token
+        self.apikey = apikey
+
+    async def request(self, method: str, url: str, *, headers=None, **kwargs) -> httpx.Response:
+        headers = httpx.Headers(headers)
+        headers["apikey"] = self.apikey
+        headers["Authorization"] = f"Bearer {self.token}"
+        return await self.pool.request(method, url, headers=headers, **kwargs)
+
+
+class PostgrestClient:
+    """Lightweight per-request PostgREST client borrowing connections from the shared pool"""
+
+    def __init__(self, pool: httpx.AsyncClient, token: str, apikey: str):
+        self.session = PooledPostgrestSession(pool, token, apikey)
+
+    def table(self, table: str) -> AsyncRequestBuilder:
+        return AsyncRequestBuilder(self.session, f"/{table}")
+
+    def rpc(self, func: str, params: dict) -> AsyncRPCFilterRequestBuilder:
+        return AsyncRPCFilterRequestBuilder(
+            self.session, f"/rpc/{func}", "POST", httpx.Headers(), httpx.QueryParams(), json=params
+        )
+
+
+class PostgrestRepository:
+    """Tables the API reads and writes on behalf of one authenticated user"""
+
+    def __init__(self, client: PostgrestClient, user_id: str):
+        self.client = client
+        self.user_id = user_id
+
+    # ---------- settings ----------
+
+    async def upsert_settings(self, data: dict) -> Optional[dict]:
+        """Insert or update the user's settings row in one statement and return all of it"""
+        result = await self.client.table("user_settings").upsert(
+            {**data, "user_id": self.user_id}, on_conflict="user_id"
+        ).execute()
+        return result.data[0] if result.data else None
+
+    async def get_happy_timezone(self) -> Optional[str]:
+        result = await self.client.table("happy_settings").select("timezone").eq(
+            "user_id", self.user_id
+        ).maybe_single().execute()
+        return result.data.get("timezone") if result and result.data else None
+
+    # ---------- tasks ----------
+
+    async def list_tasks(self, profile: str) -> list:
+        result = await self.client.table("tasks").select("*").eq("user_id", self.user_id).eq(
+            "profile", profile
+        ).order("created_at").execute()
+        return result.data
+
+    async def get_tasks_version(self, profile: str) -> tuple:
+        """(row count, newest updated_at) for a profile's tasks, without fetching the rows"""
+        result = await self.client.table("tasks").select("updated_at", count=CountMethod.exact).eq(
+            "user_id", self.user_id
+        ).eq("profile", profile).order("updated_at", desc=True).limit(1).execute()
+        return result.count or 0, result.data[0]["updated_at"] if result.data else None
+
+    async def list_tasks_changed_since(self, profile: str, since: str) -> list:
+        result = await self.client.table("tasks").select("*").eq("user_id", self.user_id).eq(
+            "profile", profile
+        ).gt("updated_at", since).order("updated_at").execute()
+        return result.data
+
+    async def list_task_tombstones(self, profile: str, since: str) -> list:
+        """Tasks deleted after `since`, recorded by the trigger in supabase_task_sync_migration.sql"""
+        result = await self.client.table("task_tombstones").select("id, deleted_at").eq(
+            "user_id", self.user_id
+        ).eq("profile", profile).gt("deleted_at", since).order("deleted_at").execute()
+        return result.data
+
+    async def create_task(self, data: dict) -> Optional[dict]:
+        result = await self.client.table("tasks").insert({**data, "user_id": self.user_id}).execute()
+        return result.data[0] if result.data else None
+
+    async def update_task(self, task_id: str, data: dict) -> Optional[dict]:
+        result = await self.client.table("tasks").update(data).eq("id", task_id).eq(
+            "user_id", self.user_id
+        ).execute()
+        return result.data[0] if result.data else None
+
+    async def delete_task(self, task_id: str) -> Optional[dict]:
+        result = await self.client.table("tasks").delete().eq("id", task_id).eq(
+            "user_id", self.user_id
+        ).execute()
+        return result.data[0] if result.data else None
+
+    async def complete_task(self, task_id: str, completed_at: Optional[str] = None) -> Optional[dict]:
+        """Mark a task completed and record its win in one transaction: {"task": ..., "win": ...}"""
+        result = await self.client.rpc(
+            "complete_task", {"task_id": task_id, "completed_at": completed_at}
+        ).execute()
+        return result.data or None
+
+    async def apply_task_batch(self, ops: list) -> list:
+        """Apply create/update/delete/complete/rollover ops in one call (see supabase_task_batch_migration.sql)"""
+        result = await self.client.rpc("apply_task_batch", {"ops": ops}).execute()
+        return result.data
+
+    # ---------- wins ----------
+
+    async def list_wins(self, limit: Optional[int] = None) -> list:
+        query = self.client.table("wins").select("*").eq("user_id", self.user_id).order(
+            "completed_at", desc=True
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        result = await query.execute()
+        return result.data
+
+    async def list_wins_page(self, limit: int, after: Optional[tuple] = None) -> list:
+        """Wins newest first, starting after the (completed_at, id) keyset position `after`"""
+        query = self.client.table("wins").select("*").eq("user_id", self.user_id)
+        if after is not None:
+            completed_at, win_id = after
+            query = query.or_(
+                f'completed_at.lt."{completed_at}",'
+                f'and(completed_at.eq."{completed_at}",id.lt.{win_id})'
+            )
+        result = await query.order("completed_at", desc=True).order("id", desc=True).limit(limit).execute()
+        return result.data
+
+    async def get_win_summary(self, today: date, first_day: date, last_day: date) -> dict:
+        """All-time total and streaks plus per-day counts from first_day to last_day, from the
+        daily rollup (see supabase_wins_stats_migration.sql)"""
+        result = await self.client.rpc("win_summary", {
+            "today": today.isoformat(), "first_day": first_day.isoformat(), "last_day": last_day.isoformat(),
+        }).execute()
+        return result.data
+
+    async def create_win(self, data: dict) -> Optional[dict]:
+        result = await self.client.table("wins").insert({**data, "user_id": self.user_id}).execute()
+        return result.data[0] if result.data else None
+
+    # ---------- search ----------
+
+    async def search(self, query: str, limit: int, after: Optional[tuple] = None) -> list:
+        """Tasks and wins matching `query`, best first, after the (rank, id) keyset position `after`
+        (see supabase_search_migration.sql)"""
+        params = {"query": query, "max_results": limit}
+        if after is not None:
+            params["after_rank"], params["after_id"] = after
+        result = await self.client.rpc("search_items", params).execute()
+        return result.data or []
+
+    # ---------- google calendar accounts ----------
+
+    async def get_calendar_account(self, profile: str) -> Optional[dict]:
+        result = await self.client.table("google_calendar_accounts").select("*").eq(
+            "user_id", self.user_id
+        ).eq("profile", profile).maybe_single().execute()
+        return result.data if result else None
+
+    async def list_calendar_accounts(self) -> list:
+        result = await self.client.table("google_calendar_accounts").select(
+            "id, profile, google_email, created_at"
+        ).eq("user_id", self.user_id).execute()
+        return result.data or []
+
+    async def delete_calendar_account(self, profile: str) -> None:
+        await self.client.table("google_calendar_accounts").delete().eq(
+            "user_id", self.user_id
+        ).eq("profile", profile).execute()
+
+
+class PostgrestAdminRepository:
+    """Service-role access where there is no user JWT to act as: OAuth writes and scheduler reads"""
+
+    def __init__(self, client: PostgrestClient, page_size: int = 1000):
+        self.client = client
+        # Must not exceed the project's max_rows, or a truncated page looks like the last one
+        self.page_size = page_size
+
+    def for_user(self, user_id: str) -> PostgrestRepository:
+        """One user's tables, read with the service role"""
+        return PostgrestRepository(self.client, user_id)
+
+    async def upsert_calendar_account(self, data: dict) -> None:
+        await self.client.table("google_calendar_accounts").upsert(
+            data, on_conflict="user_id,profile"
+        ).execute()
+
+    async def update_calendar_account(self, account_id: str, data: dict) -> None:
+        await self.client.table("google_calendar_accounts").update(data).eq("id", account_id).execute()
+
+    # ---------- scheduler (set-based reads across many users) ----------
+
+    async def list_happy_users(self) -> list:
+        async def page(limit: int, after: Optional[str]) -> list:
+            query = self.client.table("happy_settings").select(
+                "user_id, name, email, timezone, location"
+            ).eq("enabled", True)
+            if after is not None:
+                query = query.gt("user_id", after)
+            result = await query.order("user_id").limit(limit).execute()
+            return result.data or []
+
+        return await fetch_keyset_pages(page, self.page_size, lambda row: row["user_id"])
+
+    async def list_tasks_for_users(self, user_ids: list) -> list:
+        async def page(limit: int, after: Optional[tuple]) -> list:
+            query = self.client.table("tasks").select(
+                "id, user_id, title, profile, section, completed, created_at"
+            ).in_("user_id", user_ids)
+            if after is not None:
+                created_at, task_id = after
+                query = query.or_(
+                    f'created_at.gt."{created_at}",'
+                    f'and(created_at.eq."{created_at}",id.gt.{task_id})'
+                )
+            result = await query.order("created_at").order("id").limit(limit).execute()
+            return result.data or []
+
+        return await fetch_keyset_pages(page, self.page_size, lambda row: (row["created_at"], row["id"]))
+
+    async def list_wins_for_users(self, user_ids: list, since: str) -> list:
+        async def page(limit: int, after: Optional[tuple]) -> list:
+            query = self.client.table("wins").select("id, user_id, task, completed_at").in_(
+                "user_id", user_ids
+            ).gte("completed_at", since)
+            if after is not None:
+                completed_at, win_id = after
+                query = query.or_(
+                    f'completed_at.lt."{completed_at}",'
+                    f'and(completed_at.eq."{completed_at}",id.lt.{win_id})'
+                )
+            result = await query.order("completed_at", desc=True).order("id", desc=True).limit(limit).execute()
+            return result.data or []
+
+        return await fetch_keyset_pages(page, self.page_size, lambda row: (row["completed_at"], row["id"]))
+
+    async def get_win_totals(self, user_ids: list) -> list:
+        """All-time win count per user from the daily rollup (see supabase_scheduler_migration.sql)"""
+        result = await self.client.rpc("win_totals", {"user_ids": user_ids}).execute()
+        return result.data or []
+
+    async def list_last_app_opens(self, user_ids: list) -> list:
+        result = await self.client.table("user_settings").select("user_id, last_app_open").in_(
+            "user_id", user_ids
+        ).execute()
+        return result.data or []
+
+    async def list_calendar_accounts_for_users(self, user_ids: list) -> list:
+        result = await self.client.table("google_calendar_accounts").select("*").in_(
+            "user_id", user_ids
+        ).execute()
+        return result.data or []
@@ -0,0 +1,26 @@
+-- ============================================================
+-- Scheduler context - bulk reads for the hourly Happy jobs
+-- Run this in Supabase SQL Editor (Dashboard > SQL Editor)
+-- ============================================================
+
+-- The API's /api/scheduler/context endpoint starts from every enabled
+-- happy_settings row, then reads tasks, wins, settings and calendar accounts
+-- for a batch of users at a time with `user_id in (...)` filters.
+
+-- Cheap scan of the users the jobs can email
+create index if not exists idx_happy_settings_enabled on happy_settings(user_id) where enabled;
+
+-- All-time win count per user, summed from the daily rollup in
+-- supabase_wins_stats_migration.sql instead of counting wins row by row.
+-- Users with no wins are left out; callers treat a missing row as 0.
+create or replace function win_totals(user_ids uuid[])
+returns table (user_id uuid, total bigint) as $$
+  select d.user_id, sum(d.count)::bigint
+  from win_daily_counts d
+  where d.user_id = any(user_ids)
+  group by d.user_id;
+$$ language sql stable security definer set search_path = public;
+
+-- Reads other users' rows, so only the service role may call it
+revoke execute on function win_totals(uuid[]) from public, anon, authenticated;
+grant execute on function win_totals(uuid[]) to service_role;
@@ -0,0 +1,83 @@
+-- ============================================================
+-- Search over tasks and wins
+-- Run this in Supabase SQL Editor (Dashboard > SQL Editor)
+-- ============================================================
+
+-- /api/search matches whole words (full-text search with English stemming,
+-- so "meetings" finds "meeting") and near-misses (trigram word similarity,
+-- so "quartrly" finds "quarterly report") in tasks.title and wins.task.
+-- Every index leads with user_id, so a search reads only the caller's
+-- matching rows, however long their history is.
+
+create extension if not exists pg_trgm with schema extensions;
+-- Lets user_id sit in the same GIN index as the text
+create extension if not exists btree_gin with schema extensions;
+
+-- Expression indexes rather than stored tsvector columns keep select * unchanged
+create index if not exists idx_tasks_title_fts
+  on tasks using gin (user_id, to_tsvector('english', title));
+create index if not exists idx_tasks_title_trgm
+  on tasks using gin (user_id, title extensions.gin_trgm_ops);
+create index if not exists idx_wins_task_fts
+  on wins using gin (user_id, to_tsvector('english', task));
+create index if not exists idx_wins_task_trgm
+  on wins using gin (user_id, task extensions.gin_trgm_ops);
+
+-- The caller's tasks and wins matching `query`, best match first. Words are
+-- matched with websearch_to_tsquery (so "quoted phrases" work) and the raw
+-- text with trigrams, so a typo still finds its word. rank is the full-text
+-- rank plus the trigram word similarity, so an exact word match outranks a
+-- fuzzy one. Trigram matches need a word similarity of 0.5; pg_trgm's
+-- default of 0.6 misses "quartrly". Pages are keyset: pass the last row's rank and id
+-- as after_rank/after_id to get the next page.
+-- Security definer, filtering on auth.uid() itself: under RLS Postgres won't
+-- evaluate non-leakproof operators like @@ and <% ahead of the policy check,
+-- which would leave only user_id for the indexes to narrow by.
+create or replace function search_items(
+  query text,
+  max_results integer default 20,
+  after_rank real default null,
+  after_id uuid default null
+)
+returns table (
+  kind text,
+  id uuid,
+  title text,
+  profile text,
+  section text,
+  completed boolean,
+  occurred_at timestamptz,
+  rank real
+) as $$
+  -- The tsquery is written out in each where clause (not joined in from a CTE)
+  -- so the planner can use it as an index condition
+  with matches as (
+    select
+      'task'::text as kind, t.id, t.title, t.profile, t.section, t.completed,
+      t.created_at as occurred_at,
+      ts_rank(to_tsvector('english', t.title), websearch_to_tsquery('english', query))
+        + word_similarity(query, t.title) as rank
+    from tasks t
+    where t.user_id = auth.uid()
+      and (to_tsvector('english', t.title) @@ websearch_to_tsquery('english', query) or query <% t.title)
+    union all
+    select
+      'win'::text, w.id, w.task, null, null, true,
+      w.completed_at,
+      ts_rank(to_tsvector('english', w.task), websearch_to_tsquery('english', query))
+        + word_similarity(query, w.task)
+    from wins w
+    where w.user_id = auth.uid()
+      and (to_tsvector('english', w.task) @@ websearch_to_tsquery('english', query) or query <% w.task)
+  )
+  select * from matches m
+  where after_rank is null or (m.rank, m.id) < (after_rank, after_id)
+  order by m.rank desc, m.id desc
+  limit max_results;
+$$ language sql stable security definer
+set search_path = public, extensions
+set pg_trgm.word_similarity_threshold = 0.5;
+
+-- Signed-in users only; auth.uid() scopes the results to the caller
+revoke execute on function search_items(text, integer, real, uuid) from public, anon;
+grant execute on function search_items(text, integer, real, uuid) to authenticated;
@@ -0,0 +1,125 @@
+-- ============================================================
+-- Batch task mutations
+-- Run this in Supabase SQL Editor (Dashboard > SQL Editor)
+-- ============================================================
+
+-- Complete a task and record its win in one transaction.
+-- Marks the task completed and inserts a win carrying its title. A task that is
+-- already completed is returned unchanged with "win": null, so a retried or
+-- double-tapped completion doesn't log the win twice. Returns null when the
+-- task doesn't exist or belongs to someone else.
+-- Runs as the caller (security invoker), so the tasks and wins RLS policies apply.
+create or replace function complete_task(task_id uuid, completed_at timestamptz default null)
+returns jsonb as $$
+declare
+  task_row tasks;
+  win_row wins;
+begin
+  update tasks set
+    completed = true,
+    updated_at = now()
+  where id = task_id and user_id = auth.uid() and not coalesce(completed, false)
+  returning * into task_row;
+
+  if found then
+    insert into wins (user_id, task, completed_at)
+    values (auth.uid(), task_row.title, coalesce(complete_task.completed_at, now()))
+    returning * into win_row;
+    return jsonb_build_object('task', to_jsonb(task_row), 'win', to_jsonb(win_row));
+  end if;
+
+  select * into task_row from tasks where id = task_id and user_id = auth.uid();
+  if not found then
+    return null;
+  end if;
+  return jsonb_build_object('task', to_jsonb(task_row), 'win', null);
+end;
+$$ language plpgsql security invoker;
+
+-- Apply a list of task operations in one round-trip and one transaction.
+-- Each element of `ops` is one of:
+--   {"op": "create", "task": {"title": ..., "profile": ..., "section": ...}}
+--   {"op": "update", "id": ..., "changes": {"title"?, "section"?, "completed"?}}
+--   {"op": "delete", "id": ...}
+--   {"op": "complete", "id": ..., "completed_at"?: ...}   (see complete_task above)
+--   {"op": "rollover", "profile"?: ..., "from_section": ..., "to_section": ...}
+-- Returns one result object per op, in order. An op that fails is reported
+-- with "ok": false and rolled back on its own; the other ops still apply.
+-- Runs as the caller (security invoker), so the tasks RLS policies apply.
+create or replace function apply_task_batch(ops jsonb)
+returns jsonb as $$
+declare
+  op jsonb;
+  task_row tasks;
+  completion jsonb;
+  moved integer;
+  results jsonb := '[]'::jsonb;
+begin
+  for op in select value from jsonb_array_elements(ops) loop
+    begin
+      case op->>'op'
+        when 'create' then
+          insert into tasks (user_id, title, profile, section, completed)
+          values (
+            auth.uid(),
+            op->'task'->>'title',
+            op->'task'->>'profile',
+            coalesce(op->'task'->>'section', 'today'),
+            false
+          )
+          returning * into task_row;
+          results := results || jsonb_build_object('op', 'create', 'ok', true, 'task', to_jsonb(task_row));
+
+        when 'update' then
+          update tasks set
+            title = coalesce(op->'changes'->>'title', title),
+            section = coalesce(op->'changes'->>'section', section),
+            completed = coalesce((op->'changes'->>'completed')::boolean, completed),
+            updated_at = now()
+          where id = (op->>'id')::uuid and user_id = auth.uid()
+          returning * into task_row;
+          if found then
+            results := results || jsonb_build_object('op', 'update', 'ok', true, 'task', to_jsonb(task_row));
+          else
+            results := results || jsonb_build_object('op', 'update', 'ok', false, 'id', op->>'id', 'error', 'Task not found');
+          end if;
+
+        when 'delete' then
+          delete from tasks
+          where id = (op->>'id')::uuid and user_id = auth.uid()
+          returning * into task_row;
+          if found then
+            results := results || jsonb_build_object('op', 'delete', 'ok', true, 'id', task_row.id, 'profile', task_row.profile);
+          else
+            results := results || jsonb_build_object('op', 'delete', 'ok', false, 'id', op->>'id', 'error', 'Task not found');
+          end if;
+
+        when 'complete' then
+          completion := complete_task((op->>'id')::uuid, (op->>'completed_at')::timestamptz);
+          if completion is not null then
+            results := results || (jsonb_build_object('op', 'complete', 'ok', true) || completion);
+          else
+            results := results || jsonb_build_object('op', 'complete', 'ok', false, 'id', op->>'id', 'error', 'Task not found');
+          end if;
+
+        when 'rollover' then
+          update tasks set
+            section = op->>'to_section',
+            updated_at = now()
+          where user_id = auth.uid()
+            and section = op->>'from_section'
+            and (op->>'profile' is null or profile = op->>'profile');
+          get diagnostics moved = row_count;
+          results := results || jsonb_build_object('op', 'rollover', 'ok', true, 'moved', moved);
+
+        else
+          results := results || jsonb_build_object('op', op->>'op', 'ok', false, 'error', 'Unknown op');
+      end case;
+    exception when others then
+      results := results || jsonb_build_object('op', op->>'op', 'ok', false, 'error', sqlerrm);
+    end;
+  end loop;
+
+  return results;
+end;
+$$ language plpgsql security invoker;
@@ -0,0 +1,57 @@
+-- ============================================================
+-- Task delta sync - server-side updated_at and deletion tombstones
+-- Run this in Supabase SQL Editor (Dashboard > SQL Editor)
+-- ============================================================
+
+-- One row per deleted task, so clients syncing with ?since= learn about deletions.
+-- Tombstones older than 30 days are pruned; the API answers older cursors with a full reset.
+create table if not exists task_tombstones (
+  id uuid primary key,
+  user_id uuid not null references auth.users(id) on delete cascade,
+  profile text not null,
+  deleted_at timestamptz not null default now()
+);
+
+create index if not exists idx_task_tombstones_user_profile on task_tombstones(user_id, profile, deleted_at);
+create index if not exists idx_tasks_user_profile_updated on tasks(user_id, profile, updated_at);
+
+-- Enable RLS
+alter table task_tombstones enable row level security;
+
+-- RLS Policies (rows are written by the trigger below, users only read them)
+create policy "Users can view own task tombstones"
+  on task_tombstones for select using (auth.uid() = user_id);
+
+-- Record a tombstone whenever a task is deleted, whichever path deleted it
+create or replace function record_task_tombstone()
+returns trigger as $$
+begin
+  insert into task_tombstones (id, user_id, profile)
+  values (old.id, old.user_id, old.profile)
+  on conflict (id) do update set deleted_at = now();
+
+  delete from task_tombstones
+  where user_id = old.user_id and deleted_at < now() - interval '30 days';
+
+  return old;
+end;
+$$ language plpgsql security definer set search_path = public;
+
+drop trigger if exists tasks_record_tombstone on tasks;
+create trigger tasks_record_tombstone
+  after delete on tasks
+  for each row execute function record_task_tombstone();
+
+-- Stamp updated_at from the database clock so ?since= cursors never depend on API server clocks
+create or replace function touch_task_updated_at()
+returns trigger as $$
+begin
+  new.updated_at = now();
+  return new;
+end;
+$$ language plpgsql;
+
+drop trigger if exists tasks_touch_updated_at on tasks;
+create trigger tasks_touch_updated_at
+  before update on tasks
+  for each row execute function touch_task_updated_at();
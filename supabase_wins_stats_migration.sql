@@ -0,0 +1,113 @@
+-- ============================================================
+-- Wins statistics - daily rollups
+-- Run this in Supabase SQL Editor (Dashboard > SQL Editor)
+-- ============================================================
+
+-- One row per user per local day with at least one win.
+-- Days are bucketed in the user's happy_settings timezone (UTC if unset or
+-- unknown, as the API does).
+create table if not exists win_daily_counts (
+  user_id uuid not null references auth.users(id) on delete cascade,
+  day date not null,
+  count integer not null default 0,
+  primary key (user_id, day)
+);
+
+-- Enable RLS
+alter table win_daily_counts enable row level security;
+
+-- RLS Policies (rows are written by the trigger below, users only read them)
+create policy "Users can view own win counts"
+  on win_daily_counts for select using (auth.uid() = user_id);
+
+-- `name` if it is a zone in pg_timezone_names, else 'UTC'. happy_settings.timezone
+-- is free text from the client, and an unknown zone must not fail the win insert.
+create or replace function known_timezone(name text)
+returns text as $$
+begin
+  if name is null or name = 'UTC' then
+    return 'UTC';
+  end if;
+  -- pg_timezone_names reads the whole zone database (~20 ms), too slow for every
+  -- win. An Area/Location name without digits can't be an abbreviation or a POSIX
+  -- offset, so if Postgres accepts it, it is in pg_timezone_names.
+  if name ~ '^[A-Za-z_]+(/[A-Za-z_-]+)+$' then
+    begin
+      perform now() at time zone name;
+      return name;
+    exception when invalid_parameter_value then
+      return 'UTC';
+    end;
+  end if;
+  return coalesce((select z.name from pg_timezone_names z where z.name = known_timezone.name), 'UTC');
+end;
+$$ language plpgsql stable;
+
+-- Keep the rollup current as wins are recorded
+create or replace function bump_win_daily_count()
+returns trigger as $$
+declare
+  user_tz text;
+begin
+  select timezone into user_tz from happy_settings where user_id = new.user_id;
+
+  insert into win_daily_counts (user_id, day, count)
+  values (
+    new.user_id,
+    (coalesce(new.completed_at, now()) at time zone known_timezone(user_tz))::date,
+    1
+  )
+  on conflict (user_id, day) do update set count = win_daily_counts.count + 1;
+
+  return new;
+end;
+$$ language plpgsql security definer set search_path = public;
+
+drop trigger if exists wins_bump_daily_count on wins;
+create trigger wins_bump_daily_count
+  after insert on wins
+  for each row execute function bump_win_daily_count();
+
+-- Backfill from existing wins (safe to re-run: recomputes every day from scratch)
+insert into win_daily_counts (user_id, day, count)
+select
+  w.user_id,
+  (w.completed_at at time zone coalesce(z.name, 'UTC'))::date as day,
+  count(*)
+from wins w
+left join happy_settings h on h.user_id = w.user_id
+left join pg_timezone_names z on z.name = h.timezone
+group by 1, 2
+on conflict (user_id, day) do update set count = excluded.count;
+
+-- /api/wins/stats in one call: the caller's all-time total and streaks, which
+-- need the whole rollup, summed here rather than sent row by row (PostgREST
+-- would also cut that read off at max_rows), plus the per-day counts between
+-- first_day and last_day. A single json value, so max_rows never applies.
+-- The current streak is still alive if the user hasn't won yet `today`.
+create or replace function win_summary(today date, first_day date, last_day date)
+returns json as $$
+  with days as (
+    select d.day, d.count
+    from win_daily_counts d
+    where d.user_id = auth.uid() and d.count > 0
+  ),
+  runs as (
+    -- Consecutive days share the same day minus their position
+    select min(r.day) as first, max(r.day) as last, count(*) as length
+    from (select days.day, days.day - (row_number() over (order by days.day))::int as run from days) r
+    group by r.run
+  )
+  select json_build_object(
+    'total', (select coalesce(sum(count), 0) from days),
+    'longest_streak', (select coalesce(max(length), 0) from runs),
+    'current_streak', (
+      select coalesce(max(least(last, today) - first + 1), 0)
+      from runs where first <= today and last >= today - 1
+    ),
+    'days', (
+      select coalesce(json_agg(json_build_object('day', day, 'count', count) order by day), '[]'::json)
+      from days where day between first_day and last_day
+    )
+  );
+$$ language sql stable set search_path = public;
@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+import time
+from pathlib import Path
+
+import httpx
+import jwt
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(BACKEND_DIR / "benchmarks"))
+
+# server.py reads its configuration at import; point it at nothing so importing it stays offline
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test-jwt-secret-with-at-least-32-bytes")
+os.environ.setdefault(
+    "SUPABASE_ANON_KEY", jwt.encode({"role": "anon"}, os.environ["SUPABASE_JWT_SECRET"], algorithm="HS256")
+)
+
+
+class FakeClock:
+    """Stand-in for the `time` module whose clock only moves when told to"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def fake_supabase():
+    from fake_supabase import FakePostgrest
+
+    return FakePostgrest()
+
+
+@pytest.fixture
+def postgrest(fake_supabase):
+    """Factory for a PostgrestClient acting as `user_id` against the in-process fake"""
+    from storage import PostgrestClient
+
+    def client(user_id: str = "service_role") -> PostgrestClient:
+        pool = httpx.AsyncClient(
+            base_url="http://supabase/rest/v1", transport=httpx.ASGITransport(app=fake_supabase.app)
+        )
+        token = jwt.encode({"sub": user_id, "role": "authenticated"}, os.environ["SUPABASE_JWT_SECRET"])
+        return PostgrestClient(pool, token, os.environ["SUPABASE_ANON_KEY"])
+
+    return client
+
+
+@pytest.fixture
+def api(monkeypatch, fake_supabase):
+    """Call the API in-process as a user, with its PostgREST reads and writes served by the fake"""
+    import server
+
+    monkeypatch.setattr(server, "postgrest_pool", httpx.AsyncClient(
+        base_url="http://supabase/rest/v1", transport=httpx.ASGITransport(app=fake_supabase.app)
+    ))
+    monkeypatch.setattr(server.user_rate_limiter, "rate", 0)
+
+    def call(method: str, path: str, user_id: str, **kwargs) -> httpx.Response:
+        token = jwt.encode(
+            {"sub": user_id, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + 3600},
+            os.environ["SUPABASE_JWT_SECRET"],
+            algorithm="HS256",
+        )
+
+        async def run():
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+                return await client.request(method, path, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+
+        return asyncio.run(run())
+
+    return call
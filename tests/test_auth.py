@@ -0,0 +1,171 @@
+import asyncio
+import hashlib
+import os
+import time
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+import server
+from cache import MemoryCache
+from server import LocalVerificationUnavailable, SupabaseTokenVerifier
+
+SECRET = os.environ["SUPABASE_JWT_SECRET"]
+USER_ID = "7c4e1b9a-3f2d-4a6e-8b50-2d9f1c7e3a14"
+
+
+def token(secret: str = SECRET, algorithm: str = "HS256", **claims) -> str:
+    payload = {"sub": USER_ID, "aud": "authenticated", "role": "authenticated", "exp": int(time.time()) + 3600}
+    return jwt.encode({**payload, **claims}, secret, algorithm=algorithm)
+
+
+def unsigned_token(**claims) -> str:
+    return jwt.encode(
+        {"sub": USER_ID, "aud": "authenticated", "exp": int(time.time()) + 3600, **claims}, None, algorithm="none"
+    )
+
+
+def verifier(jwt_secret: str = SECRET, cache_size: int = 10) -> SupabaseTokenVerifier:
+    return SupabaseTokenVerifier(jwt_secret, "http://127.0.0.1:9/jwks.json", "authenticated", cache_size)
+
+
+def test_valid_token_is_verified_and_remembered():
+    checker = verifier()
+    access_token = token()
+    assert checker.verify(access_token)["sub"] == USER_ID
+    assert checker.cached(access_token)["sub"] == USER_ID
+
+
+def test_expired_token_is_rejected():
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier().verify(token(exp=int(time.time()) - 10))
+
+
+def test_wrong_audience_is_rejected():
+    with pytest.raises(jwt.InvalidAudienceError):
+        verifier().verify(token(aud="service"))
+
+
+def test_wrong_secret_is_rejected():
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier().verify(token(secret="some-other-secret-that-is-long-enough"))
+
+
+def test_missing_sub_is_rejected():
+    access_token = jwt.encode({"aud": "authenticated", "exp": int(time.time()) + 60}, SECRET, algorithm="HS256")
+    with pytest.raises(jwt.MissingRequiredClaimError):
+        verifier().verify(access_token)
+
+
+@pytest.mark.parametrize("access_token", [
+    unsigned_token(),
+    token(secret=SECRET * 2, algorithm="HS512"),
+])
+def test_unsupported_algorithms_are_left_to_supabase_auth(access_token):
+    with pytest.raises(LocalVerificationUnavailable):
+        verifier().verify(access_token)
+
+
+def test_hs256_without_a_secret_is_left_to_supabase_auth():
+    with pytest.raises(LocalVerificationUnavailable):
+        verifier(jwt_secret="").verify(token())
+
+
+def test_verified_tokens_are_evicted_least_recently_used_first():
+    checker = verifier(cache_size=2)
+    first, second, third = (token(n=n) for n in range(3))
+    checker.verify(first)
+    checker.verify(second)
+    checker.cached(first)  # first is now the most recently used
+    checker.verify(third)
+    assert checker.cached(second) is None
+    assert checker.cached(first) is not None and checker.cached(third) is not None
+
+
+def test_expired_entries_are_dropped_from_the_cache():
+    checker = verifier()
+    access_token = token()
+    checker.remember(access_token, {"sub": USER_ID, "exp": time.time() - 1})
+    assert checker.cached(access_token) is None
+    assert access_token not in checker._verified
+
+
+# ---------- verify_token: local first, then Supabase Auth ----------
+
+@pytest.fixture
+def remote(monkeypatch):
+    """Supabase Auth stand-in recording the tokens it is asked about; local checks always fall through"""
+    asked = []
+
+    def get_user(access_token):
+        asked.append(access_token)
+        if jwt.decode(access_token, options={"verify_signature": False}).get("revoked"):
+            return None
+        return SimpleNamespace(user=SimpleNamespace(id=USER_ID, email="me@example.com", user_metadata={}))
+
+    monkeypatch.setattr(server, "supabase", SimpleNamespace(auth=SimpleNamespace(get_user=get_user)))
+    monkeypatch.setattr(server, "token_verifier", verifier(jwt_secret=""))
+    monkeypatch.setattr(server, "cache", MemoryCache(100))
+    return asked
+
+
+def auth_key(access_token: str) -> str:
+    return f"auth:{hashlib.sha256(access_token.encode()).hexdigest()}"
+
+
+def test_unverifiable_tokens_fall_back_to_supabase_auth(remote):
+    access_token = unsigned_token()
+    claims = asyncio.run(server.verify_token(access_token))
+    assert claims["sub"] == USER_ID and claims["email"] == "me@example.com"
+    assert remote == [access_token]
+
+
+def test_remote_answers_are_cached_until_the_token_expires(remote):
+    access_token = token(exp=int(time.time()) + 600)
+
+    async def run():
+        first = await server.verify_token(access_token)
+        server.token_verifier._verified.clear()  # as another worker would see it
+        second = await server.verify_token(access_token)
+        return first, second, await server.cache.get(auth_key(access_token))
+
+    first, second, shared = asyncio.run(run())
+    assert first == second == shared
+    assert remote == [access_token]
+
+
+def test_remote_answers_for_expired_tokens_are_not_cached(remote):
+    access_token = token(exp=int(time.time()) - 5)
+
+    async def run():
+        await server.verify_token(access_token)
+        return await server.cache.get(auth_key(access_token))
+
+    assert asyncio.run(run()) is None
+    assert server.token_verifier.cached(access_token) is None
+
+
+def test_remote_answers_without_exp_are_not_cached(remote):
+    access_token = jwt.encode({"sub": USER_ID}, SECRET, algorithm="HS256")
+
+    async def run():
+        await server.verify_token(access_token)
+        return await server.cache.get(auth_key(access_token))
+
+    assert asyncio.run(run()) is None
+
+
+def test_failures_become_401s(remote):
+    revoked = unsigned_token(revoked=True)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_claims_for_token(revoked))
+    assert error.value.status_code == 401
+    assert remote == [revoked]
+
+    server.token_verifier.jwt_secret = SECRET
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.get_claims_for_token(token(exp=int(time.time()) - 10)))
+    assert error.value.status_code == 401
+    assert "expired" in error.value.detail.lower()
@@ -0,0 +1,244 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import cache as cache_module
+import fake_redis
+import server
+from cache import MemoryCache, RedisCache
+from fake_redis import FakeRedis
+from harness import free_port
+
+
+@pytest.fixture
+def redis_server(monkeypatch, clock):
+    # The fake's TTLs run on the test clock; redis-py's own timeouts keep real time
+    monkeypatch.setattr(fake_redis, "time", clock)
+    with FakeRedis() as redis_server:
+        yield redis_server
+
+
+def run_with(cache, scenario):
+    """Run `scenario(cache)` on a fresh loop and close the cache afterwards"""
+
+    async def run():
+        try:
+            return await scenario(cache)
+        finally:
+            await cache.close()
+
+    return asyncio.run(run())
+
+
+async def eventually(condition, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out waiting"
+        await asyncio.sleep(0.01)
+
+
+# ---------- MemoryCache ----------
+
+def test_memory_entries_expire_after_their_ttl(monkeypatch, clock):
+    monkeypatch.setattr(cache_module, "time", clock)
+
+    async def scenario(cache):
+        await cache.set("settings:u1", {"theme": "dark"}, 30)
+        clock.advance(29)
+        assert await cache.get("settings:u1") == {"theme": "dark"}
+        clock.advance(1)
+        assert await cache.get("settings:u1") is None
+
+    run_with(MemoryCache(), scenario)
+
+
+def test_memory_evicts_the_least_recently_used_entry():
+    async def scenario(cache):
+        await cache.set("a", 1, 60)
+        await cache.set("b", 2, 60)
+        await cache.get("a")
+        await cache.set("c", 3, 60)
+        assert [await cache.get(key) for key in ("a", "b", "c")] == [1, None, 3]
+
+    run_with(MemoryCache(max_entries=2), scenario)
+
+
+def test_memory_counters_count_from_zero_and_expire_after_the_last_increment(monkeypatch, clock):
+    monkeypatch.setattr(cache_module, "time", clock)
+
+    async def scenario(cache):
+        assert [await cache.incr("rate:u1", 1, 10) for _ in range(3)] == [1, 2, 3]
+        clock.advance(9)
+        assert await cache.incr("rate:u1", 2, 10) == 5
+        clock.advance(9)
+        assert await cache.incr("rate:u1", 1, 10) == 6
+        clock.advance(10)
+        assert await cache.incr("rate:u1", 1, 10) == 1
+
+    run_with(MemoryCache(), scenario)
+
+
+def test_memory_publish_reaches_every_handler_even_when_one_fails():
+    received = []
+
+    def broken(message):
+        raise RuntimeError("handler bug")
+
+    async def scenario(cache):
+        cache.subscribe("calendar.forget", broken)
+        cache.subscribe("calendar.forget", received.append)
+        await cache.publish("calendar.forget", {"user_id": "u1", "profile": "work"})
+        await cache.publish("other", {"ignored": True})
+
+    run_with(MemoryCache(), scenario)
+    assert received == [{"user_id": "u1", "profile": "work"}]
+
+
+# ---------- RedisCache ----------
+
+def test_redis_round_trips_values_under_the_prefix(redis_server):
+    async def scenario(cache):
+        await cache.set("settings:u1", {"theme": "dark", "tags": [1, 2]}, 30)
+        assert await cache.get("settings:u1") == {"theme": "dark", "tags": [1, 2]}
+        assert b"doit:settings:u1" in redis_server._values
+        await cache.delete("settings:u1")
+        assert await cache.get("settings:u1") is None
+
+    run_with(RedisCache(redis_server.url), scenario)
+
+
+def test_redis_entries_expire_after_their_ttl(redis_server, clock):
+    async def scenario(cache):
+        await cache.set("settings:u1", {"theme": "dark"}, 30)
+        clock.advance(29)
+        assert await cache.get("settings:u1") == {"theme": "dark"}
+        clock.advance(1)
+        assert await cache.get("settings:u1") is None
+
+    run_with(RedisCache(redis_server.url), scenario)
+
+
+def test_redis_counters_are_atomic_across_workers(redis_server):
+    async def scenario(cache):
+        other = RedisCache(redis_server.url)
+        try:
+            return await asyncio.gather(
+                *(worker.incr("rate:u1", 1, 10) for _ in range(25) for worker in (cache, other))
+            )
+        finally:
+            await other.close()
+
+    counts = run_with(RedisCache(redis_server.url), scenario)
+    # Every increment saw a distinct value, so no two callers read the same count
+    assert sorted(counts) == list(range(1, 51))
+
+
+def test_redis_counters_expire_after_the_last_increment(redis_server, clock):
+    async def scenario(cache):
+        assert await cache.incr("rate:u1", 1, 10) == 1
+        clock.advance(9)
+        assert await cache.incr("rate:u1", 1, 10) == 2
+        clock.advance(9)
+        assert await cache.incr("rate:u1", 1, 10) == 3
+        clock.advance(10)
+        assert await cache.incr("rate:u1", 1, 10) == 1
+        # Without a ttl the counter is kept until deleted
+        assert await cache.incr("total", 5) == 5
+        assert redis_server._values[b"doit:total"][1] is None
+
+    run_with(RedisCache(redis_server.url), scenario)
+
+
+def test_redis_messages_reach_every_worker_the_sender_included(redis_server):
+    received = {"sender": [], "other": []}
+
+    async def scenario(cache):
+        other = RedisCache(redis_server.url)
+        cache.subscribe("calendar.forget", received["sender"].append)
+        other.subscribe("calendar.forget", received["other"].append)
+        try:
+            await cache.start()
+            await other.start()
+            await eventually(lambda: len(redis_server._channels.get(b"doit:calendar.forget", ())) == 2)
+            await cache.publish("calendar.forget", {"user_id": "u1", "profile": "work"})
+            await eventually(lambda: received["sender"] and received["other"])
+        finally:
+            await other.close()
+
+    run_with(RedisCache(redis_server.url), scenario)
+    assert received == {
+        "sender": [{"user_id": "u1", "profile": "work"}],
+        "other": [{"user_id": "u1", "profile": "work"}],
+    }
+
+
+def test_redis_calendar_forget_clears_another_workers_calendar_state(redis_server, monkeypatch):
+    account = {"user_id": "u1", "profile": "work"}
+    monkeypatch.setitem(server.gcal_tokens._accounts, "acct-1", account)
+    monkeypatch.setitem(server.calendar_snapshots._snapshots, ("u1", "work", "2026-10-18"), object())
+    monkeypatch.setitem(server.calendar_snapshots._snapshots, ("u2", "work", "2026-10-18"), object())
+
+    async def scenario(cache):
+        other = RedisCache(redis_server.url)
+        other.subscribe("calendar.forget", server.forget_calendar)
+        try:
+            await other.start()
+            await eventually(lambda: redis_server._channels.get(b"doit:calendar.forget"))
+            await cache.publish("calendar.forget", account)
+            await eventually(lambda: "acct-1" not in server.gcal_tokens._accounts)
+        finally:
+            await other.close()
+
+    run_with(RedisCache(redis_server.url), scenario)
+    assert list(server.calendar_snapshots._snapshots) == [("u2", "work", "2026-10-18")]
+
+
+def test_redis_close_stops_the_listener(redis_server):
+    async def scenario(cache):
+        cache.subscribe("calendar.forget", lambda message: None)
+        await cache.start()
+        listener = cache._listener
+        await eventually(lambda: redis_server._channels.get(b"doit:calendar.forget"))
+        await cache.close()
+        assert listener.done()
+
+    run_with(RedisCache(redis_server.url), scenario)
+
+
+# ---------- Redis outages ----------
+
+def test_redis_errors_read_as_misses_and_counters_fail_open():
+    async def scenario(cache):
+        await cache.set("settings:u1", {"theme": "dark"}, 30)
+        assert await cache.get("settings:u1") is None
+        await cache.delete("settings:u1")
+        await cache.publish("calendar.forget", {"user_id": "u1", "profile": "work"})
+        assert await cache.incr("rate:u1", 1, 10) == 0
+
+    # Nothing listens on the port, so every command fails to connect
+    run_with(RedisCache(f"redis://127.0.0.1:{free_port()}", timeout=0.2), scenario)
+
+
+def test_stream_tickets_are_refused_while_redis_is_down(monkeypatch):
+    async def scenario(cache):
+        monkeypatch.setattr(server, "cache", cache)
+        with pytest.raises(HTTPException) as exc:
+            await server.redeem_stream_ticket("ticket")
+        return exc.value.status_code
+
+    # incr returns 0 during an outage, which never matches a first redemption
+    down = RedisCache(f"redis://127.0.0.1:{free_port()}", timeout=0.2)
+    assert run_with(down, scenario) == 401
+
+
+def test_stream_tickets_redeem_once_through_redis(redis_server, monkeypatch):
+    async def scenario(cache):
+        monkeypatch.setattr(server, "cache", cache)
+        await cache.set(server.stream_ticket_key("ticket"), {"sub": "u1", "exp": None}, 60)
+        claims = await server.redeem_stream_ticket("ticket")
+        with pytest.raises(HTTPException):
+            await server.redeem_stream_ticket("ticket")
+        return claims
+
+    assert run_with(RedisCache(redis_server.url), scenario) == {"sub": "u1", "exp": None}
@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from server import GCAL_MAX_RANGE_DAYS, calendar_days
+
+# A Wednesday
+TODAY = date(2026, 10, 14)
+
+
+@pytest.mark.parametrize("period, expected", [
+    ("today", (TODAY, TODAY)),
+    ("tomorrow", (date(2026, 10, 15), date(2026, 10, 15))),
+    ("week", (date(2026, 10, 12), date(2026, 10, 18))),
+    ("month", (date(2026, 10, 1), date(2026, 10, 31))),
+])
+def test_named_periods(period, expected):
+    assert calendar_days(period, TODAY, None, None) == expected
+
+
+@pytest.mark.parametrize("today, expected", [
+    (date(2026, 12, 31), (date(2026, 12, 1), date(2026, 12, 31))),
+    (date(2028, 2, 10), (date(2028, 2, 1), date(2028, 2, 29))),
+])
+def test_month_ends_on_its_last_day(today, expected):
+    assert calendar_days("month", today, None, None) == expected
+
+
+def test_week_on_a_sunday_still_starts_on_monday():
+    assert calendar_days("week", date(2026, 10, 18), None, None) == (date(2026, 10, 12), date(2026, 10, 18))
+
+
+def test_explicit_range_overrides_the_period():
+    start, end = date(2026, 11, 2), date(2026, 11, 6)
+    assert calendar_days("month", TODAY, start, end) == (start, end)
+
+
+def test_start_alone_is_a_single_day():
+    assert calendar_days("today", TODAY, date(2026, 11, 2), None) == (date(2026, 11, 2), date(2026, 11, 2))
+
+
+def test_end_alone_runs_from_today():
+    assert calendar_days("today", TODAY, None, date(2026, 10, 20)) == (TODAY, date(2026, 10, 20))
+
+
+def test_start_after_end_is_rejected():
+    with pytest.raises(HTTPException) as error:
+        calendar_days("today", TODAY, date(2026, 10, 20), date(2026, 10, 19))
+    assert error.value.status_code == 400
+
+
+def test_range_limit():
+    longest = TODAY + timedelta(days=GCAL_MAX_RANGE_DAYS - 1)
+    assert calendar_days("today", TODAY, TODAY, longest) == (TODAY, longest)
+    with pytest.raises(HTTPException) as error:
+        calendar_days("today", TODAY, TODAY, longest + timedelta(days=1))
+    assert error.value.status_code == 400
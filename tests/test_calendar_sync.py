@@ -0,0 +1,106 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from calendar_sync import MAX_FULL_SYNC_PAGES, CalendarEventStore
+
+NOW = datetime.now(timezone.utc)
+EVENTS_URL = "http://google/calendars/primary/events"
+
+
+def event(event_id: str, days: float = 0) -> dict:
+    start = NOW + timedelta(days=days)
+    return {
+        "id": event_id,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + timedelta(minutes=30)).isoformat()},
+    }
+
+
+class FakeCalendar:
+    """events.list over a fixed set of events; with `endless`, full syncs never run out of pages"""
+
+    def __init__(self, events: list, endless: bool = False):
+        self.events = events
+        self.endless = endless
+        self.requests: list = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        params = dict(request.url.params)
+        self.requests.append(params)
+        if "syncToken" in params:
+            return httpx.Response(200, json={"items": [event("far", days=365)], "nextSyncToken": "t2"})
+        span = datetime.fromisoformat(params["timeMax"]) - datetime.fromisoformat(params["timeMin"])
+        # Range fetches come in week-sized slices; a full sync covers the whole lookahead
+        if self.endless and span > timedelta(days=7):
+            return httpx.Response(200, json={"items": self.events, "nextPageToken": "more"})
+        return httpx.Response(200, json={"items": self.events, "nextSyncToken": "t1"})
+
+
+def read(store: CalendarEventStore, calendar: FakeCalendar, start_days: float, end_days: float) -> list:
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(calendar.handler)) as http:
+            return await store.events_between(
+                ("user", "work", "primary"), http, EVENTS_URL, "token",
+                NOW + timedelta(days=start_days), NOW + timedelta(days=end_days), timezone.utc, "UTC",
+            )
+
+    return asyncio.run(run())
+
+
+def test_full_sync_is_bounded_and_later_reads_are_incremental():
+    store = CalendarEventStore(min_sync_interval=0, lookahead_days=30)
+    calendar = FakeCalendar([event("soon", days=0.1), event("later", days=3)])
+
+    assert [e["id"] for e in read(store, calendar, 0, 1)] == ["soon"]
+    (full_sync,) = calendar.requests
+    assert datetime.fromisoformat(full_sync["timeMax"]) == store.horizon_end()
+
+    assert [e["id"] for e in read(store, calendar, 0, 5)] == ["soon", "later"]
+    assert "syncToken" in calendar.requests[-1]
+    # Changes outside the synced window aren't kept
+    assert "far" not in store._calendars[("user", "work", "primary")].events
+
+
+def test_windows_past_the_lookahead_skip_the_sync():
+    store = CalendarEventStore(min_sync_interval=0, lookahead_days=30)
+    calendar = FakeCalendar([event("later", days=40)])
+
+    assert [e["id"] for e in read(store, calendar, 35, 42)] == ["later"]
+    assert all("syncToken" not in r and "timeMax" in r for r in calendar.requests)
+    assert store._calendars == {}
+
+
+def test_a_window_past_the_synced_one_slides_it_forward():
+    store = CalendarEventStore(min_sync_interval=3600, lookahead_days=30)
+    calendar = FakeCalendar([event("soon", days=0.1)])
+    read(store, calendar, 0, 1)
+    entry = store._calendars[("user", "work", "primary")]
+    entry.covered_until = NOW + timedelta(days=2)
+
+    read(store, calendar, 0, 5)
+    assert len(calendar.requests) == 2
+    assert "syncToken" not in calendar.requests[-1]
+    assert entry.covered_until == store.horizon_end()
+
+
+def test_capped_calendars_are_served_by_range_until_the_retry():
+    store = CalendarEventStore(min_sync_interval=0, capped_retry=3600)
+    calendar = FakeCalendar([event("soon", days=0.1)], endless=True)
+
+    assert [e["id"] for e in read(store, calendar, 0, 1)] == ["soon"]
+    # The capped full sync, then one range fetch for the window itself
+    assert len(calendar.requests) == MAX_FULL_SYNC_PAGES + 1
+
+    before = len(calendar.requests)
+    for _ in range(3):
+        read(store, calendar, 0, 1)
+    assert len(calendar.requests) - before == 3  # one range fetch each, no resync
+    assert all(
+        datetime.fromisoformat(r["timeMax"]) - datetime.fromisoformat(r["timeMin"]) <= timedelta(days=7)
+        for r in calendar.requests[before:]
+    )
+
+    entry = store._calendars[("user", "work", "primary")]
+    assert not entry.complete and entry.events == {}
@@ -0,0 +1,58 @@
+import pytest
+
+import server
+from events import ChangeBroker
+
+USER_ID = "5a0e7c2b-8d14-4b6f-9e3a-1f7c2d9b4e80"
+
+
+@pytest.fixture(autouse=True)
+def stream(monkeypatch):
+    """A change stream opened by the user before each test's requests"""
+    broker = ChangeBroker()
+    monkeypatch.setattr(server, "changes", broker)
+    return broker.subscribe(USER_ID)
+
+
+def published(stream) -> list:
+    events = []
+    while not stream.queue.empty():
+        event = stream.queue.get_nowait()
+        events.append((event.type, event.data))
+    return events
+
+
+def seed_tasks(fake_supabase, *tasks) -> list:
+    fake_supabase.seed("tasks", [
+        {"user_id": USER_ID, "profile": "work", "section": "today", "completed": False, **task} for task in tasks
+    ])
+    return [t["id"] for t in fake_supabase.tables["tasks"][-len(tasks):]]
+
+
+def test_complete_records_one_win(api, fake_supabase, stream):
+    (task_id,) = seed_tasks(fake_supabase, {"title": "ship it"})
+
+    first = api("POST", f"/api/tasks/{task_id}/complete", USER_ID)
+    assert first.status_code == 200
+    assert first.json()["task"]["completed"] is True
+    assert first.json()["win"]["task"] == "ship it"
+
+    again = api("POST", f"/api/tasks/{task_id}/complete", USER_ID)
+    assert again.status_code == 200
+    assert again.json()["win"] is None
+    assert len(fake_supabase.tables["wins"]) == 1
+    # The repeat only re-announces the task, never a second win
+    assert [event_type for event_type, _ in published(stream)] == ["task.updated", "win.created", "task.updated"]
+
+
+def test_complete_keeps_the_given_time(api, fake_supabase):
+    (task_id,) = seed_tasks(fake_supabase, {"title": "backdated"})
+    response = api("POST", f"/api/tasks/{task_id}/complete", USER_ID, json={"completed_at": "2026-10-01T09:30:00Z"})
+    assert response.json()["win"]["completed_at"] == "2026-10-01T09:30:00+00:00"
+
+
+def test_completing_someone_elses_task_is_a_404(api, fake_supabase):
+    fake_supabase.seed("tasks", [{"user_id": "someone-else", "title": "theirs", "profile": "work"}])
+    task_id = fake_supabase.tables["tasks"][-1]["id"]
+    assert api("POST", f"/api/tasks/{task_id}/complete", USER_ID).status_code == 404
+    assert api("POST", "/api/tasks/not-a-uuid/complete", USER_ID).status_code == 422
@@ -0,0 +1,35 @@
+import pytest
+
+import compression
+from compression import choose_encoding
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("GZIP", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0.001", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=abc", None),
+    ("*", "br"),
+    ("*;q=0", None),
+    ("br;q=0, *", "gzip"),
+    ("gzip;q=0, br;q=0, *", None),
+])
+def test_choose_encoding(accept_encoding, expected):
+    if expected == "br" and compression.brotli is None:
+        pytest.skip("Brotli is not installed")
+    assert choose_encoding(accept_encoding) == expected
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("br, gzip", "gzip"),
+    ("br", None),
+    ("*", "gzip"),
+])
+def test_choose_encoding_without_brotli(monkeypatch, accept_encoding, expected):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding(accept_encoding) == expected
@@ -0,0 +1,124 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from server import (
+    cursor_number,
+    cursor_timestamp,
+    cursor_uuid,
+    decode_cursor,
+    encode_cursor,
+    etag_matches,
+    fetch_keyset_page,
+    tasks_etag,
+)
+
+WIN_ID = "0b7f4c1e-2a59-4c8e-9a53-6a1d0f0e9b21"
+
+
+def raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def assert_invalid(cursor: str, *validators) -> None:
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor, *validators)
+    assert error.value.status_code == 400
+    assert error.value.detail == "Invalid cursor"
+
+
+def test_cursor_is_url_safe_and_unpadded():
+    cursor = encode_cursor(["2026-10-18T10:00:00.123456+00:00", WIN_ID])
+    assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+
+
+def test_round_trip_converts_each_value():
+    cursor = encode_cursor(["2026-10-18T10:00:00+00:00", WIN_ID.upper()])
+    completed_at, win_id = decode_cursor(cursor, cursor_timestamp, cursor_uuid)
+    assert completed_at == datetime(2026, 10, 18, 10, tzinfo=timezone.utc)
+    assert win_id == WIN_ID
+
+
+def test_zulu_timestamps_are_accepted():
+    (at,) = decode_cursor(encode_cursor(["2026-10-18T10:00:00Z"]), cursor_timestamp)
+    assert at.utcoffset().total_seconds() == 0
+
+
+def test_timestamp_without_timezone_is_rejected():
+    assert_invalid(raw_cursor(["2026-10-18T10:00:00"]), cursor_timestamp)
+
+
+def test_search_cursor_takes_a_number_and_an_id():
+    assert decode_cursor(encode_cursor([0.5833333, WIN_ID]), cursor_number, cursor_uuid) == (0.5833333, WIN_ID)
+    assert decode_cursor(encode_cursor([1, WIN_ID]), cursor_number, cursor_uuid) == (1.0, WIN_ID)
+
+
+@pytest.mark.parametrize("rank", [True, "0.5", None])
+def test_search_rank_must_be_a_number(rank):
+    assert_invalid(raw_cursor([rank, WIN_ID]), cursor_number, cursor_uuid)
+
+
+@pytest.mark.parametrize("cursor", [
+    "garbage!",
+    raw_cursor({"completed_at": "2026-10-18T10:00:00+00:00"}),
+    raw_cursor(["2026-10-18T10:00:00+00:00"]),
+    raw_cursor(["2026-10-18T10:00:00+00:00", WIN_ID, "extra"]),
+    raw_cursor(["2026-10-18T10:00:00+00:00", "1),id.gt.(0"]),
+    raw_cursor(["not a date", WIN_ID]),
+])
+def test_malformed_wins_cursors_are_rejected(cursor):
+    assert_invalid(cursor, cursor_timestamp, cursor_uuid)
+
+
+def test_keyset_page_fetches_one_extra_row():
+    rows = [{"id": str(i)} for i in range(6)]
+    requested = []
+
+    async def fetch(n):
+        requested.append(n)
+        return rows[:n]
+
+    page, next_cursor = asyncio.run(fetch_keyset_page(fetch, 3, lambda row: [row["id"]]))
+    assert requested == [4]
+    assert page == rows[:3]
+    assert next_cursor == encode_cursor(["2"])
+
+
+def test_keyset_page_has_no_cursor_on_the_last_page():
+    async def fetch(n):
+        return [{"id": "a"}, {"id": "b"}, {"id": "c"}][:n]
+
+    page, next_cursor = asyncio.run(fetch_keyset_page(fetch, 3, lambda row: [row["id"]]))
+    assert len(page) == 3
+    assert next_cursor is None
+
+
+def request_with(if_none_match=None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match is not None else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_etag_changes_with_the_task_list():
+    etag = tasks_etag("work", 3, "2026-10-18T10:00:00+00:00")
+    assert etag.startswith('W/"')
+    assert etag != tasks_etag("work", 4, "2026-10-18T10:00:00+00:00")
+    assert etag != tasks_etag("work", 3, "2026-10-18T10:00:01+00:00")
+    assert etag != tasks_etag("personal", 3, "2026-10-18T10:00:00+00:00")
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ("", False),
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('"other", W/"abc"', True),
+    ("*", True),
+    ('W/"abd"', False),
+])
+def test_etag_matches(header, matches):
+    assert etag_matches(request_with(header), 'W/"abc"') is matches
@@ -0,0 +1,105 @@
+from events import ChangeBroker
+
+
+def drain(subscription) -> list:
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def test_published_changes_reach_only_the_users_streams():
+    broker = ChangeBroker()
+    mine, other = broker.subscribe("u1"), broker.subscribe("u2")
+    broker.publish("u1", "task.created", {"id": "t1"})
+
+    (event,) = drain(mine)
+    assert (event.type, event.data) == ("task.created", {"id": "t1"})
+    assert event.encode() == f'id: {event.id}\nevent: task.created\ndata: {{"id":"t1"}}\n\n'
+    assert drain(other) == []
+
+
+def test_unsubscribed_streams_get_nothing():
+    broker = ChangeBroker()
+    subscription = broker.subscribe("u1")
+    broker.unsubscribe("u1", subscription)
+    broker.publish("u1", "task.created", {})
+    assert drain(subscription) == []
+
+
+def test_reconnect_replays_what_was_missed():
+    broker = ChangeBroker()
+    broker.publish("u1", "task.created", {"n": 1})
+    seen = broker.current_id()
+    broker.publish("u1", "task.updated", {"n": 2})
+    broker.publish("u2", "task.created", {"n": 99})
+    broker.publish("u1", "task.deleted", {"n": 3})
+
+    replayed = drain(broker.subscribe("u1", seen))
+    assert [e.data["n"] for e in replayed] == [2, 3]
+
+
+def test_reconnect_from_now_replays_nothing():
+    broker = ChangeBroker()
+    broker.publish("u1", "task.created", {})
+    assert drain(broker.subscribe("u1", broker.current_id())) == []
+
+
+def reset_reason(broker: ChangeBroker, user_id: str, last_event_id: str) -> str:
+    (event,) = drain(broker.subscribe(user_id, last_event_id))
+    assert event.type == "reset"
+    assert event.id == broker.current_id()
+    return event.data["reason"]
+
+
+def test_ids_from_another_process_or_garbage_reset():
+    broker = ChangeBroker()
+    broker.publish("u1", "task.created", {})
+    assert reset_reason(broker, "u1", "deadbeef-1") == "unknown_cursor"
+    assert reset_reason(broker, "u1", "garbage") == "unknown_cursor"
+    assert reset_reason(broker, "u1", f"{broker.prefix}-x") == "unknown_cursor"
+    assert reset_reason(broker, "u1", f"{broker.prefix}-99") == "unknown_cursor"
+
+
+def test_resuming_from_before_the_history_floor_resets():
+    broker = ChangeBroker(history_size=3)
+    ids = []
+    for n in range(5):
+        broker.publish("u1", "task.updated", {"n": n})
+        ids.append(broker.current_id())
+
+    # Events 3..5 are kept; resuming after event 2 still has everything it needs
+    assert [e.data["n"] for e in drain(broker.subscribe("u1", ids[1]))] == [2, 3, 4]
+    assert reset_reason(broker, "u1", ids[0]) == "history_expired"
+
+
+def test_a_user_first_seen_after_the_cursor_resets():
+    broker = ChangeBroker()
+    broker.publish("u2", "task.created", {})
+    early = broker.current_id()
+    broker.publish("u2", "task.created", {})
+    # u1's history only starts now, so nothing can be said about what they missed since `early`
+    assert reset_reason(broker, "u1", early) == "history_expired"
+
+
+def test_a_full_queue_is_replaced_by_one_reset():
+    broker = ChangeBroker(max_queue=2)
+    subscription = broker.subscribe("u1")
+    for n in range(3):
+        broker.publish("u1", "task.updated", {"n": n})
+
+    (event,) = drain(subscription)
+    assert event.type == "reset"
+    assert event.data == {"reason": "overflow"}
+    assert event.id == broker.current_id()
+
+
+def test_idle_users_are_evicted_but_listeners_are_kept():
+    broker = ChangeBroker(max_users=2)
+    listener = broker.subscribe("listening")
+    for user_id in ("a", "b", "c"):
+        broker.publish(user_id, "task.created", {})
+
+    assert list(broker._channels) == ["listening", "c"]
+    broker.publish("listening", "task.created", {})
+    assert len(drain(listener)) == 1
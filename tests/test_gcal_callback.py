@@ -0,0 +1,89 @@
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+import pytest
+
+import server
+from ratelimit import ConcurrencyLimitedTransport
+from resilience import CircuitBreaker, CircuitBreakerTransport
+
+
+class RecordingAdminRepository:
+    def __init__(self):
+        self.accounts = []
+
+    async def upsert_calendar_account(self, data: dict) -> None:
+        self.accounts.append(data)
+
+
+@pytest.fixture
+def admin_repo(monkeypatch):
+    repo = RecordingAdminRepository()
+    monkeypatch.setattr(server, "get_admin_repository", lambda: repo)
+
+    async def forget_calendar_everywhere(user_id, profile):
+        pass
+
+    monkeypatch.setattr(server, "forget_calendar_everywhere", forget_calendar_everywhere)
+    return repo
+
+
+def callback(monkeypatch, transport: httpx.AsyncBaseTransport) -> dict:
+    """Run the OAuth callback with Google behind `transport`; the redirect's query parameters"""
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            monkeypatch.setattr(server, "google_http", client)
+            return await server.gcal_callback(code="auth-code", state="user-1:work")
+
+    response = asyncio.run(run())
+    assert response.status_code == 307
+    location = response.headers["location"]
+    assert location.startswith(server.FRONTEND_URL)
+    return {key: values[0] for key, values in parse_qs(urlsplit(location).query).items()}
+
+
+def google(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("/token"):
+        return httpx.Response(200, json={"access_token": "ya29.new", "refresh_token": "1//r", "expires_in": 3600})
+    return httpx.Response(200, json={"email": "me@example.com"})
+
+
+def test_connects_and_saves_the_account(monkeypatch, admin_repo):
+    assert callback(monkeypatch, httpx.MockTransport(google)) == {"gcal_connected": "work"}
+    (account,) = admin_repo.accounts
+    assert (account["user_id"], account["profile"], account["google_email"]) == ("user-1", "work", "me@example.com")
+
+
+def test_open_breaker_redirects_with_an_error(monkeypatch, admin_repo):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    transport = CircuitBreakerTransport(httpx.MockTransport(google), breaker)
+
+    assert callback(monkeypatch, transport) == {"gcal_error": "google_unavailable"}
+    assert admin_repo.accounts == []
+
+
+def test_busy_google_queue_redirects_with_an_error(monkeypatch, admin_repo):
+    transport = ConcurrencyLimitedTransport(httpx.MockTransport(google), "test", 1, 0.01)
+    transport._slots = asyncio.Semaphore(0)  # every slot is taken
+
+    assert callback(monkeypatch, transport) == {"gcal_error": "google_unavailable"}
+
+
+def test_network_errors_redirect_with_an_error(monkeypatch, admin_repo):
+    def unreachable(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    assert callback(monkeypatch, httpx.MockTransport(unreachable)) == {"gcal_error": "google_unavailable"}
+
+
+def test_failed_email_lookup_still_saves_the_account(monkeypatch, admin_repo):
+    def token_only(request):
+        if request.url.path.endswith("/token"):
+            return google(request)
+        raise httpx.ReadTimeout("slow", request=request)
+
+    assert callback(monkeypatch, httpx.MockTransport(token_only)) == {"gcal_connected": "work"}
+    assert admin_repo.accounts[0]["google_email"] == ""
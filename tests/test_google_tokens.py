@@ -0,0 +1,149 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from server import GoogleTokenCoordinator
+
+
+def account(account_id: str, expires_in: float = 60) -> dict:
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+    return {
+        "id": account_id,
+        "user_id": "u1",
+        "profile": "work",
+        "access_token": f"old-{account_id}",
+        "refresh_token": "r",
+        "token_expires_at": expires_at.isoformat(),
+    }
+
+
+@pytest.fixture
+def coordinator(monkeypatch):
+    monkeypatch.setattr(server, "GCAL_TOKEN_SWEEP_SECONDS", 0)
+    monkeypatch.setattr(server, "GCAL_TOKEN_IDLE_SECONDS", 3600)
+    return GoogleTokenCoordinator()
+
+
+def sweep(coordinator: GoogleTokenCoordinator) -> bool:
+    """Let run() go round a few times; whether it is still running afterwards"""
+
+    async def run():
+        task = asyncio.ensure_future(coordinator.run())
+        await asyncio.sleep(0.02)
+        alive = not task.done()
+        task.cancel()
+        return alive
+
+    return asyncio.run(run())
+
+
+def test_sweep_survives_accounts_disconnected_mid_sweep(monkeypatch, coordinator):
+    refreshed = []
+
+    async def refresh_gcal_token(account):
+        refreshed.append(account["id"])
+        coordinator.forget_profile("u1", "work")
+        return "new", datetime.now(timezone.utc) + timedelta(hours=1)
+
+    monkeypatch.setattr(server, "refresh_gcal_token", refresh_gcal_token)
+    for account_id in ("a1", "a2", "a3"):
+        coordinator._remember(account(account_id))
+
+    assert sweep(coordinator)
+    assert refreshed == ["a1"]
+    # The refresh that finished after the disconnect doesn't bring the account back
+    assert coordinator._tokens == {} and coordinator._accounts == {}
+
+
+def test_sweep_survives_failing_refreshes(monkeypatch, coordinator):
+    attempts = []
+
+    async def refresh_gcal_token(account):
+        attempts.append(account["id"])
+        if account["id"] == "a1":
+            raise RuntimeError("Google is down")
+        return "new", datetime.now(timezone.utc) + timedelta(hours=1)
+
+    monkeypatch.setattr(server, "refresh_gcal_token", refresh_gcal_token)
+    coordinator._remember(account("a1"))
+    coordinator._remember(account("a2"))
+
+    assert sweep(coordinator)
+    assert "a2" in attempts
+    assert coordinator._tokens["a2"][0] == "new"
+
+
+def test_refreshing_a_forgotten_account_is_a_404(coordinator):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(coordinator.refresh("gone"))
+    assert error.value.status_code == 404
+
+
+def test_concurrent_refreshes_share_one_call(monkeypatch, coordinator):
+    calls = []
+
+    async def refresh_gcal_token(account):
+        calls.append(account["id"])
+        await asyncio.sleep(0.01)
+        return "new", datetime.now(timezone.utc) + timedelta(hours=1)
+
+    monkeypatch.setattr(server, "refresh_gcal_token", refresh_gcal_token)
+    stale = account("a1", expires_in=-60)
+
+    async def run():
+        return await asyncio.gather(*(coordinator.access_token(stale) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["new"] * 5
+    assert calls == ["a1"]
+
+
+class RecordingCache:
+    def __init__(self, fail_start: bool = False):
+        self.fail_start = fail_start
+        self.closed = False
+
+    async def start(self):
+        if self.fail_start:
+            raise ConnectionError("cache unreachable")
+
+    async def close(self):
+        self.closed = True
+
+
+def test_shutdown_waits_for_the_refresher_to_stop(monkeypatch):
+    stopped = []
+
+    async def run():
+        try:
+            await asyncio.sleep(3600)
+        finally:
+            await asyncio.sleep(0)
+            stopped.append(True)
+
+    monkeypatch.setattr(server, "cache", RecordingCache())
+    monkeypatch.setattr(server.gcal_tokens, "run", run)
+
+    async def serve():
+        async with server.lifespan(server.app):
+            await asyncio.sleep(0)
+
+    asyncio.run(serve())
+    assert stopped == [True]
+    assert server.google_http is None and server.postgrest_pool is None
+
+
+def test_failed_startup_closes_what_it_opened(monkeypatch):
+    cache = RecordingCache(fail_start=True)
+    monkeypatch.setattr(server, "cache", cache)
+
+    async def serve():
+        async with server.lifespan(server.app):
+            pass
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(serve())
+    assert cache.closed
+    assert server.google_http is None and server.postgrest_pool is None
@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import cache as cache_module
+import ratelimit
+from cache import MemoryCache
+from ratelimit import RateLimiter, TokenBucket
+
+
+class SharedMemoryCache(MemoryCache):
+    """One MemoryCache standing in for Redis: every limiter given it sees the same counters"""
+
+    shared = True
+
+
+@pytest.fixture(autouse=True)
+def frozen_time(monkeypatch, clock):
+    monkeypatch.setattr(ratelimit, "time", clock)
+    monkeypatch.setattr(cache_module, "time", clock)
+
+
+def check(limiter: RateLimiter, key: str = "u1") -> None:
+    asyncio.run(limiter.check(key))
+
+
+def test_bucket_allows_a_burst_then_says_how_long_to_wait(clock):
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take() == pytest.approx(0.5)
+    clock.advance(0.5)
+    assert bucket.take() == 0.0
+
+
+def test_bucket_refills_no_higher_than_the_burst(clock):
+    bucket = TokenBucket(rate=10, burst=2)
+    bucket.take(2)
+    clock.advance(60)
+    assert bucket.take(2) == 0.0
+    assert bucket.take() == pytest.approx(0.1)
+
+
+def test_bucket_wait_covers_the_whole_cost():
+    bucket = TokenBucket(rate=1, burst=5)
+    bucket.take(4)
+    assert bucket.take(3) == pytest.approx(2.0)
+
+
+def test_limiter_raises_429_with_retry_after(clock):
+    limiter = RateLimiter("test", rate=1, burst=2)
+    check(limiter)
+    check(limiter)
+    with pytest.raises(HTTPException) as error:
+        check(limiter)
+    assert error.value.status_code == 429
+    assert error.value.headers == {"Retry-After": "1"}
+
+
+def test_limiter_keeps_keys_apart():
+    limiter = RateLimiter("test", rate=1, burst=1)
+    check(limiter, "u1")
+    check(limiter, "u2")
+    with pytest.raises(HTTPException):
+        check(limiter, "u1")
+
+
+def test_rate_of_zero_turns_the_limit_off():
+    limiter = RateLimiter("test", rate=0, burst=1)
+    for _ in range(100):
+        check(limiter)
+
+
+def test_limiter_forgets_the_least_recently_seen_keys():
+    limiter = RateLimiter("test", rate=1, burst=1, max_keys=2)
+    for key in ("a", "b", "c"):
+        check(limiter, key)
+    assert list(limiter._buckets) == ["b", "c"]
+    # "a" starts over with a full bucket
+    check(limiter, "a")
+
+
+def test_shared_windows_allow_burst_per_window(clock):
+    # burst / rate = 10 second windows
+    limiter = RateLimiter("test", rate=2, burst=20, cache=SharedMemoryCache())
+    clock.now = 1000.0
+    assert [asyncio.run(limiter._take_shared("u1", 1)) for _ in range(20)] == [0.0] * 20
+    assert asyncio.run(limiter._take_shared("u1", 1)) == pytest.approx(10.0)
+    clock.advance(4)
+    assert asyncio.run(limiter._take_shared("u1", 1)) == pytest.approx(6.0)
+    clock.advance(6)
+    assert asyncio.run(limiter._take_shared("u1", 1)) == 0.0
+
+
+def test_shared_counters_are_one_allowance_across_workers():
+    store = SharedMemoryCache()
+    workers = [RateLimiter("test", rate=1, burst=4, cache=store) for _ in range(3)]
+    allowed = 0
+    for n in range(12):
+        try:
+            check(workers[n % 3])
+            allowed += 1
+        except HTTPException as error:
+            assert error.status_code == 429
+    assert allowed == 4
+
+
+def test_shared_cost_is_rounded_up(clock):
+    limiter = RateLimiter("test", rate=1, burst=2, cache=SharedMemoryCache())
+    clock.now = 1000.0
+    assert asyncio.run(limiter._take_shared("u1", 1.5)) == 0.0
+    assert asyncio.run(limiter._take_shared("u1", 0.1)) > 0
@@ -0,0 +1,199 @@
+import asyncio
+
+import httpx
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, CircuitBreakerTransport, CircuitOpenError, SnapshotCache
+
+
+@pytest.fixture
+def frozen_time(monkeypatch, clock):
+    monkeypatch.setattr(resilience, "time", clock)
+    return clock
+
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_breaker_opens_after_consecutive_failures(frozen_time):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+
+def test_half_open_lets_exactly_one_probe_through(frozen_time):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    frozen_time.advance(29)
+    assert not breaker.allow()
+    frozen_time.advance(1)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_successful_probe_closes_the_breaker(frozen_time):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    frozen_time.advance(30)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_probe_reopens_for_a_full_timeout(frozen_time):
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30)
+    open_breaker(breaker)
+    frozen_time.advance(30)
+    assert breaker.allow()
+    breaker.record_failure()
+    frozen_time.advance(29)
+    assert not breaker.allow()
+    frozen_time.advance(1)
+    assert breaker.allow()
+
+
+def test_released_probe_can_be_retried(frozen_time):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    frozen_time.advance(30)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow()
+
+
+def test_transport_counts_5xx_and_429_and_rejects_while_open():
+    # A success in between resets the count; 503 then 429 opens the breaker
+    statuses = iter([500, 200, 503, 429])
+    sent = []
+
+    def handler(request):
+        sent.append(request)
+        return httpx.Response(next(statuses))
+
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+
+    async def run():
+        transport = CircuitBreakerTransport(httpx.MockTransport(handler), breaker)
+        async with httpx.AsyncClient(transport=transport) as client:
+            codes = [(await client.get("http://upstream/")).status_code for _ in range(4)]
+            with pytest.raises(CircuitOpenError):
+                await client.get("http://upstream/")
+            return codes
+
+    assert asyncio.run(run()) == [500, 200, 503, 429]
+    assert len(sent) == 4
+
+
+def test_transport_errors_count_as_failures():
+    def handler(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+
+    async def run():
+        transport = CircuitBreakerTransport(httpx.MockTransport(handler), breaker)
+        async with httpx.AsyncClient(transport=transport) as client:
+            for _ in range(2):
+                with pytest.raises(httpx.ConnectError):
+                    await client.get("http://upstream/")
+            # Still an httpx.TransportError, so callers' existing handling applies
+            with pytest.raises(httpx.TransportError):
+                await client.get("http://upstream/")
+
+    asyncio.run(run())
+
+
+def counter_fetch(delay: float = 0.0, fail: bool = False):
+    calls = []
+
+    async def fetch():
+        calls.append(None)
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("upstream down")
+        return len(calls)
+
+    return fetch, calls
+
+
+def test_snapshot_first_read_waits_for_the_fetch():
+    fetch, _ = counter_fetch()
+    assert asyncio.run(SnapshotCache().get(("k",), fetch)) == (1, False)
+
+
+def test_snapshot_first_read_fails_with_the_fetch():
+    fetch, _ = counter_fetch(fail=True)
+    with pytest.raises(RuntimeError):
+        asyncio.run(SnapshotCache().get(("k",), fetch))
+
+
+def test_snapshot_first_read_gives_up_at_the_deadline():
+    fetch, _ = counter_fetch(delay=1)
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(SnapshotCache(deadline=0.01).get(("k",), fetch))
+
+
+def test_slow_refresh_serves_the_snapshot_stale_then_updates_it():
+    snapshots = SnapshotCache(fresh_wait=0.01)
+
+    async def run():
+        fast, _ = counter_fetch()
+        await snapshots.get(("k",), fast)
+
+        async def slow():
+            await asyncio.sleep(0.05)
+            return "new"
+
+        stale = await snapshots.get(("k",), slow)
+        await asyncio.sleep(0.1)
+        return stale, snapshots._snapshots[("k",)]
+
+    stale, refreshed = asyncio.run(run())
+    assert stale == (1, True)
+    assert refreshed == "new"
+
+
+def test_failed_refresh_serves_the_snapshot_stale():
+    snapshots = SnapshotCache()
+
+    async def run():
+        good, _ = counter_fetch()
+        await snapshots.get(("k",), good)
+        bad, _ = counter_fetch(fail=True)
+        return await snapshots.get(("k",), bad)
+
+    assert asyncio.run(run()) == (1, True)
+
+
+def test_concurrent_reads_share_one_refresh():
+    snapshots = SnapshotCache()
+    fetch, calls = counter_fetch(delay=0.01)
+
+    async def run():
+        return await asyncio.gather(*(snapshots.get(("k",), fetch) for _ in range(5)))
+
+    assert asyncio.run(run()) == [(1, False)] * 5
+    assert len(calls) == 1
+
+
+def test_snapshots_are_bounded_and_forgettable():
+    snapshots = SnapshotCache(max_entries=2)
+
+    async def run():
+        for key in (("u1", "work"), ("u1", "personal"), ("u2", "work")):
+            fetch, _ = counter_fetch()
+            await snapshots.get(key, fetch)
+
+    asyncio.run(run())
+    assert list(snapshots._snapshots) == [("u1", "personal"), ("u2", "work")]
+    snapshots.forget(("u1",))
+    assert list(snapshots._snapshots) == [("u2", "work")]
@@ -0,0 +1,94 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+from server import in_job_window, job_run_time, scheduler_contexts
+from storage import PostgrestAdminRepository
+
+NOW = datetime(2026, 3, 10, 0, 20, 5, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("hour, expected", [
+    (None, datetime(2026, 3, 10, 0, tzinfo=timezone.utc)),
+    (0, datetime(2026, 3, 10, 0, tzinfo=timezone.utc)),
+    # The 23:00 job retried just after midnight is yesterday's run, not tonight's
+    (23, datetime(2026, 3, 9, 23, tzinfo=timezone.utc)),
+    (1, datetime(2026, 3, 9, 1, tzinfo=timezone.utc)),
+])
+def test_job_run_time_is_the_latest_past_occurrence(hour, expected):
+    assert job_run_time(hour, NOW) == expected
+
+
+def test_job_run_time_on_the_hour_is_that_hour():
+    at = datetime(2026, 3, 10, 14, tzinfo=timezone.utc)
+    assert job_run_time(14, at) == at
+
+
+def test_job_windows_follow_the_users_timezone():
+    at = datetime(2026, 3, 13, 17, tzinfo=timezone.utc)  # a Friday
+    assert in_job_window("friday", at, "Europe/London") is False
+    assert in_job_window("friday", at, "Europe/Paris") is True
+    assert in_job_window("morning", at, "Europe/Paris") is False
+    assert in_job_window("hourly_check", at, "Europe/Paris") is True
+
+
+def seed_happy_users(fake_supabase, count: int) -> list:
+    user_ids = sorted(str(uuid.uuid4()) for _ in range(count))
+    fake_supabase.seed("happy_settings", [
+        {"user_id": user_id, "enabled": True, "name": f"User {n}", "email": f"{n}@example.com", "timezone": "UTC"}
+        for n, user_id in enumerate(user_ids)
+    ])
+    return user_ids
+
+
+def test_bulk_reads_page_past_max_rows(fake_supabase, postgrest):
+    fake_supabase.max_rows = 5
+    user_ids = seed_happy_users(fake_supabase, 12)
+    fake_supabase.seed("happy_settings", [{"user_id": str(uuid.uuid4()), "enabled": False, "email": "off"}])
+    for user_id in user_ids[:3]:
+        fake_supabase.seed("tasks", [
+            {"user_id": user_id, "title": f"task {n}", "profile": "work", "section": "today",
+             "created_at": f"2026-03-0{n + 1}T09:00:00+00:00"}
+            for n in range(4)
+        ])
+        fake_supabase.seed("wins", [
+            {"user_id": user_id, "task": f"win {n}", "completed_at": "2026-03-09T12:00:00+00:00"}
+            for n in range(3)
+        ])
+
+    async def run():
+        admin_repo = PostgrestAdminRepository(postgrest(), page_size=5)
+        return await asyncio.gather(
+            admin_repo.list_happy_users(),
+            admin_repo.list_tasks_for_users(user_ids[:3]),
+            admin_repo.list_wins_for_users(user_ids[:3], "2026-03-03T00:00:00+00:00"),
+        )
+
+    users, tasks, wins = asyncio.run(run())
+    assert [u["user_id"] for u in users] == user_ids
+    assert len(tasks) == 12 and len({t["id"] for t in tasks}) == 12
+    assert [t["created_at"] for t in tasks] == sorted(t["created_at"] for t in tasks)
+    # Ties on completed_at are split by id, so no win is skipped or repeated between pages
+    assert len(wins) == 9 and len({w["id"] for w in wins}) == 9
+
+
+def test_scheduler_contexts_are_complete_past_max_rows(monkeypatch, fake_supabase, postgrest):
+    monkeypatch.setattr(server, "SCHEDULER_BATCH_SIZE", 2)
+    fake_supabase.max_rows = 5
+    user_ids = seed_happy_users(fake_supabase, 3)
+    for user_id in user_ids:
+        fake_supabase.seed("tasks", [
+            {"user_id": user_id, "title": f"task {n}", "profile": "personal", "section": "today"}
+            for n in range(6)
+        ])
+    users = [{"user_id": user_id, "tz_name": "UTC"} for user_id in user_ids]
+
+    async def run():
+        admin_repo = PostgrestAdminRepository(postgrest(), page_size=5)
+        return [ctx async for batch in scheduler_contexts(admin_repo, users, NOW) for ctx in batch]
+
+    contexts = asyncio.run(run())
+    assert [len(ctx["tasks"]["personal"]) for ctx in contexts] == [6, 6, 6]
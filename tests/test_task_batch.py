@@ -0,0 +1,100 @@
+import pytest
+
+import server
+from events import ChangeBroker
+
+USER_ID = "5a0e7c2b-8d14-4b6f-9e3a-1f7c2d9b4e80"
+
+
+@pytest.fixture(autouse=True)
+def stream(monkeypatch):
+    """A change stream opened by the user before each test's requests"""
+    broker = ChangeBroker()
+    monkeypatch.setattr(server, "changes", broker)
+    return broker.subscribe(USER_ID)
+
+
+def published(stream) -> list:
+    events = []
+    while not stream.queue.empty():
+        event = stream.queue.get_nowait()
+        events.append((event.type, event.data))
+    return events
+
+
+def seed_tasks(fake_supabase, *tasks) -> list:
+    fake_supabase.seed("tasks", [
+        {"user_id": USER_ID, "profile": "work", "section": "today", "completed": False, **task} for task in tasks
+    ])
+    return [t["id"] for t in fake_supabase.tables["tasks"][-len(tasks):]]
+
+
+def batch(api, *ops):
+    return api("POST", "/api/tasks/batch", USER_ID, json={"ops": list(ops)})
+
+
+def test_empty_batch_is_rejected(api):
+    assert batch(api).status_code == 422
+
+
+def test_update_without_changes_is_rejected(api, fake_supabase):
+    (task_id,) = seed_tasks(fake_supabase, {"title": "a"})
+    response = batch(api, {"op": "create", "task": {"title": "b", "profile": "work"}}, {
+        "op": "update", "id": task_id, "changes": {},
+    })
+    assert response.status_code == 400
+    assert response.json()["detail"] == "ops[1]: No fields to update"
+    # Nothing in a rejected batch is applied
+    assert [t["title"] for t in fake_supabase.tables["tasks"]] == ["a"]
+
+
+def test_rollover_onto_the_same_section_is_rejected(api):
+    response = batch(api, {"op": "rollover", "from_section": "today", "to_section": "today"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "ops[0]: from_section and to_section are the same"
+
+
+def test_unknown_op_is_rejected(api):
+    assert batch(api, {"op": "archive", "id": USER_ID}).status_code == 422
+
+
+def test_results_map_to_change_events(api, fake_supabase, stream):
+    edit, doomed, done, tomorrow = seed_tasks(
+        fake_supabase,
+        {"title": "edit me"}, {"title": "delete me"}, {"title": "finish me"},
+        {"title": "later", "section": "tomorrow"},
+    )
+    missing = "00000000-0000-4000-8000-000000000000"
+
+    response = batch(
+        api,
+        {"op": "create", "task": {"title": "new", "profile": "work"}},
+        {"op": "update", "id": edit, "changes": {"title": "edited"}},
+        {"op": "delete", "id": doomed},
+        {"op": "complete", "id": done},
+        {"op": "update", "id": missing, "changes": {"title": "nope"}},
+        {"op": "rollover", "profile": "work"},
+        {"op": "rollover", "from_section": "someday", "to_section": "today"},
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["ok"] for r in results] == [True, True, True, True, False, True, True]
+    assert results[4]["error"] == "Task not found"
+
+    events = published(stream)
+    assert [event_type for event_type, _ in events] == [
+        "task.created", "task.updated", "task.deleted", "task.updated", "win.created", "task.rolled_over",
+    ]
+    assert events[1][1]["title"] == "edited"
+    assert events[2][1] == {"id": doomed, "profile": "work"}
+    assert events[4][1]["task"] == "finish me"
+    # The rollover that moved nothing publishes nothing
+    assert events[5][1] == {"profile": "work", "from_section": "tomorrow", "to_section": "today", "moved": 1}
+
+
+def test_completing_a_completed_task_returns_no_win(api, fake_supabase, stream):
+    (task_id,) = seed_tasks(fake_supabase, {"title": "already done", "completed": True})
+    (result,) = batch(api, {"op": "complete", "id": task_id}).json()["results"]
+    assert result["ok"] and result["win"] is None
+    assert fake_supabase.tables.get("wins", []) == []
+    assert [event_type for event_type, _ in published(stream)] == ["task.updated"]
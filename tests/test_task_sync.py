@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from server import cursor_timestamp, decode_cursor, encode_cursor, get_task_changes
+from storage import PostgrestRepository
+
+USER_ID = "3f1c2a8e-5b7d-4e0f-9a61-2c8d4b6e1f03"
+
+
+def days_ago(days: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+def poll(postgrest, cursor: str) -> dict:
+    async def run():
+        return await get_task_changes(PostgrestRepository(postgrest(USER_ID), USER_ID), "work", cursor)
+
+    return asyncio.run(run())
+
+
+def seed_task(fake_supabase, title: str, updated_days_ago: float) -> str:
+    at = days_ago(updated_days_ago)
+    fake_supabase.seed("tasks", [{
+        "user_id": USER_ID, "title": title, "profile": "work", "section": "today",
+        "created_at": at, "updated_at": at,
+    }])
+    return fake_supabase.tables["tasks"][-1]["id"]
+
+
+def test_an_idle_list_gets_deltas_after_one_reset(fake_supabase, postgrest):
+    seed_task(fake_supabase, "old", updated_days_ago=40)
+
+    first = poll(postgrest, encode_cursor([days_ago(40)]))
+    assert first["reset"] and [t["title"] for t in first["tasks"]] == ["old"]
+
+    # The cursor moved to the time of the read, not the 40-day-old updated_at
+    second = poll(postgrest, first["cursor"])
+    assert (second["reset"], second["tasks"], second["deleted"]) == (False, [], [])
+    third = poll(postgrest, second["cursor"])
+    assert third["reset"] is False
+
+    (cursor_at,) = decode_cursor(third["cursor"], cursor_timestamp)
+    assert datetime.now(timezone.utc) - cursor_at < timedelta(minutes=1)
+
+
+def test_changes_and_deletes_after_the_cursor_are_returned(fake_supabase, postgrest):
+    seed_task(fake_supabase, "untouched", updated_days_ago=5)
+    doomed = seed_task(fake_supabase, "doomed", updated_days_ago=5)
+    cursor = encode_cursor([days_ago(1)])
+
+    fake_supabase.apply_task_batch(USER_ID, [
+        {"op": "create", "task": {"title": "new", "profile": "work"}},
+        {"op": "delete", "id": doomed},
+    ])
+
+    delta = poll(postgrest, cursor)
+    assert delta["reset"] is False
+    assert [t["title"] for t in delta["tasks"]] == ["new"]
+    assert delta["deleted"] == [doomed]
+
+
+def test_writes_just_behind_the_cursor_are_re_read(fake_supabase, postgrest):
+    # A write stamped before the cursor but committed after it was issued
+    seed_task(fake_supabase, "late commit", updated_days_ago=5 / 86400)
+    delta = poll(postgrest, encode_cursor([days_ago(1 / 86400)]))
+    assert [t["title"] for t in delta["tasks"]] == ["late commit"]
@@ -0,0 +1,116 @@
+import asyncio
+from datetime import date, timedelta
+
+from server import compute_win_stats
+from storage import PostgrestRepository
+
+# A Wednesday
+TODAY = date(2026, 10, 14)
+USER_ID = "9d3b6a70-1c2e-4f58-8a47-5e0c9b1d2f64"
+
+
+def summary(daily: dict, total: int = None, current: int = 0, longest: int = 0) -> dict:
+    return {
+        "total": sum(daily.values()) if total is None else total,
+        "current_streak": current,
+        "longest_streak": longest,
+        "days": [{"day": day.isoformat(), "count": count} for day, count in sorted(daily.items())],
+    }
+
+
+def stats(daily: dict, start: date = date(2026, 10, 1), end: date = TODAY, bucket: str = "day") -> dict:
+    return compute_win_stats(summary(daily), TODAY, start, end, bucket)
+
+
+def test_counts_by_period():
+    daily = {
+        date(2026, 10, 1): 2,
+        date(2026, 10, 12): 3,  # Monday of this week
+        TODAY: 1,
+    }
+    # Older days aren't read, so the all-time total comes from the summary
+    result = compute_win_stats(summary(daily, total=10), TODAY, date(2026, 10, 1), TODAY, "day")
+    assert result["counts"] == {"today": 1, "week": 4, "month": 6, "total": 10}
+
+
+def test_streaks_come_from_the_summary():
+    result = compute_win_stats(summary({TODAY: 1}, current=3, longest=8), TODAY, TODAY, TODAY, "day")
+    assert result["streak"] == {"current": 3, "longest": 8}
+
+
+def test_daily_histogram_has_a_bucket_for_every_day():
+    daily = {date(2026, 10, 12): 2, date(2026, 10, 9): 7}
+    histogram = stats(daily, start=date(2026, 10, 10))["histogram"]
+    assert [b["start"] for b in histogram] == [f"2026-10-{d}" for d in range(10, 15)]
+    assert [b["count"] for b in histogram] == [0, 0, 2, 0, 0]
+
+
+def test_weekly_histogram_starts_on_mondays():
+    daily = {date(2026, 10, 4): 1, date(2026, 10, 5): 2, date(2026, 10, 11): 3, TODAY: 4}
+    histogram = stats(daily, start=date(2026, 10, 1), bucket="week")["histogram"]
+    assert histogram == [
+        {"start": "2026-09-28", "count": 1},
+        {"start": "2026-10-05", "count": 5},
+        {"start": "2026-10-12", "count": 4},
+    ]
+
+
+def test_monthly_histogram_crosses_the_year():
+    daily = {date(2025, 12, 25): 1, date(2026, 1, 2): 2, date(2026, 2, 28): 3}
+    result = compute_win_stats(summary(daily), TODAY, date(2025, 12, 10), date(2026, 2, 5), "month")
+    assert result["histogram"] == [
+        {"start": "2025-12-01", "count": 1},
+        {"start": "2026-01-01", "count": 2},
+        {"start": "2026-02-01", "count": 0},
+    ]
+    assert result["range"] == {"start": "2025-12-10", "end": "2026-02-05", "bucket": "month"}
+
+
+# win_summary in the fake mirrors the SQL function in supabase_wins_stats_migration.sql
+
+def win_summary(fake_supabase, postgrest, daily: dict, first_day: date = TODAY, last_day: date = TODAY) -> dict:
+    fake_supabase.seed("win_daily_counts", [
+        {"user_id": USER_ID, "day": day.isoformat(), "count": count} for day, count in daily.items()
+    ])
+
+    async def run():
+        return await PostgrestRepository(postgrest(USER_ID), USER_ID).get_win_summary(TODAY, first_day, last_day)
+
+    return asyncio.run(run())
+
+
+def streak(result: dict) -> tuple:
+    return result["current_streak"], result["longest_streak"]
+
+
+def test_current_streak_counts_back_from_today(fake_supabase, postgrest):
+    daily = {date(2026, 10, 12): 1, date(2026, 10, 13): 2, TODAY: 1}
+    assert streak(win_summary(fake_supabase, postgrest, daily)) == (3, 3)
+
+
+def test_current_streak_survives_until_the_user_wins_today(fake_supabase, postgrest):
+    daily = {date(2026, 10, 12): 1, date(2026, 10, 13): 1}
+    assert streak(win_summary(fake_supabase, postgrest, daily)) == (2, 2)
+
+
+def test_current_streak_is_broken_by_a_missed_day(fake_supabase, postgrest):
+    daily = {date(2026, 10, 11): 1, date(2026, 10, 12): 1}
+    assert streak(win_summary(fake_supabase, postgrest, daily)) == (0, 2)
+
+
+def test_longest_streak_skips_days_with_zero_wins(fake_supabase, postgrest):
+    daily = {
+        date(2026, 9, 1): 1, date(2026, 9, 2): 1, date(2026, 9, 3): 0, date(2026, 9, 4): 1,
+        date(2026, 10, 1): 1, date(2026, 10, 2): 1, date(2026, 10, 3): 1,
+    }
+    assert streak(win_summary(fake_supabase, postgrest, daily))[1] == 3
+
+
+def test_summary_covers_all_history_but_returns_only_the_window(fake_supabase, postgrest):
+    # Three years of daily wins: more rows than PostgREST's max_rows would let a plain read return
+    fake_supabase.max_rows = 1000
+    daily = {TODAY - timedelta(days=n): 1 for n in range(3 * 365)}
+    result = win_summary(fake_supabase, postgrest, daily, first_day=TODAY - timedelta(days=6))
+    assert result["total"] == 3 * 365
+    assert streak(result) == (3 * 365, 3 * 365)
+    assert len(result["days"]) == 7